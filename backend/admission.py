@@ -0,0 +1,277 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, Optional, Tuple
+
+from starlette.datastructures import Headers
+
+from compression import negotiate
+from instrumentation import Registry
+
+# Requests that never wait for a slot: scrapes must work during a surge,
+# and live feeds hold their connection for as long as the client stays.
+EXEMPT_PATHS = frozenset({"/metrics", "/api/incidents/stream"})
+# How often the event loop's responsiveness is sampled.
+LAG_INTERVAL = 0.05
+# Largest response body kept for stale replay.
+MAX_STALE_BODY = 1 << 20
+
+BUSY_BODY = b'{"detail":"Server busy, retry shortly"}'
+
+
+def request_class(scope) -> Optional[str]:
+    """"read" for GETs, "write" for other methods, None for requests outside admission control."""
+    if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+        return None
+    method = scope["method"]
+    if method in ("GET", "HEAD"):
+        return "read"
+    if method == "OPTIONS":
+        return None
+    return "write"
+
+
+class AdmissionControl:
+    """Concurrency slots with priority queues: writes before reads, reads kept out of the write reserve.
+
+    At most ``read_limit`` reads run at once, and ``write_reserve``
+    further slots only writes may take, so a wall of dashboard reads
+    never leaves a dispatcher's write waiting for one of them to finish.
+    When a slot frees up, queued writes are admitted before queued reads.
+    Queues are bounded and waits time out, so an overloaded process
+    turns requests away early instead of letting latency grow without
+    limit.
+
+    Handlers mostly run without awaiting, so on one event loop a surge
+    backs up in the loop's ready queue long before the slots fill.
+    ``lag``, how late a short timer fires, measures that backlog, and
+    reads count as saturated once it passes ``max_lag``.
+    """
+
+    def __init__(
+        self,
+        read_limit: int = 32,
+        write_reserve: int = 8,
+        read_queue: int = 128,
+        write_queue: int = 256,
+        queue_timeout: float = 2.0,
+        max_lag: float = 0.05,
+    ):
+        self.capacity = read_limit + write_reserve
+        self.read_limit = read_limit
+        self.queue_limits = {"read": read_queue, "write": write_queue}
+        self.queue_timeout = queue_timeout
+        self.in_flight = {"read": 0, "write": 0}
+        self.waiting: Dict[str, Deque[asyncio.Future]] = {"read": deque(), "write": deque()}
+        self.max_lag = max_lag
+        self.lag = 0.0
+        self._monitor: Optional[asyncio.Task] = None
+
+    def watch(self):
+        """Start measuring event loop lag; called on every request, starts the monitor once per loop."""
+        if self._monitor is None or self._monitor.done():
+            self._monitor = asyncio.get_running_loop().create_task(self._measure_lag())
+
+    async def stop(self):
+        """Cancel the lag monitor and wait for it, for application shutdown."""
+        monitor, self._monitor = self._monitor, None
+        if monitor is not None:
+            monitor.cancel()
+            await asyncio.gather(monitor, return_exceptions=True)
+
+    async def _measure_lag(self, interval: float = LAG_INTERVAL):
+        loop = asyncio.get_running_loop()
+        while True:
+            due = loop.time() + interval
+            await asyncio.sleep(interval)
+            # Decays over a few intervals, so one slow tick does not flip the mode back and forth.
+            self.lag = max(loop.time() - due, self.lag * 0.5)
+
+    def saturated(self, kind: str) -> bool:
+        """Whether a ``kind`` request arriving now would have to queue, or reads are falling behind."""
+        if kind == "read" and self.lag > self.max_lag:
+            return True
+        return not self._has_slot(kind)
+
+    def _has_slot(self, kind: str) -> bool:
+        total = self.in_flight["read"] + self.in_flight["write"]
+        if kind == "write":
+            return total < self.capacity and not self.waiting["write"]
+        return total < self.capacity and self.in_flight["read"] < self.read_limit and not (
+            self.waiting["write"] or self.waiting["read"]
+        )
+
+    async def acquire(self, kind: str) -> bool:
+        """Take a slot, queueing if need be; False when the queue is full or the wait timed out."""
+        if self._has_slot(kind):
+            self.in_flight[kind] += 1
+            return True
+        queue = self.waiting[kind]
+        if len(queue) >= self.queue_limits[kind]:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            # The client went away; give back a slot granted just before.
+            if waiter.done() and not waiter.cancelled():
+                self.release(kind)
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    queue.remove(waiter)
+                except ValueError:
+                    pass
+
+    def release(self, kind: str):
+        self.in_flight[kind] -= 1
+        self._wake()
+
+    def _wake(self):
+        for kind in ("write", "read"):
+            queue = self.waiting[kind]
+            while queue:
+                total = self.in_flight["read"] + self.in_flight["write"]
+                if total >= self.capacity or (kind == "read" and self.in_flight["read"] >= self.read_limit):
+                    break
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self.in_flight[kind] += 1
+                waiter.set_result(None)
+
+
+class StaleResponses:
+    """Last complete 200 response per URL, coding and origin, for replay while reads are saturated."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, list, bytes]]" = OrderedDict()
+
+    def put(self, key: Hashable, headers: list, body: bytes):
+        self._entries[key] = (time.monotonic(), headers, body)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: Hashable, max_age: float) -> Optional[Tuple[float, list, bytes]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        age = time.monotonic() - entry[0]
+        if age > max_age:
+            return None
+        return age, entry[1], entry[2]
+
+
+class AdmissionMiddleware:
+    """ASGI middleware putting every request through an ``AdmissionControl``.
+
+    A read that would have to queue, or that arrives while the loop lags,
+    is answered straight away with the last response seen for the same
+    URL when one is at most ``stale_seconds`` old, marked with
+    ``Warning: 110`` and ``Age``. Without one it queues, or, once the lag
+    passes ``shed_lag``, is refused; a request that cannot get a slot
+    gets 503 with ``Retry-After``. Writes are never refused for lag. Only
+    whole, unstreamed 200 bodies are kept for replay, in the coding they
+    were sent with.
+
+    The control is passed in rather than built here so the application
+    can ``stop`` its lag monitor at shutdown.
+    """
+
+    def __init__(
+        self,
+        app,
+        registry: Registry,
+        control: AdmissionControl,
+        shed_lag: float = 0.5,
+        stale_seconds: float = 10.0,
+    ):
+        self.app = app
+        self.control = control
+        self.stale = StaleResponses()
+        self.shed_lag = shed_lag
+        self.stale_seconds = stale_seconds
+        self.shed = registry.counter("admission_shed_total", "Requests not admitted, by class and outcome.")
+        registry.gauge(
+            "admission_in_flight",
+            "Admitted requests being served, by class.",
+            lambda: {(("class", k),): n for k, n in self.control.in_flight.items()},
+        )
+        registry.gauge(
+            "admission_queued",
+            "Requests waiting for a slot, by class.",
+            lambda: {(("class", k),): len(q) for k, q in self.control.waiting.items()},
+        )
+
+    async def __call__(self, scope, receive, send):
+        kind = request_class(scope)
+        if kind is None:
+            await self.app(scope, receive, send)
+            return
+        self.control.watch()
+        key = None
+        if kind == "read":
+            headers = Headers(scope=scope)
+            # Replayed headers include the coding and CORS answer, so both are part of the key.
+            key = (scope["path"], scope["query_string"], negotiate(headers.get("accept-encoding")), headers.get("origin"))
+            if self.control.saturated(kind):
+                stale = self.stale.get(key, self.stale_seconds)
+                if stale is not None:
+                    self.shed.inc(**{"class": kind, "outcome": "stale"})
+                    await self._send_stale(send, *stale)
+                    return
+        if (kind == "read" and self.control.lag > self.shed_lag) or not await self.control.acquire(kind):
+            self.shed.inc(**{"class": kind, "outcome": "rejected"})
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(BUSY_BODY)).encode()),
+                    (b"retry-after", b"1"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": BUSY_BODY})
+            return
+        try:
+            if key is None or scope["method"] != "GET":
+                await self.app(scope, receive, send)
+            else:
+                await self.app(scope, receive, self._recorder(key, send))
+        finally:
+            self.control.release(kind)
+
+    def _recorder(self, key: Hashable, send):
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message if message["status"] == 200 else None
+            elif (
+                start is not None
+                and message["type"] == "http.response.body"
+                and not message.get("more_body")
+                and len(message.get("body", b"")) <= MAX_STALE_BODY
+            ):
+                self.stale.put(key, list(start["headers"]), message.get("body", b""))
+            else:
+                start = None
+            await send(message)
+
+        return send_wrapper
+
+    @staticmethod
+    async def _send_stale(send, age: float, headers: list, body: bytes):
+        headers = [(k, v) for k, v in headers if k.lower() not in (b"age", b"warning")]
+        headers.append((b"age", str(int(age)).encode()))
+        headers.append((b"warning", b'110 - "Response is Stale"'))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
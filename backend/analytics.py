@@ -0,0 +1,182 @@
+import math
+from typing import Dict, Iterable, Optional, Tuple
+
+from records import IncidentRecord
+
+
+class DDSketch:
+    """Quantile sketch with bounded relative error (Masson et al., VLDB 2019).
+
+    Values fall into logarithmic buckets ``(gamma**(i-1), gamma**i]``, so any
+    quantile is returned within ``relative_accuracy`` of the true value.
+    Memory is one counter per occupied bucket and is capped at
+    ``max_buckets`` by folding the lowest buckets together. Sketches merge by
+    adding counters, and a sample can be removed by decrementing its bucket.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets: Dict[int, int] = {}
+        self._floor: Optional[int] = None  # lowest key once buckets were folded
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+
+    def _key(self, value: float) -> int:
+        key = math.ceil(math.log(value) / self._log_gamma)
+        return key if self._floor is None else max(key, self._floor)
+
+    def add(self, value: float, weight: int = 1):
+        self.count += weight
+        self.total += value * weight
+        if value <= 0:
+            self.zero_count += weight
+            return
+        key = self._key(value)
+        count = self.buckets.get(key, 0) + weight
+        if count:
+            self.buckets[key] = count
+        else:
+            del self.buckets[key]
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def remove(self, value: float):
+        self.add(value, -1)
+
+    def _collapse(self):
+        keys = sorted(self.buckets)
+        excess = keys[: len(keys) - self.max_buckets + 1]
+        self._floor = excess[-1]
+        self.buckets[self._floor] = sum(self.buckets.pop(k) for k in excess)
+
+    def merge(self, other: "DDSketch"):
+        self.count += other.count
+        self.total += other.total
+        self.zero_count += other.zero_count
+        if other._floor is not None:
+            self._floor = other._floor if self._floor is None else max(self._floor, other._floor)
+            for key in [k for k in self.buckets if k < self._floor]:
+                self.buckets[self._floor] = self.buckets.get(self._floor, 0) + self.buckets.pop(key)
+        for key, count in other.buckets.items():
+            key = key if self._floor is None else max(key, self._floor)
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def to_state(self) -> dict:
+        return {
+            "buckets": list(self.buckets.items()),
+            "floor": self._floor,
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "total": self.total,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "DDSketch":
+        sketch = cls()
+        sketch.buckets = dict(state["buckets"])
+        sketch._floor = state["floor"]
+        sketch.zero_count = state["zero_count"]
+        sketch.count = state["count"]
+        sketch.total = state["total"]
+        return sketch
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def summary(self) -> dict:
+        def rounded(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value, 2)
+
+        return {
+            "count": self.count,
+            "mean": rounded(self.mean),
+            "p50": rounded(self.quantile(0.5)),
+            "p90": rounded(self.quantile(0.9)),
+            "p99": rounded(self.quantile(0.99)),
+        }
+
+
+def response_minutes(incident: IncidentRecord) -> Optional[float]:
+    """Minutes from the call being reported to the first unit on scene."""
+    if incident.on_scene_us is None:
+        return None
+    return max(0.0, (incident.on_scene_us - incident.reported_us) / 60_000_000)
+
+
+class ResponseTimeAnalytics:
+    """Streaming response-time sketches, overall and per station and severity.
+
+    ``to_state``/``state`` save and resume the sketches, as for the stats.
+    """
+
+    def __init__(self, incidents: Iterable[IncidentRecord] = (), state: Optional[dict] = None):
+        self.overall = DDSketch()
+        self.by_group: Dict[Tuple[str, object], DDSketch] = {}
+        if state is not None:
+            self.overall = DDSketch.from_state(state["overall"])
+            for dimension, value, sketch in state["by_group"]:
+                self.by_group[dimension, value] = DDSketch.from_state(sketch)
+        for incident in incidents:
+            self._record(incident, 1)
+
+    def _record(self, incident: IncidentRecord, sign: int):
+        minutes = response_minutes(incident)
+        if minutes is None:
+            return
+        for sketch in (
+            self.overall,
+            self._sketch(("station_id", incident.station_id)),
+            self._sketch(("severity", incident.severity)),
+        ):
+            sketch.add(minutes, sign)
+
+    def _sketch(self, key: Tuple[str, object]) -> DDSketch:
+        sketch = self.by_group.get(key)
+        if sketch is None:
+            sketch = self.by_group[key] = DDSketch()
+        return sketch
+
+    def on_incident_event(self, event: str, incident: IncidentRecord, previous: Optional[IncidentRecord]):
+        if event == "created":
+            self._record(incident, 1)
+        elif event == "deleted":
+            self._record(incident, -1)
+        elif event == "updated":
+            self._record(previous, -1)
+            self._record(incident, 1)
+
+    def to_state(self) -> dict:
+        return {
+            "overall": self.overall.to_state(),
+            "by_group": [[*key, sketch.to_state()] for key, sketch in self.by_group.items()],
+        }
+
+    def report(self) -> dict:
+        groups: Dict[str, Dict[str, dict]] = {"station_id": {}, "severity": {}}
+        for (dimension, value), sketch in self.by_group.items():
+            if sketch.count:
+                groups[dimension][str(value)] = sketch.summary()
+        return {
+            "overall": self.overall.summary(),
+            "by_station": groups["station_id"],
+            "by_severity": groups["severity"],
+        }
@@ -0,0 +1,404 @@
+import fcntl
+import heapq
+import io
+import os
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import orjson
+
+from records import IncidentRecord
+from store import INDEXED_FIELDS, IncidentStore, index_keys
+
+# Block header: magic, row count, min/max id, min/max reported_at (epoch
+# microseconds), compressed payload length, CRC32 of the payload.
+HEADER = struct.Struct("<4sIqqqqII")
+MAGIC = b"FDA1"
+# Checkpoint file: magic, JSON metadata length, archived id count, CRC32 of
+# the rest; then the metadata and the raw id and id-to-block arrays.
+CHECKPOINT_HEADER = struct.Struct("<4sQQI")
+CHECKPOINT_MAGIC = b"FDC1"
+CHECKPOINT_FILE = "checkpoint"
+
+
+class Block(NamedTuple):
+    """Sparse-index entry: where one compressed block lives and what it covers."""
+    segment: int
+    offset: int
+    length: int
+    count: int
+    min_id: int
+    max_id: int
+    min_us: int
+    max_us: int
+
+
+class Archive:
+    """Append-only, compressed home for incidents that will not change again.
+
+    Incidents are written in blocks of up to ``block_size`` rows, sorted by
+    id, as zlib-compressed NDJSON behind a fixed header. Segment files roll
+    over at ``segment_bytes``. Rows stay on disk; memory holds one ``Block``
+    header per block, the set of index keys (status, severity, station,
+    type, units) its rows carry, and a sorted id -> block index (two
+    arrays, 12 bytes per archived incident, as blocks from different
+    sweeps cover overlapping id ranges). A lookup by id decompresses at
+    most one block, and a filtered or ``reported_at`` bounded read only
+    the blocks whose ranges and key sets can match. Recently read blocks
+    stay in a small LRU.
+
+    With no ``directory`` the segments live in memory, which keeps tiering
+    on when persistence is off.
+
+    Worker processes can share a directory: ``exclusive`` takes an
+    advisory lock for a sweep, which ``refresh`` (indexing blocks other
+    processes appended) waits on, so nobody reads a half-written block.
+
+    ``save_checkpoint`` writes the in-memory index next to the segments,
+    together with state the caller derived from the blocks it covers.
+    Opening the directory again loads both (``checkpoint`` and
+    ``checkpointed``, the number of blocks covered) and decompresses only
+    blocks appended after it.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        block_size: int = 512,
+        segment_bytes: int = 64 << 20,
+        cache_blocks: int = 64,
+    ):
+        self.directory = directory
+        self.block_size = block_size
+        self.segment_bytes = segment_bytes
+        self.cache_blocks = cache_blocks
+        self.blocks: List[Block] = []
+        # Every archived id, sorted, and the number of the block holding it.
+        self._ids = array("q")
+        self._id_blocks = array("i")
+        # Per block, the index keys of each INDEXED_FIELDS field among its rows.
+        self._summaries: List[Dict[str, FrozenSet]] = []
+        self.count = 0
+        self.max_id = 0
+        self._segments: List[io.BufferedRandom] = []
+        self._cache: "OrderedDict[int, List[IncidentRecord]]" = OrderedDict()
+        # End of the indexed part of each segment, and blocks other
+        # processes wrote that ``refresh`` has not handed out yet.
+        self._scanned: List[int] = []
+        self._found: List[int] = []
+        self._lock_file = None
+        self._exclusive = False
+        self.checkpoint: Optional[dict] = None
+        self.checkpointed = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._lock_file = open(os.path.join(directory, "archive.lock"), "a+b")
+            with self._locked(fcntl.LOCK_EX):
+                self._load_checkpoint()
+                self._scan_new()
+            self._found.clear()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, incident_id: int) -> bool:
+        i = bisect_left(self._ids, incident_id)
+        return i < len(self._ids) and self._ids[i] == incident_id
+
+    @contextmanager
+    def _locked(self, mode: int):
+        if self._lock_file is None or self._exclusive:
+            yield
+            return
+        fcntl.flock(self._lock_file, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def exclusive(self):
+        """Hold the archive for a refresh-then-append sweep; yields False if another process already is."""
+        if self._lock_file is None:
+            yield True
+            return
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        self._exclusive = True
+        try:
+            yield True
+        finally:
+            self._exclusive = False
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def refresh(self) -> List[IncidentRecord]:
+        """Index blocks other processes appended since the last look; returns their incidents."""
+        if self.directory is None:
+            return []
+        with self._locked(fcntl.LOCK_SH):
+            self._scan_new(truncate=False)
+        found, self._found = self._found, []
+        return [row for number in found for row in self._read(number)]
+
+    def _scan_new(self, truncate: bool = True):
+        names = self._segment_names()
+        for name in names[len(self._segments):]:
+            self._open_segment(os.path.join(self.directory, name))
+        for segment in range(len(self._segments)):
+            self._scan_segment(segment, truncate)
+
+    def _segment_names(self) -> List[str]:
+        return sorted(n for n in os.listdir(self.directory) if n.startswith("segment-") and n.endswith(".fda"))
+
+    def _load_checkpoint(self):
+        """Restore the index as of the last checkpoint, unless it is missing, damaged or ahead of the segments."""
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if len(data) < CHECKPOINT_HEADER.size:
+            return
+        magic, meta_length, id_count, crc = CHECKPOINT_HEADER.unpack_from(data)
+        body = memoryview(data)[CHECKPOINT_HEADER.size:]
+        if magic != CHECKPOINT_MAGIC or len(body) != meta_length + 12 * id_count or zlib.crc32(body) != crc:
+            return
+        meta = orjson.loads(body[:meta_length])
+        paths = [os.path.join(self.directory, name) for name in self._segment_names()]
+        scanned = meta["scanned"]
+        if len(paths) < len(scanned) or any(os.path.getsize(p) < end for p, end in zip(paths, scanned)):
+            return
+        for path in paths[:len(scanned)]:
+            self._open_segment(path)
+        self._scanned = scanned
+        self.blocks = [Block(*block) for block in meta["blocks"]]
+        self._summaries = [
+            {field: frozenset(keys) for field, keys in summary.items()} for summary in meta["summaries"]
+        ]
+        ids_end = meta_length + 8 * id_count
+        self._ids, self._id_blocks = array("q"), array("i")
+        self._ids.frombytes(body[meta_length:ids_end])
+        self._id_blocks.frombytes(body[ids_end:])
+        self.count = meta["count"]
+        self.max_id = meta["max_id"]
+        self.checkpoint = meta["state"]
+        self.checkpointed = len(self.blocks)
+
+    def save_checkpoint(self, state: dict):
+        """Save the index of every block seen so far, with ``state`` derived from exactly those blocks.
+
+        The file is replaced atomically, so a crash leaves the previous
+        checkpoint; a checkpoint that lags the segments only means more
+        blocks to replay.
+        """
+        if self.directory is None:
+            return
+        meta = orjson.dumps({
+            "scanned": self._scanned,
+            "blocks": [list(block) for block in self.blocks],
+            "summaries": [{field: list(keys) for field, keys in summary.items()} for summary in self._summaries],
+            "count": self.count,
+            "max_id": self.max_id,
+            "state": state,
+        })
+        body = meta + self._ids.tobytes() + self._id_blocks.tobytes()
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        with open(path + ".tmp", "wb") as f:
+            f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, len(meta), len(self._ids), zlib.crc32(body)) + body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self.checkpoint = state
+        self.checkpointed = len(self.blocks)
+
+    def _open_segment(self, path: Optional[str] = None):
+        if path is None and self.directory is not None:
+            path = os.path.join(self.directory, f"segment-{len(self._segments):06d}.fda")
+        if path is None:
+            self._segments.append(io.BytesIO())
+        else:
+            self._segments.append(open(path, "a+b"))
+        self._scanned.append(0)
+
+    def _scan_segment(self, segment: int, truncate: bool = True):
+        """Index a segment's unscanned blocks from their headers, cutting off a torn final block."""
+        f = self._segments[segment]
+        size = f.seek(0, os.SEEK_END)
+        offset = self._scanned[segment]
+        while offset + HEADER.size <= size:
+            f.seek(offset)
+            magic, count, min_id, max_id, min_us, max_us, length, crc = HEADER.unpack(f.read(HEADER.size))
+            payload = f.read(length)
+            if magic != MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+                break
+            self._found.append(len(self.blocks))
+            rows = [orjson.loads(line) for line in zlib.decompress(payload).split(b"\n")]
+            self._index(Block(segment, offset + HEADER.size, length, count, min_id, max_id, min_us, max_us), rows)
+            offset += HEADER.size + length
+        self._scanned[segment] = offset
+        if truncate and offset < size:
+            f.truncate(offset)
+
+    def _index(self, block: Block, rows: List):
+        """Add a block and its rows (records or dicts, ascending by id as written) to the indexes."""
+        number = len(self.blocks)
+        self.blocks.append(block)
+        self._summaries.append({
+            field: frozenset(key for row in rows for key in index_keys(row[field]))
+            for field in INDEXED_FIELDS
+        })
+        ids = [row["id"] for row in rows]
+        self.count += block.count
+        self.max_id = max(self.max_id, block.max_id)
+        old_ids, old_blocks = self._ids, self._id_blocks
+        if not old_ids or ids[0] > old_ids[-1]:
+            old_ids.extend(ids)
+            old_blocks.extend([number] * len(ids))
+            return
+        # Merge by copying the runs of old entries between the new ids.
+        new_ids, new_blocks = array("q"), array("i")
+        start = 0
+        for incident_id in ids:
+            end = bisect_left(old_ids, incident_id, start)
+            new_ids += old_ids[start:end]
+            new_blocks += old_blocks[start:end]
+            new_ids.append(incident_id)
+            new_blocks.append(number)
+            start = end
+        new_ids += old_ids[start:]
+        new_blocks += old_blocks[start:]
+        self._ids, self._id_blocks = new_ids, new_blocks
+
+    def append(self, records: Iterable[IncidentRecord]):
+        """Write ``records`` as new blocks; they are on disk when this returns."""
+        records = sorted(records, key=lambda r: r.id)
+        if not records:
+            return
+        with self._locked(fcntl.LOCK_EX):
+            self._append(records)
+
+    def _append(self, records: List[IncidentRecord]):
+        if self.directory is not None:
+            self._scan_new()
+        if not self._segments or self._segments[-1].seek(0, os.SEEK_END) >= self.segment_bytes:
+            self._open_segment()
+        segment = len(self._segments) - 1
+        f = self._segments[segment]
+        offset = f.seek(0, os.SEEK_END)
+        new_blocks = []
+        chunks = []
+        for start in range(0, len(records), self.block_size):
+            chunk = records[start:start + self.block_size]
+            payload = zlib.compress(b"\n".join(orjson.dumps(r.to_dict()) for r in chunk), 6)
+            reported = [r.reported_us for r in chunk]
+            block = Block(
+                segment, offset + HEADER.size, len(payload), len(chunk),
+                chunk[0].id, chunk[-1].id, min(reported), max(reported),
+            )
+            f.write(HEADER.pack(MAGIC, *block[3:], len(payload), zlib.crc32(payload)) + payload)
+            new_blocks.append(block)
+            chunks.append(chunk)
+            offset += HEADER.size + len(payload)
+        if self.directory is not None:
+            f.flush()
+            os.fsync(f.fileno())
+        for block, chunk in zip(new_blocks, chunks):
+            self._index(block, chunk)
+        self._scanned[segment] = offset
+
+    def _read(self, number: int) -> List[IncidentRecord]:
+        rows = self._cache.get(number)
+        if rows is not None:
+            self._cache.move_to_end(number)
+            return rows
+        block = self.blocks[number]
+        f = self._segments[block.segment]
+        f.seek(block.offset)
+        payload = zlib.decompress(f.read(block.length))
+        rows = [IncidentRecord.from_dict(orjson.loads(line)) for line in payload.split(b"\n")]
+        self._cache[number] = rows
+        if len(self._cache) > self.cache_blocks:
+            self._cache.popitem(last=False)
+        return rows
+
+    def get(self, incident_id: int) -> Optional[IncidentRecord]:
+        """The archived incident with this id; misses cost one bisect and read no block."""
+        i = bisect_left(self._ids, incident_id)
+        if i == len(self._ids) or self._ids[i] != incident_id:
+            return None
+        rows = self._read(self._id_blocks[i])
+        return rows[bisect_left(rows, incident_id, key=lambda r: r.id)]
+
+    def iter_desc(
+        self,
+        since_us: Optional[int] = None,
+        until_us: Optional[int] = None,
+        before: Optional[Tuple[int, int]] = None,
+        blocks: Optional[int] = None,
+        criteria: Optional[Dict[str, object]] = None,
+        after: Optional[Tuple[int, int]] = None,
+    ) -> Iterator[IncidentRecord]:
+        """Archived incidents newest first by ``(reported_at, id)``, within the same bounds as ``IncidentStore.page``.
+
+        Only rows matching ``criteria`` (as ``IncidentStore.matches``) and
+        older than ``before`` but newer than ``after`` are returned. Blocks
+        whose time range or key sets rule them out are never opened; the
+        rest are opened in order of their newest row and rows are released
+        from a heap once no unopened block can hold anything newer, so a
+        page only decompresses the blocks it actually reaches. Blocks are
+        never rewritten, so ``blocks`` (a ``len(self.blocks)`` taken
+        earlier) pins the archive as it was then.
+        """
+        wanted = [(field, index_keys(value)[0]) for field, value in (criteria or {}).items()]
+        candidates = sorted(
+            (
+                (block.max_us, number)
+                for number, block in enumerate(self.blocks[:blocks])
+                if (since_us is None or block.max_us >= since_us)
+                and (until_us is None or block.min_us < until_us)
+                and (before is None or block.min_us <= before[0])
+                and (after is None or block.max_us >= after[0])
+                and all(key in self._summaries[number][field] for field, key in wanted)
+            ),
+            reverse=True,
+        )
+        heap: List[Tuple[int, int, IncidentRecord]] = []
+        for max_us, number in candidates:
+            while heap and -heap[0][0] > max_us:
+                yield heapq.heappop(heap)[2]
+            for row in self._read(number):
+                if since_us is not None and row.reported_us < since_us:
+                    continue
+                if until_us is not None and row.reported_us >= until_us:
+                    continue
+                if before is not None and (row.reported_us, row.id) >= before:
+                    continue
+                if after is not None and (row.reported_us, row.id) <= after:
+                    continue
+                if wanted and not IncidentStore.matches(row, criteria):
+                    continue
+                heapq.heappush(heap, (-row.reported_us, -row.id, row))
+        while heap:
+            yield heapq.heappop(heap)[2]
+
+    def records(self, start: int = 0) -> Iterator[IncidentRecord]:
+        """Every archived incident from block ``start`` on, in write order, without filling the block cache."""
+        for block in self.blocks[start:]:
+            f = self._segments[block.segment]
+            f.seek(block.offset)
+            for line in zlib.decompress(f.read(block.length)).split(b"\n"):
+                yield IncidentRecord.from_dict(orjson.loads(line))
+
+    def close(self):
+        for f in self._segments:
+            f.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
@@ -0,0 +1,7 @@
+"""Benchmarks for the Fire Department API.
+
+Run from ``backend/``::
+
+    python -m bench run --size 100k --out baseline.json
+    python -m bench compare baseline.json candidate.json
+"""
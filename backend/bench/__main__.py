@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import importlib
+import multiprocessing
+import os
+import platform
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import orjson
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from bench import clients, datasets, memory, report, scenarios  # noqa: E402
+
+
+def log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def seed_data_dir(size: str, seed: int, data_dir: str, storage: str):
+    """Generate a dataset and store it; runs in a child process so the generator's memory never counts."""
+    now = datetime.now(tz=timezone.utc).replace(minute=0, second=0, microsecond=0)
+    dataset = datasets.generate(size, seed, now)
+    datasets.write_data_dir(dataset, data_dir, storage)
+    incidents = dataset["incidents"]
+    summary = {
+        "now": now.isoformat(),
+        "incidents": len(incidents),
+        "first_incident_id": incidents[0]["id"] if incidents else 101,
+        "last_incident_id": incidents[-1]["id"] if incidents else 101,
+        "station_ids": [s["id"] for s in dataset["stations"]],
+        "firefighters": len(dataset["firefighters"]),
+    }
+    with open(os.path.join(data_dir, "dataset.json"), "wb") as f:
+        f.write(orjson.dumps(summary))
+
+
+def run_inprocess(args, data_dir: str, summary: dict) -> dict:
+    os.environ["FIRE_STORAGE"] = args.storage
+    os.environ["FIRE_DATA_DIR"] = data_dir
+    start = time.perf_counter()
+    main = importlib.import_module("main")
+    startup = time.perf_counter() - start
+    after_startup = report.memory_mb()
+    log(f"in-process: loaded in {startup:.2f}s, rss {after_startup['rss_mb']} MB")
+
+    async def drive():
+        client = clients.ASGIClient(main.app)
+        ctx = scenarios.Context(summary, args.seed)
+        routes = {}
+        for scenario in scenarios.select(args.scenarios):
+            result = await clients.run_inprocess(client, scenario, ctx, args.requests, args.warmup)
+            routes[scenario.name] = report.summarize(result)
+            log(f"  {scenario.name:<24}{_line(routes[scenario.name])}")
+        return routes
+
+    try:
+        routes = asyncio.run(drive())
+    finally:
+        main.storage.close()
+    return {
+        "startup_seconds": round(startup, 3),
+        "memory_after_startup": after_startup,
+        "memory": report.memory_mb(),
+        "routes": routes,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_ready(port: int, server: subprocess.Popen, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"Server exited with code {server.returncode}")
+        conn = clients.HTTPConnection("127.0.0.1", port)
+        try:
+            status, _, _ = await conn.request("GET", "/api/hello", {}, None)
+            if status == 200:
+                return
+        except OSError:
+            pass
+        finally:
+            await conn.close()
+        await asyncio.sleep(0.05)
+    raise SystemExit(f"Server not ready after {timeout:.0f}s")
+
+
+def run_http(args, data_dir: str, summary: dict) -> dict:
+    port = _free_port()
+    env = {**os.environ, "FIRE_STORAGE": args.storage, "FIRE_DATA_DIR": data_dir}
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log",
+    ]
+    start = time.perf_counter()
+    server = subprocess.Popen(command, env=env)
+    try:
+        asyncio.run(_wait_ready(port, server, args.startup_timeout))
+        startup = time.perf_counter() - start
+        after_startup = report.memory_mb(server.pid)
+        log(f"http: ready in {startup:.2f}s, server rss {after_startup['rss_mb']} MB, {args.connections} connections")
+
+        async def drive():
+            ctx = scenarios.Context(summary, args.seed)
+            routes = {}
+            for scenario in scenarios.select(args.scenarios):
+                if scenario.stream:
+                    continue
+                result = await clients.run_load(
+                    "127.0.0.1", port, scenario, ctx, args.connections, args.duration
+                )
+                routes[scenario.name] = report.summarize(result)
+                log(f"  {scenario.name:<24}{_line(routes[scenario.name])}")
+            return routes
+
+        routes = asyncio.run(drive())
+        memory = report.memory_mb(server.pid)
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return {
+        "connections": args.connections,
+        "duration_seconds": args.duration,
+        "startup_seconds": round(startup, 3),
+        "memory_after_startup": after_startup,
+        "memory": memory,
+        "routes": routes,
+    }
+
+
+def _line(stats: dict) -> str:
+    return (
+        f"{stats['throughput_rps'] or 0:>10.1f} rps  p50 {stats['p50_ms'] or 0:>8.3f} ms"
+        f"  p99 {stats['p99_ms'] or 0:>8.3f} ms  errors {stats['errors']}"
+    )
+
+
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="fire-bench-")
+    seed_dir = os.path.join(workdir, "seed")
+    try:
+        start = time.perf_counter()
+        if os.path.exists(seed_dir):
+            shutil.rmtree(seed_dir)
+        child = multiprocessing.Process(target=seed_data_dir, args=(args.size, args.seed, seed_dir, args.storage))
+        child.start()
+        child.join()
+        if child.exitcode:
+            raise SystemExit(f"Dataset generation failed with code {child.exitcode}")
+        with open(os.path.join(seed_dir, "dataset.json"), "rb") as f:
+            summary = orjson.loads(f.read())
+        log(f"dataset: {summary['incidents']} incidents, {len(summary['station_ids'])} stations, "
+            f"{summary['firefighters']} firefighters in {time.perf_counter() - start:.1f}s")
+
+        result = {
+            "schema": report.SCHEMA_VERSION,
+            "meta": {
+                "size": args.size,
+                "seed": args.seed,
+                "incidents": summary["incidents"],
+                "stations": len(summary["station_ids"]),
+                "firefighters": summary["firefighters"],
+                "storage": args.storage,
+                "commit": report.git_commit(BACKEND_DIR),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "started_at": datetime.now(tz=timezone.utc).isoformat(),
+            },
+            "inprocess": None,
+            "http": None,
+        }
+        # Each phase starts from its own copy of the seeded data, since writes change it.
+        if not args.skip_http:
+            http_dir = os.path.join(workdir, "http")
+            shutil.copytree(seed_dir, http_dir, dirs_exist_ok=True)
+            result["http"] = run_http(args, http_dir, summary)
+        if not args.skip_inprocess:
+            inprocess_dir = os.path.join(workdir, "inprocess")
+            shutil.copytree(seed_dir, inprocess_dir, dirs_exist_ok=True)
+            result["inprocess"] = run_inprocess(args, inprocess_dir, summary)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    encoded = orjson.dumps(result, option=orjson.OPT_INDENT_2)
+    if args.out:
+        with open(args.out, "wb") as f:
+            f.write(encoded + b"\n")
+        log(f"wrote {args.out}")
+    else:
+        sys.stdout.buffer.write(encoded + b"\n")
+
+
+def compare(args):
+    with open(args.old, "rb") as f:
+        old = orjson.loads(f.read())
+    with open(args.new, "rb") as f:
+        new = orjson.loads(f.read())
+    regressions = report.compare(old, new, args.threshold)
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+def measure_memory(args):
+    result = memory.measure(args.size, args.seed)
+    sys.stdout.buffer.write(orjson.dumps(result, option=orjson.OPT_INDENT_2) + b"\n")
+    if not result["within_target"]:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Fire Department API benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="generate a dataset, drive every route and report a JSON baseline")
+    run_parser.add_argument("--size", default="1k", help="1k, 100k, 1m or an incident count (default 1k)")
+    run_parser.add_argument("--seed", type=int, default=7)
+    run_parser.add_argument("--storage", choices=("sqlite", "log"), default="sqlite")
+    run_parser.add_argument("--scenarios", help="comma-separated scenario names (default: all)")
+    run_parser.add_argument("--requests", type=int, default=200, help="timed in-process requests per route")
+    run_parser.add_argument("--warmup", type=int, default=20, help="untimed in-process requests per route")
+    run_parser.add_argument("--connections", type=int, default=16, help="concurrent HTTP connections")
+    run_parser.add_argument("--duration", type=float, default=3.0, help="HTTP load seconds per route")
+    run_parser.add_argument("--startup-timeout", type=float, default=600.0)
+    run_parser.add_argument("--skip-inprocess", action="store_true")
+    run_parser.add_argument("--skip-http", action="store_true")
+    run_parser.add_argument("--workdir", help="keep generated data here instead of a temp dir")
+    run_parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="diff two reports; exit 1 on regressions")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="allowed change (default 0.10)")
+    compare_parser.set_defaults(func=compare)
+
+    memory_parser = commands.add_parser("memory", help="bytes per incident; exit 1 above the target")
+    memory_parser.add_argument("--size", default="100k")
+    memory_parser.add_argument("--seed", type=int, default=7)
+    memory_parser.set_defaults(func=measure_memory)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
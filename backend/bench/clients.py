@@ -0,0 +1,232 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+from bench.scenarios import Context, Scenario
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+# Seconds an in-process request may take before it is abandoned and counted
+# as an error, so one stuck scenario cannot hang the whole run.
+REQUEST_TIMEOUT = 30.0
+
+
+class ASGIClient:
+    """Calls an ASGI app directly, with no sockets or HTTP parsing in the way.
+
+    For streaming routes the call ends as soon as the response starts (or the
+    WebSocket handshake is accepted), so what gets timed is connection setup.
+    A call that gets no further within ``timeout`` seconds raises
+    ``asyncio.TimeoutError``.
+    """
+
+    def __init__(self, app, timeout: float = REQUEST_TIMEOUT):
+        self.app = app
+        self.timeout = timeout
+
+    async def request(
+        self, method: str, path: str, headers: Dict[str, str], body: Optional[bytes], stream: bool = False
+    ) -> Response:
+        raw_path, _, query = path.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": raw_path,
+            "raw_path": raw_path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+            + [(b"host", b"bench"), (b"content-length", str(len(body or b"")).encode())],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+        }
+        started = asyncio.Event()
+        sent_body = False
+        status = 0
+        response_headers: Dict[str, str] = {}
+        chunks: List[bytes] = []
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body or b"", "more_body": False}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers.update((k.decode(), v.decode()) for k, v in message.get("headers", []))
+                started.set()
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self._run(self.app(scope, receive, send), started if stream else None)
+        return status, response_headers, b"".join(chunks)
+
+    async def websocket(self, path: str) -> Response:
+        raw_path, _, query = path.partition("?")
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": raw_path,
+            "raw_path": raw_path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+            "subprotocols": [],
+        }
+        accepted = asyncio.Event()
+        status = 0
+        connected = False
+
+        async def receive():
+            nonlocal connected
+            if not connected:
+                connected = True
+                return {"type": "websocket.connect"}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "websocket.accept":
+                status = 101
+                accepted.set()
+            elif message["type"] == "websocket.close" and not status:
+                status = 403
+                accepted.set()
+
+        await self._run(self.app(scope, receive, send), accepted)
+        return status, {}, b""
+
+    async def _run(self, call, started: Optional[asyncio.Event]):
+        task = asyncio.ensure_future(call)
+        waiters = [task]
+        if started is not None:
+            waiters.append(asyncio.ensure_future(started.wait()))
+        done, _ = await asyncio.wait(waiters, timeout=self.timeout, return_when=asyncio.FIRST_COMPLETED)
+        for pending in waiters:
+            pending.cancel()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        if not done:
+            raise asyncio.TimeoutError(f"No response within {self.timeout:.0f}s")
+        if task in done and isinstance(results[0], Exception):
+            raise results[0]
+
+
+async def run_inprocess(client: ASGIClient, scenario: Scenario, ctx: Context, requests: int, warmup: int) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    elapsed = 0.0
+    for i in range(warmup + requests):
+        request = scenario.make(ctx)
+        if request is None:
+            break
+        path, headers, body = request
+        start = time.perf_counter()
+        try:
+            if scenario.websocket:
+                status, response_headers, payload = await client.websocket(path)
+            else:
+                status, response_headers, payload = await client.request(
+                    scenario.method, path, headers, body, stream=scenario.stream
+                )
+        except asyncio.TimeoutError:
+            errors += i >= warmup
+            continue
+        took = time.perf_counter() - start
+        if scenario.on_response:
+            scenario.on_response(ctx, status, response_headers, payload)
+        if i < warmup:
+            continue
+        elapsed += took
+        latencies.append(took)
+        errors += status >= 400
+    return {"latencies": latencies, "errors": errors, "elapsed": elapsed}
+
+
+class HTTPConnection:
+    """Minimal keep-alive HTTP/1.1 client, so the load generator needs nothing beyond asyncio."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, headers: Dict[str, str], body: Optional[bytes]) -> Response:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = body or b""
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+        head += [f"{k}: {v}" for k, v in headers.items()]
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        response_headers: Dict[str, str] = {}
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        if response_headers.get("transfer-encoding") == "chunked":
+            parts = []
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                parts.append(chunk[:-2])
+            payload = b"".join(parts)
+        else:
+            payload = await self.reader.readexactly(int(response_headers.get("content-length", 0)))
+        if response_headers.get("connection") == "close":
+            await self.close()
+        return status, response_headers, payload
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = self.reader = None
+
+
+async def run_load(host: str, port: int, scenario: Scenario, ctx: Context, connections: int, duration: float) -> dict:
+    """Drive one scenario from ``connections`` concurrent keep-alive connections for ``duration`` seconds."""
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        conn = HTTPConnection(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                request = scenario.make(ctx)
+                if request is None:
+                    return
+                path, headers, body = request
+                start = time.perf_counter()
+                try:
+                    status, response_headers, payload = await conn.request(scenario.method, path, headers, body)
+                except (OSError, asyncio.IncompleteReadError):
+                    errors += 1
+                    await conn.close()
+                    continue
+                latencies.append(time.perf_counter() - start)
+                errors += status >= 400
+                if scenario.on_response:
+                    scenario.on_response(ctx, status, response_headers, payload)
+        finally:
+            await conn.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(connections)))
+    return {"latencies": latencies, "errors": errors, "elapsed": time.perf_counter() - start}
@@ -0,0 +1,176 @@
+import math
+import random
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Dict, List, Union
+
+import orjson
+
+from persistence import open_backend
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+# History length per preset; larger departments get longer histories, capped
+# at the two years the call-volume rollups keep.
+SPAN_DAYS = {"1k": 30, "100k": 365, "1m": 730}
+
+# Relative call volume per hour of day: quiet before dawn, peak early evening.
+HOURLY_WEIGHTS = [
+    0.55, 0.45, 0.40, 0.35, 0.35, 0.40, 0.55, 0.75, 0.90, 1.00, 1.05, 1.10,
+    1.15, 1.15, 1.15, 1.20, 1.25, 1.30, 1.30, 1.25, 1.10, 0.95, 0.80, 0.65,
+]
+# Monday first; weekends run a little busier.
+WEEKDAY_WEIGHTS = [0.97, 0.95, 0.95, 0.97, 1.03, 1.08, 1.05]
+
+# (type, share of calls, severity weights Low/Moderate/High/Critical, units sent)
+INCIDENT_TYPES = [
+    ("Medical Aid", 0.66, (0.30, 0.45, 0.20, 0.05), ("M",)),
+    ("Alarm Bell", 0.12, (0.80, 0.17, 0.03, 0.00), ("E",)),
+    ("Vehicle Accident", 0.08, (0.15, 0.40, 0.35, 0.10), ("E", "M", "B")),
+    ("Rescue", 0.04, (0.10, 0.35, 0.40, 0.15), ("E", "T", "M")),
+    ("Structure Fire", 0.04, (0.05, 0.20, 0.40, 0.35), ("E", "E", "T", "B", "M")),
+    ("Brush Fire", 0.03, (0.20, 0.40, 0.30, 0.10), ("E", "B")),
+    ("Hazmat", 0.02, (0.10, 0.30, 0.40, 0.20), ("E", "T", "B")),
+    ("Odor Investigation", 0.01, (0.70, 0.25, 0.05, 0.00), ("E",)),
+]
+SEVERITIES = ("Low", "Moderate", "High", "Critical")
+RANKS = [("Firefighter", 0.70), ("Lieutenant", 0.15), ("Captain", 0.10), ("Battalion Chief", 0.05)]
+STREETS = [
+    "Main St", "Pine St", "Lakeview Rd", "Evergreen Terrace", "Commerce Park", "North Ave",
+    "South Blvd", "Harbor Way", "Madison St", "Aurora Ave N", "Rainier Ave S", "Beacon Ave",
+]
+FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Casey", "Morgan", "Riley", "Jamie", "Avery", "Quinn"]
+LAST_NAMES = ["Nguyen", "Smith", "Garcia", "Johnson", "Kim", "Patel", "Brown", "Lee", "Martinez", "Olsen"]
+
+# Roughly the Seattle city limits, where the sample stations sit.
+BBOX = (47.49, -122.44, 47.74, -122.24)
+
+
+def parse_size(size: Union[str, int]) -> int:
+    if isinstance(size, int):
+        return size
+    key = size.lower()
+    if key in SIZES:
+        return SIZES[key]
+    return int(key.replace("_", ""))
+
+
+def span_days(count: int) -> int:
+    for name in ("1k", "100k", "1m"):
+        if count <= SIZES[name]:
+            return SPAN_DAYS[name]
+    return SPAN_DAYS["1m"]
+
+
+def generate(size: Union[str, int], seed: int = 7, now: datetime = None) -> Dict[str, List[dict]]:
+    """Synthetic stations, firefighters and incidents for ``size`` incidents.
+
+    The same seed always gives the same records relative to ``now`` (default:
+    the current hour), so datasets are comparable across runs while recent
+    windows such as "calls today" still see traffic.
+    """
+    count = parse_size(size)
+    rng = random.Random(seed)
+    now = now or datetime.now(tz=timezone.utc).replace(minute=0, second=0, microsecond=0)
+    stations = _stations(rng, max(3, min(200, count // 5000)))
+    return {
+        "stations": stations,
+        "firefighters": _firefighters(rng, stations),
+        "incidents": _incidents(rng, count, stations, now, span_days(count)),
+    }
+
+
+def _stations(rng: random.Random, count: int) -> List[dict]:
+    south, west, north, east = BBOX
+    stations = []
+    for i in range(1, count + 1):
+        apparatus = rng.randint(2, 5)
+        stations.append({
+            "id": i,
+            "name": f"Station {i}",
+            "address": f"{rng.randint(100, 9999)} {rng.choice(STREETS)}",
+            "apparatus_count": apparatus,
+            "on_duty_count": apparatus * 3,
+            "lat": round(rng.uniform(south, north), 5),
+            "lng": round(rng.uniform(west, east), 5),
+        })
+    return stations
+
+
+def _firefighters(rng: random.Random, stations: List[dict]) -> List[dict]:
+    ranks, weights = zip(*RANKS)
+    firefighters = []
+    for station in stations:
+        # Three shifts staff each station; one of them is on duty.
+        on_shift = rng.randrange(3)
+        for shift in range(3):
+            for _ in range(station["on_duty_count"]):
+                firefighters.append({
+                    "id": len(firefighters) + 1,
+                    "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                    "rank": rng.choices(ranks, weights)[0],
+                    "station_id": station["id"],
+                    "on_duty": shift == on_shift,
+                })
+    return firefighters
+
+
+def _incidents(rng: random.Random, count: int, stations: List[dict], now: datetime, days: int) -> List[dict]:
+    types = [t for t, *_ in INCIDENT_TYPES]
+    type_weights = [share for _, share, *_ in INCIDENT_TYPES]
+    profile = {t: (sev, units) for t, _, sev, units in INCIDENT_TYPES}
+    # Busier stations take a larger share of calls (Zipf-like).
+    station_weights = [1 / (rank + 1) ** 0.6 for rank in range(len(stations))]
+    start = now - timedelta(days=days)
+    hours = [start + timedelta(hours=h) for h in range(days * 24)]
+    # Calls grow ~5% a year on top of the daily and weekly cycles.
+    hour_weights = list(accumulate(
+        HOURLY_WEIGHTS[t.hour] * WEEKDAY_WEIGHTS[t.weekday()] * (1 + 0.05 * h / 8760)
+        for h, t in enumerate(hours)
+    ))
+    reported = sorted(
+        rng.choices(hours, cum_weights=hour_weights)[0] + timedelta(seconds=rng.random() * 3600)
+        for _ in range(count)
+    )
+    # Locations come from their own generator so the other fields stay as they were.
+    spread = random.Random(count)
+    incidents = []
+    for i, reported_at in enumerate(reported):
+        kind = rng.choices(types, type_weights)[0]
+        severity_weights, unit_kinds = profile[kind]
+        station = rng.choices(stations, station_weights)[0]
+        dispatched_at = reported_at + timedelta(seconds=rng.uniform(30, 120))
+        # Travel times are roughly log-normal around six minutes.
+        on_scene_at = dispatched_at + timedelta(minutes=min(45.0, math.exp(rng.gauss(math.log(6), 0.35))))
+        cleared_at = on_scene_at + timedelta(minutes=math.exp(rng.gauss(math.log(30), 0.6)))
+        incidents.append({
+            "id": 101 + i,
+            "type": kind,
+            "severity": rng.choices(SEVERITIES, severity_weights)[0],
+            "status": "Cleared" if cleared_at <= now else "Active",
+            "address": f"{rng.randint(1, 9999)} {rng.choice(STREETS)}",
+            "reported_at": reported_at.isoformat(),
+            "dispatched_at": dispatched_at.isoformat(),
+            "on_scene_at": on_scene_at.isoformat() if on_scene_at <= now else None,
+            "cleared_at": cleared_at.isoformat() if cleared_at <= now else None,
+            "units_responding": [f"{u}{station['id']}" for u in unit_kinds],
+            "station_id": station["id"],
+            # Within a couple of km of the station that answered.
+            "lat": round(station["lat"] + spread.gauss(0, 0.015), 5),
+            "lng": round(station["lng"] + spread.gauss(0, 0.02), 5),
+        })
+    return incidents
+
+
+def write_data_dir(dataset: Dict[str, List[dict]], data_dir: str, kind: str = "sqlite", batch_size: int = 50_000):
+    """Store ``dataset`` the way the app persists it, ready to be loaded at startup."""
+    backend = open_backend(kind, data_dir)
+    try:
+        for table, records in dataset.items():
+            for offset in range(0, len(records), batch_size):
+                backend.write_batch([
+                    (table, record["id"], orjson.dumps(record).decode(), None)
+                    for record in records[offset:offset + batch_size]
+                ])
+    finally:
+        backend.close()
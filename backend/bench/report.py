@@ -0,0 +1,100 @@
+import resource
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+# Bumped whenever the report layout changes, so compare can refuse mismatched files.
+SCHEMA_VERSION = 1
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))]
+
+
+def summarize(result: dict) -> dict:
+    latencies = sorted(result["latencies"])
+    elapsed = result["elapsed"]
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "errors": result["errors"],
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+
+def memory_mb(pid: Optional[int] = None) -> Dict[str, Optional[float]]:
+    """Current and peak resident set size of ``pid`` (default: this process)."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as status:
+            fields = dict(line.split(":", 1) for line in status)
+        return {
+            "rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+            "peak_rss_mb": round(int(fields["VmHWM"].split()[0]) / 1024, 1),
+        }
+    except (OSError, KeyError):
+        if pid is not None:
+            return {"rss_mb": None, "peak_rss_mb": None}
+    # No procfs (macOS): only our own peak is available, in bytes there rather than KiB.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"rss_mb": None, "peak_rss_mb": round(peak / (1 << 20 if sys.platform == "darwin" else 1024), 1)}
+
+
+def _change(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    if not old or new is None:
+        return None
+    return (new - old) / old
+
+
+def compare(old: dict, new: dict, threshold: float) -> List[str]:
+    """Regressions beyond ``threshold`` (a fraction) between two reports, printing a table as it goes."""
+    if old.get("schema") != new.get("schema"):
+        raise SystemExit(f"Schema mismatch: {old.get('schema')} vs {new.get('schema')}")
+    if old["meta"]["incidents"] != new["meta"]["incidents"]:
+        print(f"warning: comparing {old['meta']['incidents']} vs {new['meta']['incidents']} incidents")
+    regressions = []
+    print(f"{'phase':<10}{'route':<24}{'rps old':>11}{'rps new':>11}{'Δ':>8}{'p99 old':>11}{'p99 new':>11}{'Δ':>8}")
+    for phase in ("inprocess", "http"):
+        old_routes = (old.get(phase) or {}).get("routes", {})
+        new_routes = (new.get(phase) or {}).get("routes", {})
+        for route in new_routes:
+            if route not in old_routes:
+                continue
+            a, b = old_routes[route], new_routes[route]
+            rps, p99 = _change(a["throughput_rps"], b["throughput_rps"]), _change(a["p99_ms"], b["p99_ms"])
+            print(
+                f"{phase:<10}{route:<24}{a['throughput_rps'] or 0:>11.1f}{b['throughput_rps'] or 0:>11.1f}"
+                f"{_pct(rps):>8}{a['p99_ms'] or 0:>11.3f}{b['p99_ms'] or 0:>11.3f}{_pct(p99):>8}"
+            )
+            if rps is not None and rps < -threshold:
+                regressions.append(f"{phase}/{route}: throughput {_pct(rps)}")
+            if p99 is not None and p99 > threshold:
+                regressions.append(f"{phase}/{route}: p99 {_pct(p99)}")
+    for phase in ("inprocess", "http"):
+        a, b = (old.get(phase) or {}).get("memory"), (new.get(phase) or {}).get("memory")
+        if a and b and a.get("rss_mb") and b.get("rss_mb"):
+            rss = _change(a["rss_mb"], b["rss_mb"])
+            print(f"{phase:<10}{'rss_mb':<24}{a['rss_mb']:>11.1f}{b['rss_mb']:>11.1f}{_pct(rss):>8}")
+            if rss > threshold:
+                regressions.append(f"{phase}: RSS {_pct(rss)}")
+    return regressions
+
+
+def _pct(change: Optional[float]) -> str:
+    return "-" if change is None else f"{change:+.0%}"
+
+
+def git_commit(path: str) -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=path, capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
@@ -0,0 +1,191 @@
+import random
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode
+
+import orjson
+
+from bench.datasets import BBOX, INCIDENT_TYPES, SEVERITIES, STREETS
+
+# (path, headers, body); None when the scenario has nothing left to send.
+Request = Optional[Tuple[str, Dict[str, str], Optional[bytes]]]
+
+
+class Context:
+    """What scenarios need to know about the loaded dataset, plus state shared between requests."""
+
+    def __init__(self, summary: dict, seed: int = 7):
+        self.rng = random.Random(seed)
+        self.now = datetime.fromisoformat(summary["now"])
+        self.first_id = summary["first_incident_id"]
+        self.last_id = summary["last_incident_id"]
+        self.station_ids: List[int] = summary["station_ids"]
+        self.firefighters: int = summary["firefighters"]
+        self.created: deque = deque()
+        self.etags: Dict[str, str] = {}
+
+    def incident_id(self) -> int:
+        return self.rng.randint(self.first_id, self.last_id)
+
+    def station_id(self) -> int:
+        return self.rng.choice(self.station_ids)
+
+    def iso_ago(self, **delta) -> str:
+        return (self.now - timedelta(**delta)).isoformat()
+
+    def new_incident(self) -> dict:
+        south, west, north, east = BBOX
+        return {
+            "type": self.rng.choice(INCIDENT_TYPES)[0],
+            "severity": self.rng.choice(SEVERITIES),
+            "address": f"{self.rng.randint(1, 9999)} {self.rng.choice(STREETS)}",
+            "lat": self.rng.uniform(south, north),
+            "lng": self.rng.uniform(west, east),
+            "units_responding": ["E1"],
+        }
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    make: Callable[[Context], Request]
+    # Optional hook given (context, status, headers, body) after each response.
+    on_response: Optional[Callable[[Context, int, Dict[str, str], bytes], None]] = None
+    # Long-lived streams: timed to the response start / handshake and only run in-process.
+    stream: bool = False
+    websocket: bool = False
+
+
+def _get(path: str, **params) -> Callable[[Context], Request]:
+    def make(ctx: Context) -> Request:
+        query = {k: v(ctx) if callable(v) else v for k, v in params.items()}
+        return (f"{path}?{urlencode(query)}" if query else path), {}, None
+    return make
+
+
+def _json(payload) -> Tuple[Dict[str, str], bytes]:
+    return {"content-type": "application/json"}, orjson.dumps(payload)
+
+
+def _get_incident(ctx: Context) -> Request:
+    return f"/api/incidents/{ctx.incident_id()}", {}, None
+
+
+def _conditional_get(ctx: Context) -> Request:
+    path = f"/api/incidents/{ctx.first_id}"
+    etag = ctx.etags.get(path)
+    return path, ({"if-none-match": etag} if etag else {}), None
+
+
+def _remember_etag(ctx: Context, status: int, headers: Dict[str, str], body: bytes):
+    if "etag" in headers:
+        ctx.etags[f"/api/incidents/{ctx.first_id}"] = headers["etag"]
+
+
+def _create_incident(ctx: Context) -> Request:
+    return ("/api/incidents", *_json(ctx.new_incident()))
+
+
+def _remember_created(ctx: Context, status: int, headers: Dict[str, str], body: bytes):
+    if status == 201:
+        ctx.created.append(orjson.loads(body)["incident"]["id"])
+
+
+def _bulk_import(ctx: Context) -> Request:
+    rows = [{**ctx.new_incident(), "status": "Cleared", "reported_at": ctx.iso_ago(hours=i)} for i in range(100)]
+    return ("/api/incidents:bulk", *_json(rows))
+
+
+def _update_incident(ctx: Context) -> Request:
+    return (f"/api/incidents/{ctx.incident_id()}", *_json({"units_responding": ["E1", "M1"]}))
+
+
+def _create_firefighter(ctx: Context) -> Request:
+    payload = {"name": "Bench Mark", "rank": "Firefighter", "station_id": ctx.station_id(), "on_duty": True}
+    return ("/api/firefighters", *_json(payload))
+
+
+def _shift_change(ctx: Context) -> Request:
+    ids = ctx.rng.sample(range(1, ctx.firefighters + 1), min(400, ctx.firefighters))
+    return ("/api/firefighters:shift", *_json({"on_duty": ids[:200], "off_duty": ids[200:]}))
+
+
+def _delete_incident(ctx: Context) -> Request:
+    if not ctx.created:
+        return None
+    return f"/api/incidents/{ctx.created.popleft()}", {}, None
+
+
+# Reads first, then writes; incident_delete removes what incident_create added.
+SCENARIOS = [
+    Scenario("hello", "GET", _get("/api/hello")),
+    Scenario("stats", "GET", _get("/api/stats")),
+    Scenario("calls_by_day", "GET", _get("/api/metrics/calls_by_day", days=30)),
+    Scenario("calls_by_day_station", "GET", _get("/api/metrics/calls_by_day", days=365, station_id=Context.station_id)),
+    Scenario("calls_by_hour", "GET", _get("/api/metrics/calls_by_hour", hours=168)),
+    Scenario("response_times", "GET", _get("/api/metrics/response_times")),
+    Scenario("heatmap_geohash", "GET", _get("/api/metrics/heatmap", bbox=",".join(map(str, BBOX)), days=90, precision=6)),
+    Scenario("heatmap_grid", "GET", _get(
+        "/api/metrics/heatmap", bbox=",".join(map(str, BBOX)), days=365, cells="grid", cell_deg=0.01,
+    )),
+    Scenario("stations", "GET", _get("/api/stations")),
+    Scenario("stations_nearest", "GET", _get(
+        "/api/stations/nearest",
+        lat=lambda ctx: round(ctx.rng.uniform(BBOX[0], BBOX[2]), 5),
+        lng=lambda ctx: round(ctx.rng.uniform(BBOX[1], BBOX[3]), 5),
+        k=3,
+    )),
+    Scenario("firefighters", "GET", _get("/api/firefighters")),
+    Scenario("station_roster", "GET", lambda ctx: (f"/api/stations/{ctx.station_id()}/roster", {}, None)),
+    Scenario("units", "GET", _get("/api/units", status="Available")),
+    Scenario("dispatch_recommendation", "GET", _get(
+        "/api/dispatch/recommendation",
+        station_id=Context.station_id,
+        severity=lambda ctx: ctx.rng.choice(SEVERITIES),
+    )),
+    Scenario("incidents_page", "GET", _get("/api/incidents", limit=100)),
+    Scenario("incidents_filtered", "GET", _get(
+        "/api/incidents", station_id=Context.station_id, severity="High", limit=100
+    )),
+    Scenario("incidents_last_day", "GET", _get(
+        "/api/incidents", reported_after=lambda ctx: ctx.iso_ago(days=1), limit=1000
+    )),
+    Scenario("search_address", "GET", _get(
+        "/api/incidents/search",
+        q=lambda ctx: f"{ctx.rng.randint(100, 9999)} {ctx.rng.choice(STREETS).split()[0][:4]}",
+    )),
+    Scenario("search_typeahead", "GET", _get(
+        "/api/incidents/search", q=lambda ctx: ctx.rng.choice(STREETS)[:3]
+    )),
+    Scenario("incident_get", "GET", _get_incident),
+    Scenario("incident_get_304", "GET", _conditional_get, on_response=_remember_etag),
+    Scenario("export_ndjson", "GET", _get(
+        "/api/incidents/export",
+        format="ndjson",
+        station_id=Context.station_id,
+        reported_after=lambda ctx: ctx.iso_ago(days=7),
+    )),
+    Scenario("export_csv_gzip", "GET", _get(
+        "/api/incidents/export", format="csv", gzip="true", reported_after=lambda ctx: ctx.iso_ago(days=1)
+    )),
+    Scenario("stream_sse", "GET", _get("/api/incidents/stream"), stream=True),
+    Scenario("stream_ws", "GET", _get("/api/incidents/stream"), stream=True, websocket=True),
+    Scenario("metrics", "GET", _get("/metrics")),
+    Scenario("incident_create", "POST", _create_incident, on_response=_remember_created),
+    Scenario("incidents_bulk", "POST", _bulk_import),
+    Scenario("incident_update", "PATCH", _update_incident),
+    Scenario("firefighter_create", "POST", _create_firefighter),
+    Scenario("shift_change", "POST", _shift_change),
+    Scenario("incident_delete", "DELETE", _delete_incident),
+]
+
+
+def select(names: Optional[str]) -> List[Scenario]:
+    if not names:
+        return list(SCENARIOS)
+    wanted = names.split(",")
+    unknown = set(wanted) - {s.name for s in SCENARIOS}
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return [s for s in SCENARIOS if s.name in wanted]
@@ -0,0 +1,81 @@
+import asyncio
+from collections import deque
+from typing import Deque, List, Optional, Set, Tuple
+
+import orjson
+
+from records import IncidentRecord
+
+# (event id, event type, JSON-encoded payload)
+Event = Tuple[int, str, str]
+
+
+class Subscription:
+    def __init__(self, queue_size: int, backlog: List[Event], reset: bool):
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(queue_size)
+        self.backlog = backlog
+        # True when the requested resume point fell out of the replay buffer,
+        # i.e. the client missed events and should refetch its state.
+        self.reset = reset
+
+
+class Broadcaster:
+    """Single in-process fan-out of incident events to stream subscribers.
+
+    Each event is encoded once and handed to every subscriber's bounded
+    queue. A subscriber whose queue fills up is dropped (its stream ends);
+    it can reconnect with the last event id it saw and replay from the
+    ``history`` most recent events.
+    """
+
+    def __init__(self, history: int = 1000, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._seq = 0
+        self._history: Deque[Event] = deque(maxlen=history)
+        self._subscribers: Set[Subscription] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event_type: str, payload: dict):
+        self._seq += 1
+        event = (self._seq, event_type, orjson.dumps(payload).decode())
+        self._history.append(event)
+        for sub in list(self._subscribers):
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(sub)
+
+    def _drop(self, sub: Subscription):
+        self._subscribers.discard(sub)
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscription:
+        backlog: List[Event] = []
+        reset = False
+        if last_event_id is not None and last_event_id > self._seq:
+            reset = True  # ids from before a restart
+        elif last_event_id is not None and last_event_id < self._seq:
+            backlog = [e for e in self._history if e[0] > last_event_id]
+            reset = backlog[0][0] != last_event_id + 1
+        sub = Subscription(self.queue_size, backlog, reset)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        self._subscribers.discard(sub)
+
+    def on_incident_event(self, event: str, incident: IncidentRecord, previous: Optional[IncidentRecord]):
+        if event == "archived":
+            return
+        if event == "updated" and previous.status != incident.status:
+            event = "status"
+        self.publish(event, {"incident": incident.to_dict()})
+
+    def on_incident_batch(self, event: str, incidents: List[IncidentRecord]):
+        """A bulk import goes out as one ``imported`` event with its id range, not one event per row."""
+        if event == "created":
+            self.publish("imported", {"count": len(incidents), "first_id": incidents[0].id, "last_id": incidents[-1].id})
@@ -0,0 +1,133 @@
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+from compression import CODECS, MIN_SIZE, untag_etag
+
+
+class OrjsonResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class CachedJSONResponse(Response):
+    """Sends an already-encoded JSON body as is."""
+
+    media_type = "application/json"
+
+
+# Versions restart from zero with the process, so tags carry a per-boot token
+# to keep a pre-restart tag from matching different data.
+BOOT_TOKEN = os.urandom(4).hex()
+
+
+def make_etag(*parts) -> str:
+    return '"' + "-".join([BOOT_TOKEN, *map(str, parts)]) + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for this header).
+
+    Tags of compressed variants (``"...-gzip"``) match the tag they were
+    derived from: the underlying data is the same.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(untag_etag(tag.strip().removeprefix("W/")) == etag for tag in if_none_match.split(","))
+
+
+class ResponseCache:
+    """LRU of encoded response bodies stamped with the data version they reflect.
+
+    Keys are ``(collection, params)``. An entry is only served while its
+    version matches the collection's current version, so bumping a version
+    on mutation invalidates every cached body built from the old data. The
+    first body built for a new version drops the collection's other entries
+    at once rather than leaving them to age out of the LRU.
+
+    Bodies of at least ``MIN_SIZE`` bytes also keep their compressed
+    variants, each built the first time a client asks for that coding and
+    then shared by every client until the version moves on. The bound is on
+    bytes, variants included: least recently used entries go first, and a
+    body larger than the whole bound is served without being kept.
+    """
+
+    def __init__(self, max_bytes: int = 64 << 20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, bytes, Dict[str, bytes]]]" = OrderedDict()
+        # collection -> (its current version, keys cached for it)
+        self._collections: Dict[Hashable, Tuple[Hashable, Set[Hashable]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.compressions = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self, key: Hashable, version: Hashable, build: Callable[[], Any], coding: Optional[str] = None
+    ) -> Tuple[bytes, Optional[str]]:
+        """The body for ``key`` in ``coding`` where worthwhile, and the coding actually used."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        else:
+            self.misses += 1
+            entry = (version, orjson.dumps(build(), option=orjson.OPT_NON_STR_KEYS), {})
+            self._store(key, entry)
+        _, body, variants = entry
+        if coding is None or len(body) < MIN_SIZE:
+            return body, None
+        encoded = variants.get(coding)
+        if encoded is None:
+            self.compressions += 1
+            encoded = CODECS[coding](body)
+            if self._entries.get(key) is entry:
+                variants[coding] = encoded
+                self.size += len(encoded)
+                self._shrink()
+        return encoded, coding
+
+    def coding_for(self, key: Hashable, version: Hashable, coding: Optional[str]) -> Optional[str]:
+        """The coding ``get`` would answer with, without building anything (for 304s)."""
+        entry = self._entries.get(key)
+        if coding is None or entry is None or entry[0] != version or len(entry[1]) < MIN_SIZE:
+            return None
+        return coding
+
+    def _store(self, key: Hashable, entry: Tuple[Hashable, bytes, Dict[str, bytes]]) -> None:
+        version = entry[0]
+        collection = key[0]
+        current = self._collections.get(collection)
+        if current is None or current[0] != version:
+            for stale in current[1] if current is not None else ():
+                self._discard(stale)
+            current = self._collections[collection] = (version, set())
+        else:
+            self._discard(key)
+        if len(entry[1]) > self.max_bytes:
+            return
+        self._entries[key] = entry
+        current[1].add(key)
+        self.size += len(entry[1])
+        self._shrink()
+
+    def _shrink(self) -> None:
+        while self.size > self.max_bytes:
+            key = next(iter(self._entries))
+            self._discard(key)
+            self._collections[key[0]][1].discard(key)
+            self.evictions += 1
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1]) + sum(map(len, entry[2].values()))
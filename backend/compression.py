@@ -0,0 +1,145 @@
+import zlib
+from functools import lru_cache
+from typing import Callable, Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional: without it "br" is never negotiated
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # optional: without it "zstd" is never negotiated
+    zstandard = None
+
+# Bodies below this go out as is: the saving would not cover the extra work.
+MIN_SIZE = 1024
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+# Always streamed: the response start goes out at once rather than waiting
+# for a first event that may be a keep-alive interval away.
+STREAMING_TYPES = ("text/event-stream",)
+
+
+def _gzip(body: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    return compressor.compress(body) + compressor.flush()
+
+
+CODECS: Dict[str, Callable[[bytes], bytes]] = {"gzip": _gzip}
+if brotli is not None:
+    CODECS["br"] = lambda body: brotli.compress(body, quality=5)
+if zstandard is not None:
+    CODECS["zstd"] = lambda body: zstandard.ZstdCompressor(level=6).compress(body)
+# Server preference between codings the client rates equally.
+PREFERENCE = ("zstd", "br", "gzip")
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """The coding to use for an Accept-Encoding header, or None for identity.
+
+    Highest q-value wins and ties go to ``PREFERENCE``; ``*`` covers any
+    coding not named. Clients send a handful of distinct headers, so
+    answers are memoized.
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        weights[name.lower()] = q
+    best, best_q = None, 0.0
+    for coding in PREFERENCE:
+        if coding not in CODECS:
+            continue
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def tag_etag(etag: str, coding: Optional[str]) -> str:
+    """The ETag of an encoded representation: a coded body is different bytes, so it gets its own tag."""
+    if coding is None or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{coding}"'
+
+
+def untag_etag(etag: str) -> str:
+    for coding in CODECS:
+        suffix = f'-{coding}"'
+        if etag.endswith(suffix):
+            return etag[: -len(suffix)] + '"'
+    return etag
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing whole JSON and text bodies with the negotiated coding.
+
+    Responses that already carry a Content-Encoding (the precompressed
+    cache) pass through untouched, as do streamed bodies, which keep
+    their own ``gzip=`` option, and anything under ``min_size`` bytes.
+    The response start is only held back until the first body message
+    when the body may be compressed; event streams, other content types
+    and already encoded bodies get theirs forwarded straight away.
+    A compressed body's ETag is made weak, as it is no longer the
+    byte-for-byte representation the tag was issued for; revalidation
+    compares weakly and still matches.
+    """
+
+    def __init__(self, app, min_size: int = MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if (
+                    not compressible(content_type)
+                    or content_type.startswith(STREAMING_TYPES)
+                    or "content-encoding" in headers
+                ):
+                    await send(message)
+                else:
+                    start = message
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            headers = MutableHeaders(raw=list(start["headers"]))
+            body = message.get("body", b"")
+            if "accept-encoding" not in headers.get("vary", "").lower():
+                headers.add_vary_header("Accept-Encoding")
+            if coding is not None and not message.get("more_body") and len(body) >= self.min_size:
+                body = CODECS[coding](body)
+                headers["content-encoding"] = coding
+                headers["content-length"] = str(len(body))
+                if headers.get("etag", "").startswith('"'):
+                    headers["etag"] = "W/" + headers["etag"]
+                message = {**message, "body": body}
+            await send({**start, "headers": headers.raw})
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
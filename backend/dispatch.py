@@ -0,0 +1,239 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from records import IncidentRecord
+from spatial import haversine_km
+
+# Unit code prefix -> apparatus kind.
+KINDS = {"E": "Engine", "T": "Truck", "M": "Medic", "B": "Battalion"}
+# Order in which a station's apparatus_count is filled when seeding the roster.
+SEED_ORDER = ("E", "M", "T", "B")
+# Units sent for each severity, as kind prefixes.
+RESPONSE_PLANS = {
+    "Low": ("E",),
+    "Moderate": ("E", "M"),
+    "High": ("E", "E", "T", "M"),
+    "Critical": ("E", "E", "E", "T", "T", "M", "M", "B"),
+}
+
+STATUSES = ("Available", "Dispatched", "OnScene", "OutOfService")
+# Status changes that can be made by hand. Incidents move units to
+# Dispatched and OnScene and, once released, back to Available (or to
+# OutOfService for a unit that was out of service when dispatched).
+MANUAL_TRANSITIONS = {
+    "Available": {"OutOfService"},
+    "OutOfService": {"Available"},
+}
+
+# Travel-time model: minutes to get out of the station plus road distance
+# (straight line times a detour factor) at an average urban speed.
+TURNOUT_MIN = 1.0
+ROAD_FACTOR = 1.3
+SPEED_KMH = 40.0
+
+
+def unit_key(code: str) -> str:
+    return code.strip().upper()
+
+
+def seed_apparatus(stations: Iterable[dict]) -> List[dict]:
+    """A roster with each station's ``apparatus_count`` units, named by kind and station ("E1", "M1", "T1", ...)."""
+    roster = []
+    for station in stations:
+        seen: Dict[str, int] = {}
+        for n in range(station.get("apparatus_count") or 0):
+            prefix = SEED_ORDER[n % len(SEED_ORDER)]
+            seen[prefix] = seen.get(prefix, 0) + 1
+            suffix = "" if seen[prefix] == 1 else f"-{seen[prefix]}"
+            roster.append({
+                "id": len(roster) + 1,
+                "unit": f"{prefix}{station['id']}{suffix}",
+                "kind": KINDS[prefix],
+                "station_id": station["id"],
+                "in_service": True,
+            })
+    return roster
+
+
+class TravelMatrix:
+    """Precomputed station-to-station travel minutes.
+
+    Besides the matrix itself, every station keeps all stations ordered
+    by travel time to it, so a recommendation walks outwards from the
+    incident's station without sorting anything.
+    """
+
+    def __init__(self, stations: Iterable[dict] = ()):
+        self.rebuild(stations)
+
+    def rebuild(self, stations: Iterable[dict]):
+        located = [s for s in stations if s.get("lat") is not None]
+        self.minutes: Dict[int, Dict[int, float]] = {}
+        for a in located:
+            self.minutes[a["id"]] = {
+                b["id"]: TURNOUT_MIN + haversine_km(a["lat"], a["lng"], b["lat"], b["lng"]) * ROAD_FACTOR / SPEED_KMH * 60
+                for b in located
+            }
+        self.nearest_first: Dict[int, List[int]] = {
+            target: sorted(row, key=row.get) for target, row in self.minutes.items()
+        }
+
+
+class Unit:
+    __slots__ = ("id", "unit", "kind", "station_id", "in_service", "status", "incident_id")
+
+    def __init__(self, record: dict):
+        self.id = record["id"]
+        self.unit = unit_key(record["unit"])
+        self.kind = record["kind"]
+        self.station_id = record["station_id"]
+        self.in_service = record["in_service"]
+        self.status = "Available" if self.in_service else "OutOfService"
+        self.incident_id: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "unit": self.unit,
+            "kind": self.kind,
+            "station_id": self.station_id,
+            "status": self.status,
+            "incident_id": self.incident_id,
+        }
+
+    def record(self) -> dict:
+        """The persisted part: the roster entry, without incident-driven state."""
+        return {
+            "id": self.id,
+            "unit": self.unit,
+            "kind": self.kind,
+            "station_id": self.station_id,
+            "in_service": self.in_service,
+        }
+
+
+class ApparatusRegistry:
+    """Apparatus roster with a live status per unit.
+
+    Incidents drive the state machine through store events: a unit named
+    in an Active incident's ``units_responding`` is Dispatched (OnScene
+    once ``on_scene_at`` is set) and returns to Available when the
+    incident clears, drops the unit or is deleted. A unit answers one
+    incident at a time; naming it on a newer one moves it there. Unit
+    codes the roster does not know stay free text and are ignored.
+
+    Available units are also indexed by station and kind, so
+    ``recommend`` only touches the units it returns plus one lookup per
+    station it walks past.
+    """
+
+    def __init__(self, roster: Iterable[dict] = (), travel: Optional[TravelMatrix] = None):
+        self.travel = travel or TravelMatrix()
+        self.units: Dict[str, Unit] = {}
+        self._available: Dict[Tuple[int, str], Dict[str, Unit]] = {}
+        self.version = 0
+        for record in roster:
+            self.put(record)
+
+    def __len__(self) -> int:
+        return len(self.units)
+
+    def get(self, code: str) -> Optional[Unit]:
+        return self.units.get(unit_key(code))
+
+    def available_count(self) -> int:
+        return sum(len(units) for units in self._available.values())
+
+    def put(self, record: dict) -> Unit:
+        """Add a roster entry, or apply a changed one (e.g. from another worker)."""
+        code = unit_key(record["unit"])
+        unit = self.units.get(code)
+        if unit is None:
+            unit = self.units[code] = Unit(record)
+        else:
+            self._available.get((unit.station_id, unit.kind), {}).pop(code, None)
+            unit.station_id, unit.kind, unit.in_service = record["station_id"], record["kind"], record["in_service"]
+        self._set(unit, self._idle_status(unit) if unit.incident_id is None else unit.status)
+        self.version += 1
+        return unit
+
+    def set_status(self, unit: Unit, status: str):
+        """Take a unit in or out of service by hand; raises ValueError for changes the state machine forbids."""
+        if unit.status != status and status not in MANUAL_TRANSITIONS.get(unit.status, ()):
+            raise ValueError(f"{unit.unit} cannot go from {unit.status} to {status}")
+        unit.in_service = status == "Available"
+        self._set(unit, status)
+        self.version += 1
+
+    @staticmethod
+    def _idle_status(unit: Unit) -> str:
+        return "Available" if unit.in_service else "OutOfService"
+
+    def _set(self, unit: Unit, status: str):
+        key = (unit.station_id, unit.kind)
+        self._available.get(key, {}).pop(unit.unit, None)
+        unit.status = status
+        if status == "Available":
+            self._available.setdefault(key, {})[unit.unit] = unit
+
+    def _assign(self, incident: IncidentRecord):
+        status = "OnScene" if incident.on_scene_us is not None else "Dispatched"
+        for code in incident.units:
+            unit = self.units.get(unit_key(code))
+            if unit is not None:
+                unit.incident_id = incident.id
+                self._set(unit, status)
+
+    def _release(self, incident: IncidentRecord, keep: Iterable[str] = ()):
+        keep = {unit_key(c) for c in keep}
+        for code in incident.units:
+            unit = self.units.get(unit_key(code))
+            if unit is not None and unit.incident_id == incident.id and unit.unit not in keep:
+                unit.incident_id = None
+                self._set(unit, self._idle_status(unit))
+
+    def on_incident_event(self, event: str, incident: IncidentRecord, previous: Optional[IncidentRecord]):
+        if event == "created":
+            if incident.status == "Active":
+                self._assign(incident)
+        elif event == "deleted":
+            self._release(incident)
+        elif event == "updated":
+            if incident.status == "Active":
+                self._release(previous, keep=incident.units)
+                self._assign(incident)
+            else:
+                self._release(previous)
+        else:
+            return
+        self.version += 1
+
+    def recommend(self, station_id: int, severity: str) -> dict:
+        """The closest available units for the ``severity`` response plan, by travel time to ``station_id``.
+
+        Returns the picked units with their travel minutes and, under
+        ``short``, how many of each kind could not be found.
+        """
+        needed: Dict[str, int] = {}
+        for prefix in RESPONSE_PLANS[severity]:
+            needed[KINDS[prefix]] = needed.get(KINDS[prefix], 0) + 1
+        minutes = self.travel.minutes.get(station_id, {})
+        order = self.travel.nearest_first.get(station_id, [station_id])
+        picked = []
+        for origin in order:
+            if not needed:
+                break
+            for kind in list(needed):
+                units = self._available.get((origin, kind))
+                if not units:
+                    continue
+                for unit in sorted(units)[:needed[kind]]:
+                    picked.append({
+                        "unit": unit,
+                        "kind": kind,
+                        "station_id": origin,
+                        "travel_min": round(minutes.get(origin, TURNOUT_MIN), 1),
+                    })
+                    needed[kind] -= 1
+                if not needed[kind]:
+                    del needed[kind]
+        return {"station_id": station_id, "units": picked, "short": needed}
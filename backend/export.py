@@ -0,0 +1,130 @@
+import csv
+import io
+import zlib
+from typing import Iterable, Iterator, List, Optional
+
+import orjson
+
+from records import TIMESTAMP_SLOTS, IncidentRecord
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for parquet/arrow exports
+    pa = pq = None
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+COLUMNAR_FORMATS = ("parquet", "arrow")
+TIMESTAMP_FIELDS = ("reported_at", "dispatched_at", "on_scene_at", "cleared_at")
+
+Batches = Iterable[List[dict]]
+
+
+def csv_chunks(batches: Batches, fields: List[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for batch in batches:
+        for incident in batch:
+            writer.writerow([
+                ";".join(incident[f]) if f == "units_responding" else incident.get(f)
+                for f in fields
+            ])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def ndjson_chunks(batches: Batches, fields: List[str]) -> Iterator[bytes]:
+    for batch in batches:
+        yield b"".join(orjson.dumps({f: i.get(f) for f in fields}) + b"\n" for i in batch)
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever pyarrow wrote so far."""
+
+    def __init__(self):
+        self.closed = False
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def _arrow_type(field: str):
+    if field in ("id", "station_id"):
+        return pa.int64()
+    if field in TIMESTAMP_FIELDS:
+        return pa.timestamp("us", tz="UTC")
+    if field == "units_responding":
+        return pa.list_(pa.string())
+    if field in ("lat", "lng"):
+        return pa.float64()
+    return pa.string()
+
+
+def _column(batch: List[IncidentRecord], field: str) -> list:
+    if field in TIMESTAMP_SLOTS:
+        slot = TIMESTAMP_SLOTS[field]  # epoch microseconds, as the arrow type expects
+        return [getattr(i, slot) for i in batch]
+    return [i[field] for i in batch]
+
+
+def columnar_chunks(batches: Batches, fields: List[str], fmt: str) -> Iterator[bytes]:
+    """Parquet (one row group per batch) or Arrow IPC stream (one record batch per batch)."""
+    schema = pa.schema([(f, _arrow_type(f)) for f in fields])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema) if fmt == "parquet" else pa.ipc.new_stream(sink, schema)
+    for batch in batches:
+        table = pa.Table.from_arrays([pa.array(_column(batch, f), _arrow_type(f)) for f in fields], schema=schema)
+        writer.write_table(table)
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    writer.close()
+    yield sink.drain()
+
+
+def encode(fmt: str, batches: Batches, fields: List[str]) -> Iterator[bytes]:
+    if fmt == "csv":
+        return csv_chunks(batches, fields)
+    if fmt == "ndjson":
+        return ndjson_chunks(batches, fields)
+    return columnar_chunks(batches, fields, fmt)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def unavailable_reason(fmt: str) -> Optional[str]:
+    if fmt in COLUMNAR_FORMATS and pa is None:
+        return f"{fmt} export needs pyarrow installed on the server"
+    return None
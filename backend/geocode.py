@@ -0,0 +1,185 @@
+import asyncio
+import csv
+import importlib
+import os
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from search import tokenize
+
+Coordinates = Tuple[float, float]
+
+# Street-type spellings folded together, so "12 Main Street" finds "12 Main St".
+ABBREVIATIONS = {
+    "avenue": "ave",
+    "boulevard": "blvd",
+    "court": "ct",
+    "drive": "dr",
+    "highway": "hwy",
+    "lane": "ln",
+    "parkway": "pkwy",
+    "place": "pl",
+    "road": "rd",
+    "street": "st",
+    "terrace": "ter",
+    "terr": "ter",
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+}
+
+
+def normalize(address: str) -> str:
+    """The cache and gazetteer key for an address: "742 Evergreen Terrace" -> "742 evergreen ter"."""
+    return " ".join(ABBREVIATIONS.get(t, t) for t in tokenize(address))
+
+
+def street_key(key: str) -> Optional[str]:
+    """A normalized address without its house number, or None when it does not start with one."""
+    number, _, street = key.partition(" ")
+    return street if number.isdigit() and street else None
+
+
+class Gazetteer:
+    """Offline resolver backed by a CSV of ``address,lat,lng`` rows.
+
+    Rows may be full addresses or bare street names; an address with no
+    row of its own falls back to its street's row, which is enough to
+    place a call on a coverage map. A missing file resolves nothing.
+    """
+
+    # Lookups are dict hits, so they run inline rather than on a thread.
+    blocking = False
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.entries: Dict[str, Coordinates] = {}
+        if path and os.path.exists(path):
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    self.entries[normalize(row["address"])] = (float(row["lat"]), float(row["lng"]))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def resolve_many(self, keys: Iterable[str]) -> Dict[str, Coordinates]:
+        found = {}
+        for key in keys:
+            coordinates = self.entries.get(key)
+            if coordinates is None:
+                street = street_key(key)
+                coordinates = self.entries.get(street) if street else None
+            if coordinates is not None:
+                found[key] = coordinates
+        return found
+
+
+def open_resolver(spec: str, gazetteer_path: Optional[str]):
+    """``"gazetteer"``, ``"none"``, or ``"module:factory"`` for a custom resolver.
+
+    A resolver has ``resolve_many(keys) -> {key: (lat, lng)}``, taking
+    normalized addresses and leaving out those it cannot place, and a
+    ``blocking`` attribute; blocking resolvers (anything calling out over
+    the network) are run on a worker thread. Custom factories are called
+    with no arguments.
+    """
+    if spec == "none":
+        return None
+    if spec == "gazetteer":
+        return Gazetteer(gazetteer_path)
+    module, _, factory = spec.partition(":")
+    if not factory:
+        raise ValueError(f"Unknown geocoder {spec!r}")
+    return getattr(importlib.import_module(module), factory)()
+
+
+class Geocoder:
+    """Address -> coordinates through an LRU, an on-disk cache and finally the resolver.
+
+    Every address is looked up by its normalized form. Resolved
+    addresses are written to a SQLite file, so they survive restarts and
+    are shared by workers; failures are only remembered in memory, so a
+    later gazetteer or resolver can still place them.
+    """
+
+    def __init__(self, resolver, cache_path: Optional[str] = None, max_entries: int = 10_000):
+        self.resolver = resolver
+        self.max_entries = max_entries
+        self._lru: "OrderedDict[str, Optional[Coordinates]]" = OrderedDict()
+        self.conn: Optional[sqlite3.Connection] = None
+        if cache_path:
+            self.conn = sqlite3.connect(cache_path, isolation_level=None, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA busy_timeout=5000")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocodes (address TEXT PRIMARY KEY, lat REAL NOT NULL, lng REAL NOT NULL)"
+            )
+        self.hits = {"memory": 0, "disk": 0}
+        self.resolved = 0
+        self.failed = 0
+
+    def _remember(self, key: str, coordinates: Optional[Coordinates]):
+        self._lru[key] = coordinates
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _cached(self, keys: List[str]) -> Tuple[Dict[str, Optional[Coordinates]], List[str]]:
+        found: Dict[str, Optional[Coordinates]] = {}
+        missing = []
+        for key in keys:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                found[key] = self._lru[key]
+                self.hits["memory"] += 1
+            else:
+                missing.append(key)
+        if missing and self.conn is not None:
+            on_disk = {}
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                on_disk.update(
+                    (address, (lat, lng))
+                    for address, lat, lng in self.conn.execute(
+                        f"SELECT address, lat, lng FROM geocodes WHERE address IN ({marks})", chunk
+                    )
+                )
+            for key, coordinates in on_disk.items():
+                self._remember(key, coordinates)
+                found[key] = coordinates
+            self.hits["disk"] += len(on_disk)
+            missing = [k for k in missing if k not in on_disk]
+        return found, missing
+
+    async def resolve_many(self, addresses: Iterable[str]) -> Dict[str, Optional[Coordinates]]:
+        """Coordinates (or None) for each address, resolving every cache miss in one batch."""
+        keys = {address: normalize(address) for address in addresses}
+        found, missing = self._cached(list(dict.fromkeys(k for k in keys.values() if k)))
+        if missing and self.resolver is not None:
+            if self.resolver.blocking:
+                resolved = await asyncio.to_thread(self.resolver.resolve_many, missing)
+            else:
+                resolved = self.resolver.resolve_many(missing)
+            if resolved and self.conn is not None:
+                self.conn.execute("BEGIN")
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO geocodes (address, lat, lng) VALUES (?, ?, ?)",
+                    [(key, lat, lng) for key, (lat, lng) in resolved.items()],
+                )
+                self.conn.execute("COMMIT")
+            self.resolved += len(resolved)
+            self.failed += len(missing) - len(resolved)
+            for key in missing:
+                found[key] = resolved.get(key)
+                self._remember(key, found[key])
+        return {address: found.get(key) for address, key in keys.items()}
+
+    async def geocode(self, address: str) -> Optional[Coordinates]:
+        return (await self.resolve_many([address]))[address]
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
@@ -0,0 +1,225 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from records import IncidentRecord, unpack_location
+from timeseries import DAY_SECONDS, EPOCH
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Incidents are indexed by geohash cell of this precision, about 1.2 x 0.6 km:
+# fine enough for station coverage, coarse enough that a city has a few
+# thousand cells at most.
+BASE_PRECISION = 6
+
+BBox = Tuple[float, float, float, float]  # south, west, north, east
+
+
+def _spread(value: int) -> int:
+    """``value``'s bits with a zero between each: 0b111 -> 0b10101."""
+    spread = 0
+    for bit in range(8):
+        spread |= (value >> bit & 1) << (2 * bit)
+    return spread
+
+
+_SPREAD = [_spread(v) for v in range(256)]
+# Longitude and latitude bits in a BASE_PRECISION geohash.
+_AXIS_BITS = BASE_PRECISION * 5 // 2
+
+
+def grid_position(lat: float, lng: float) -> Tuple[int, int]:
+    """Row and column of the ``BASE_PRECISION`` cell holding a point."""
+    cells = 1 << _AXIS_BITS
+    row = min(max(int((lat + 90) / 180 * cells), 0), cells - 1)
+    col = min(max(int((lng + 180) / 360 * cells), 0), cells - 1)
+    return row, col
+
+
+def geohash(lat: float, lng: float) -> str:
+    """The ``BASE_PRECISION`` geohash of a point, by interleaving quantized coordinates."""
+    y, x = grid_position(lat, lng)
+    # Longitude takes the first (odd) bit of each pair.
+    code = (
+        (_SPREAD[x & 255] | _SPREAD[x >> 8 & 255] << 16) << 1
+        | _SPREAD[y & 255] | _SPREAD[y >> 8 & 255] << 16
+    )
+    return "".join(BASE32[code >> shift & 31] for shift in range(BASE_PRECISION * 5 - 5, -1, -5))
+
+
+@lru_cache(maxsize=65536)
+def geohash_bounds(cell: str) -> BBox:
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            span = lng_range if even else lat_range
+            mid = (span[0] + span[1]) / 2
+            if value >> shift & 1:
+                span[0] = mid
+            else:
+                span[1] = mid
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+@lru_cache(maxsize=65536)
+def geohash_center(cell: str) -> Tuple[float, float]:
+    south, west, north, east = geohash_bounds(cell)
+    return (south + north) / 2, (west + east) / 2
+
+
+class HeatmapIndex:
+    """Incident days per geohash cell, for map aggregation without raw incidents.
+
+    Each ``BASE_PRECISION`` cell holds the sorted day numbers of its
+    incidents, so a query bisects each cell once for its time window and
+    costs the same for a week or two years. Cells whose center is in the
+    bounding box are rolled up: to a coarser geohash by truncating the
+    cell, or onto a regular lat/lng grid by the cell center. Incidents
+    without coordinates are not counted.
+
+    Occupied cells are also kept sorted by grid row and column, so a
+    query visits only the rows its box spans and, within each, bisects
+    to the box's columns instead of walking every cell.
+
+    ``to_state``/``state`` save and resume the cells, as for the stats.
+    """
+
+    def __init__(self, incidents=(), state: Optional[dict] = None):
+        self._cells: Dict[str, array] = {}
+        self._grid: List[Tuple[int, int, str]] = []
+        self.located = 0
+        if state is not None:
+            self._cells = {cell: array("i", days) for cell, days in state["cells"].items()}
+            self._grid = sorted((*grid_position(*geohash_center(cell)), cell) for cell in self._cells)
+            self.located = state["located"]
+        for incident in incidents:
+            self._count(incident, 1)
+
+    @staticmethod
+    def _key(incident: IncidentRecord) -> Optional[Tuple[str, int]]:
+        if incident.location is None:
+            return None
+        return geohash(*unpack_location(incident.location)), incident.reported_us // 1_000_000 // DAY_SECONDS
+
+    def _count(self, incident: IncidentRecord, delta: int, key=None):
+        key = key or self._key(incident)
+        if key is None:
+            return
+        cell, day = key
+        days = self._cells.get(cell)
+        if delta > 0:
+            if days is None:
+                days = self._cells[cell] = array("i")
+                insort(self._grid, (*grid_position(*geohash_center(cell)), cell))
+            insort(days, day)
+        else:
+            del days[bisect_left(days, day)]
+            if not days:
+                del self._cells[cell]
+                del self._grid[bisect_left(self._grid, (*grid_position(*geohash_center(cell)), cell))]
+        self.located += delta
+
+    def on_incident_event(self, event: str, incident: IncidentRecord, previous: Optional[IncidentRecord]):
+        if event == "created":
+            self._count(incident, 1)
+        elif event == "deleted":
+            self._count(incident, -1)
+        elif event == "updated":
+            old, new = self._key(previous), self._key(incident)
+            if old != new:
+                if old is not None:
+                    self._count(previous, -1, old)
+                if new is not None:
+                    self._count(incident, 1, new)
+
+    def on_incident_batch(self, event: str, incidents: List[IncidentRecord]):
+        """A bulk insert: each cell's days are merged and re-sorted once, as are new cells.
+
+        Geohashes are computed once per distinct location; imports repeat
+        the same geocoded addresses.
+        """
+        if event != "created":
+            return
+        cells: Dict[int, str] = {}
+        by_cell: Dict[str, List[int]] = {}
+        for incident in incidents:
+            location = incident.location
+            if location is None:
+                continue
+            cell = cells.get(location)
+            if cell is None:
+                cell = cells[location] = geohash(*unpack_location(location))
+            by_cell.setdefault(cell, []).append(incident.reported_us // 1_000_000 // DAY_SECONDS)
+        new_cells = []
+        for cell, days in by_cell.items():
+            held = self._cells.get(cell)
+            if held is None:
+                new_cells.append((*grid_position(*geohash_center(cell)), cell))
+            else:
+                days += held
+            self._cells[cell] = array("i", sorted(days))
+            self.located += len(days) - len(held or ())
+        if new_cells:
+            self._grid.extend(new_cells)
+            self._grid.sort()
+
+    def to_state(self) -> dict:
+        return {"cells": {cell: days.tolist() for cell, days in self._cells.items()}, "located": self.located}
+
+    def _counts(self, bbox: BBox, first_day: int, last_day: int):
+        south, west, north, east = bbox
+        first_row, first_col = grid_position(south, west)
+        last_row, last_col = grid_position(north, east)
+        grid = self._grid
+        i = bisect_left(grid, (first_row, first_col))
+        while i < len(grid) and grid[i][0] <= last_row:
+            row, col, cell = grid[i]
+            if col < first_col:
+                i = bisect_left(grid, (row, first_col), i)
+                continue
+            if col > last_col:
+                i = bisect_left(grid, (row + 1, first_col), i)
+                continue
+            i += 1
+            lat, lng = geohash_center(cell)
+            if south <= lat <= north and west <= lng <= east:
+                days = self._cells[cell]
+                count = bisect_right(days, last_day) - bisect_left(days, first_day)
+                if count:
+                    yield cell, lat, lng, count
+
+    def by_geohash(self, bbox: BBox, first_day: int, last_day: int, precision: int) -> List[dict]:
+        totals: Counter = Counter()
+        for cell, _, _, count in self._counts(bbox, first_day, last_day):
+            totals[cell[:precision]] += count
+        rows = []
+        for cell, count in sorted(totals.items()):
+            lat, lng = geohash_center(cell)
+            rows.append({"geohash": cell, "lat": round(lat, 6), "lng": round(lng, 6), "count": count})
+        return rows
+
+    def by_grid(self, bbox: BBox, first_day: int, last_day: int, cell_deg: float) -> List[dict]:
+        south, west = bbox[0], bbox[1]
+        totals: Counter = Counter()
+        for _, lat, lng, count in self._counts(bbox, first_day, last_day):
+            totals[math.floor((lat - south) / cell_deg), math.floor((lng - west) / cell_deg)] += count
+        return [
+            {
+                "row": row,
+                "col": col,
+                "lat": round(south + (row + 0.5) * cell_deg, 6),
+                "lng": round(west + (col + 0.5) * cell_deg, 6),
+                "count": count,
+            }
+            for (row, col), count in sorted(totals.items())
+        ]
+
+
+def day_number(dt: datetime) -> int:
+    return int((dt - EPOCH).total_seconds()) // DAY_SECONDS
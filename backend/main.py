@@ -1,10 +1,83 @@
+import asyncio
+import base64
+import gc
+import heapq
+import orjson
+import os
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional, Literal
-from fastapi import FastAPI, HTTPException
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Literal, Tuple
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 
-app = FastAPI(title="Fire Department API", version="1.14.0")
+from admission import AdmissionControl, AdmissionMiddleware
+from analytics import ResponseTimeAnalytics
+from archive import Archive
+from broadcast import Broadcaster
+from dispatch import STATUSES, ApparatusRegistry, TravelMatrix, seed_apparatus
+import export
+from geocode import Geocoder, open_resolver
+from heatmap import BASE_PRECISION, HeatmapIndex, day_number
+from instrumentation import MetricsMiddleware, Registry
+from cache import CachedJSONResponse, OrjsonResponse, ResponseCache, etag_matches, make_etag
+from compression import CompressionMiddleware, negotiate, tag_etag
+from persistence import ChangeFeed, GroupCommitWriter, IdAllocator, open_backend
+from spatial import StationIndex
+from stats import StatsAggregator
+from records import IncidentRecord, epoch_us, intern_units, pack_location, parse_us
+from roster import Roster
+from search import SearchIndex
+from store import IncidentStore, index_keys
+from timeseries import CallTimeSeries
+
+# Storage settings: FIRE_STORAGE is "sqlite" (default), "log" or "memory".
+STORAGE_BACKEND = os.environ.get("FIRE_STORAGE", "sqlite")
+DATA_DIR = os.environ.get("FIRE_DATA_DIR", "var")
+GROUP_COMMIT_MS = int(os.environ.get("FIRE_GROUP_COMMIT_MS", "50"))
+SNAPSHOT_EVERY = int(os.environ.get("FIRE_SNAPSHOT_EVERY", "10000"))
+# Adds a Server-Timing header with the app's own processing time to every response.
+SERVER_TIMING = os.environ.get("FIRE_SERVER_TIMING", "") == "1"
+# Incidents Cleared for longer than this move to the compressed archive (0 keeps everything hot).
+ARCHIVE_AFTER_HOURS = float(os.environ.get("FIRE_ARCHIVE_AFTER_HOURS", "72"))
+ARCHIVE_SWEEP_SECONDS = float(os.environ.get("FIRE_ARCHIVE_SWEEP_SECONDS", "300"))
+# How often each worker replays writes other workers made to the shared SQLite store.
+SYNC_MS = int(os.environ.get("FIRE_SYNC_MS", "100"))
+# Admission control, per worker: concurrent reads, extra slots only writes may use,
+# the event loop lag at which reads count as saturated, and how old a response
+# may be to stand in for a read while they are.
+READ_CONCURRENCY = int(os.environ.get("FIRE_READ_CONCURRENCY", "32"))
+WRITE_RESERVE = int(os.environ.get("FIRE_WRITE_RESERVE", "8"))
+MAX_LAG_MS = int(os.environ.get("FIRE_MAX_LAG_MS", "50"))
+STALE_SECONDS = float(os.environ.get("FIRE_STALE_SECONDS", "10"))
+# Address resolver: "gazetteer" (offline, from FIRE_GAZETTEER), "none", or "module:factory".
+GEOCODER = os.environ.get("FIRE_GEOCODER", "gazetteer")
+GAZETTEER = os.environ.get("FIRE_GAZETTEER", os.path.join(os.path.dirname(__file__), "gazetteer.csv"))
+# Encoded response bodies kept per worker, compressed variants included.
+RESPONSE_CACHE_MB = float(os.environ.get("FIRE_RESPONSE_CACHE_MB", "64"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(archive_sweeper()) if ARCHIVE_AFTER_HOURS > 0 else None
+    replicator = asyncio.create_task(replicate_forever()) if feed is not None else None
+    yield
+    tasks = [t for t in (sweeper, replicator) if t is not None]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await admission.stop()
+    storage.close()
+    archive.close()
+    geocoder.close()
+
+app = FastAPI(
+    title="Fire Department API",
+    version="1.14.0",
+    lifespan=lifespan,
+    default_response_class=OrjsonResponse,
+)
 
 # Allow frontend dev server in local development
 app.add_middleware(
@@ -15,6 +88,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Added before metrics so that the recorded response sizes are the bytes actually sent.
+app.add_middleware(CompressionMiddleware)
+
+metrics_registry = Registry()
+admission = AdmissionControl(read_limit=READ_CONCURRENCY, write_reserve=WRITE_RESERVE, max_lag=MAX_LAG_MS / 1000)
+# Outside compression, so a stale replay is the already-compressed body.
+app.add_middleware(
+    AdmissionMiddleware,
+    registry=metrics_registry,
+    control=admission,
+    stale_seconds=STALE_SECONDS,
+)
+app.add_middleware(MetricsMiddleware, registry=metrics_registry, server_timing=SERVER_TIMING)
+
 # Sample Data
 UTC = timezone.utc
 
@@ -84,6 +171,9 @@ INCIDENTS = [
         "status": "Active",
         "address": "742 Evergreen Terrace",
         "reported_at": (now - timedelta(minutes=12)).isoformat(),
+        "dispatched_at": (now - timedelta(minutes=11)).isoformat(),
+        "on_scene_at": (now - timedelta(minutes=6)).isoformat(),
+        "cleared_at": None,
         "units_responding": ["E1", "T1", "B1", "M3"],
         "station_id": 1,
     },
@@ -94,6 +184,9 @@ INCIDENTS = [
         "status": "Cleared",
         "address": "88 Lakeview Rd",
         "reported_at": (now - timedelta(hours=3, minutes=5)).isoformat(),
+        "dispatched_at": (now - timedelta(hours=3, minutes=4)).isoformat(),
+        "on_scene_at": (now - timedelta(hours=2, minutes=57)).isoformat(),
+        "cleared_at": (now - timedelta(hours=2, minutes=20)).isoformat(),
         "units_responding": ["M2"],
         "station_id": 2,
     },
@@ -104,6 +197,9 @@ INCIDENTS = [
         "status": "Active",
         "address": "I-5 S & Exit 163",
         "reported_at": (now - timedelta(minutes=34)).isoformat(),
+        "dispatched_at": (now - timedelta(minutes=33)).isoformat(),
+        "on_scene_at": (now - timedelta(minutes=26)).isoformat(),
+        "cleared_at": None,
         "units_responding": ["E3", "M4", "B2"],
         "station_id": 3,
     },
@@ -114,50 +210,342 @@ INCIDENTS = [
         "status": "Cleared",
         "address": "55 Commerce Park",
         "reported_at": (now - timedelta(days=1, hours=2)).isoformat(),
+        "dispatched_at": (now - timedelta(days=1, hours=1, minutes=58)).isoformat(),
+        "on_scene_at": (now - timedelta(days=1, hours=1, minutes=53)).isoformat(),
+        "cleared_at": (now - timedelta(days=1, hours=1, minutes=40)).isoformat(),
         "units_responding": ["E2"],
         "station_id": 2,
     },
 ]
 
-def month_start(dt: datetime) -> datetime:
-    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+storage = GroupCommitWriter(open_backend(STORAGE_BACKEND, DATA_DIR, SNAPSHOT_EVERY), GROUP_COMMIT_MS)
+saved_state = storage.backend.load()
+if saved_state is None:
+    for table, records in (("stations", STATIONS), ("firefighters", FIRE_FIGHTERS), ("incidents", INCIDENTS)):
+        for record in records:
+            storage.put(table, record)
+else:
+    STATIONS[:] = saved_state["stations"]
+    FIRE_FIGHTERS[:] = saved_state["firefighters"]
+    INCIDENTS[:] = saved_state.pop("incidents")
+# Apparatus roster; stores from before it existed get one seeded from apparatus_count.
+APPARATUS = (saved_state or {}).get("apparatus") or seed_apparatus(STATIONS)
+if not (saved_state or {}).get("apparatus"):
+    for record in APPARATUS:
+        storage.put("apparatus", record)
+
+def persist_incident(event: str, incident: IncidentRecord, previous: Optional[IncidentRecord]):
+    if event in ("deleted", "archived"):
+        storage.delete("incidents", incident.id)
+    elif previous is None:
+        storage.put("incidents", incident.to_dict())
+    else:
+        # Only the changed fields win over another worker's concurrent update.
+        record, before = incident.to_dict(), previous.to_dict()
+        storage.put("incidents", record, [field for field, value in record.items() if before.get(field) != value])
+
+def persist_incidents(event: str, incidents: List[IncidentRecord]):
+    if event == "archived":
+        storage.delete_many("incidents", [i.id for i in incidents])
+    else:
+        storage.put_many("incidents", [i.to_dict() for i in incidents])
+
+STATION_IDS = {s["id"] for s in STATIONS}
+station_index = StationIndex(STATIONS)
+
+def drain(records: list):
+    """Yield and release records oldest first, so each loaded dict is freed once the store has converted it."""
+    records.reverse()
+    while records:
+        yield records.pop()
+
+# Cold tier for long-cleared incidents; kept in memory when persistence is off.
+archive = Archive(None if STORAGE_BACKEND == "memory" else os.path.join(DATA_DIR, "archive"))
+# Shared id sequences, so concurrent workers never hand out the same id.
+incident_ids = IdAllocator(
+    storage.backend, "incidents", max(101, archive.max_id + 1, *(i["id"] + 1 for i in INCIDENTS))
+)
+firefighter_ids = IdAllocator(storage.backend, "firefighters", max((f["id"] for f in FIRE_FIGHTERS), default=0) + 1)
+roster = Roster(drain(FIRE_FIGHTERS))
+incident_store = IncidentStore(drain(INCIDENTS), allocate_ids=incident_ids.take)
+incident_store.subscribe(persist_incident, persist_incidents)
+# Hot copies of archived incidents, left by an interrupted sweep, go before
+# any view counts them: the archive's share may come from the checkpoint.
+incident_store.evict([i.id for i in incident_store.all() if i.id in archive])
+# Views that also count archived incidents, by their key in the archive
+# checkpoint. Each resumes from the checkpoint's state of the archive, then
+# adds the hot store; blocks archived after the checkpoint are replayed below.
+ARCHIVE_VIEWS = {
+    "stats": StatsAggregator,
+    "calls": CallTimeSeries,
+    "response_times": ResponseTimeAnalytics,
+    "search": SearchIndex,
+    "heatmap": HeatmapIndex,
+}
+archived_state = archive.checkpoint or {}
+stats_aggregator = StatsAggregator(incident_store.all(), state=archived_state.get("stats"))
+incident_store.subscribe(stats_aggregator.on_incident_event, stats_aggregator.on_incident_batch)
+call_series = CallTimeSeries(incident_store.all(), state=archived_state.get("calls"))
+incident_store.subscribe(call_series.on_incident_event, call_series.on_incident_batch)
+response_times = ResponseTimeAnalytics(incident_store.all(), state=archived_state.get("response_times"))
+incident_store.subscribe(response_times.on_incident_event)
+search_index = SearchIndex(incident_store.all(), state=archived_state.get("search"))
+incident_store.subscribe(search_index.on_incident_event, search_index.on_incident_batch)
+heatmap = HeatmapIndex(incident_store.all(), state=archived_state.get("heatmap"))
+incident_store.subscribe(heatmap.on_incident_event, heatmap.on_incident_batch)
+geocoder = Geocoder(
+    open_resolver(GEOCODER, GAZETTEER),
+    None if STORAGE_BACKEND == "memory" else os.path.join(DATA_DIR, "geocode.sqlite"),
+)
+apparatus = ApparatusRegistry(APPARATUS, TravelMatrix(STATIONS))
+for incident in reversed(incident_store.page(len(incident_store), ids=incident_store.ids_where("status", "Active"))):
+    apparatus.on_incident_event("created", incident, None)
+incident_store.subscribe(apparatus.on_incident_event)
+
+ARCHIVE_BATCH = 1_000
+
+def archive_cleared(now: datetime, limit: int = ARCHIVE_BATCH) -> int:
+    """Move up to ``limit`` incidents Cleared before the archive window into the archive.
+
+    The archive is written (and fsynced) before the hot copies are evicted,
+    so a crash in between leaves duplicates that ``absorb_archived`` drops,
+    never a lost incident. One worker sweeps at a time; it first takes in
+    whatever the others archived so nothing is archived twice.
+    """
+    cutoff = epoch_us(now) - int(ARCHIVE_AFTER_HOURS * 3_600_000_000)
+    with archive.exclusive() as acquired:
+        if not acquired:
+            return 0
+        absorb_archived(archive.refresh())
+        stale = []
+        for incident_id in incident_store.ids_where("status", "Cleared"):
+            incident = incident_store.get(incident_id)
+            if (incident.cleared_us or incident.reported_us) <= cutoff:
+                stale.append(incident)
+                if len(stale) == limit:
+                    break
+        archive.append(stale)
+    incident_store.evict([i.id for i in stale])
+    return len(stale)
+
+def checkpoint_archive(directory: str) -> int:
+    """Fold blocks archived since the last checkpoint into its view state and save it; returns the blocks covered.
+
+    Works on its own copy of the archive and of the views, starting from
+    the saved checkpoint rather than the live views (which also hold hot
+    incidents), so it can run on a worker thread.
+    """
+    copy = Archive(directory)
+    try:
+        state = copy.checkpoint or {}
+        views = {name: view(state=state.get(name)) for name, view in ARCHIVE_VIEWS.items()}
+        for record in copy.records(copy.checkpointed):
+            for view in views.values():
+                view.on_incident_event("created", record, None)
+        copy.save_checkpoint({name: view.to_state() for name, view in views.items()})
+        return copy.checkpointed
+    finally:
+        copy.close()
+
+async def archive_sweeper():
+    # Blocks replayed at startup are checkpointed on the first round.
+    replayed = archive.checkpointed < len(archive.blocks)
+    while True:
+        # Sweep in batches so a large backlog never holds the event loop for long.
+        swept = archive_cleared(datetime.now(tz=UTC))
+        archived = swept
+        while swept == ARCHIVE_BATCH:
+            await asyncio.sleep(0)
+            swept = archive_cleared(datetime.now(tz=UTC))
+            archived += swept
+        if archive.directory is not None and (archived or replayed):
+            archive.checkpointed = await asyncio.to_thread(checkpoint_archive, archive.directory)
+            replayed = False
+        await asyncio.sleep(ARCHIVE_SWEEP_SECONDS)
+
+def absorb_archived(records: Iterable[IncidentRecord]):
+    """Count archived history in the derived views, and drop hot copies of it.
+
+    Hot copies come from an interrupted sweep or from another worker
+    archiving incidents this one still holds.
+    """
+    duplicates = []
+    for record in records:
+        if record.id in incident_store:
+            duplicates.append(record.id)
+            continue
+        for view in (stats_aggregator, call_series, response_times, search_index, heatmap):
+            view.on_incident_event("created", record, None)
+    incident_store.evict(duplicates)
+
+absorb_archived(archive.records(archive.checkpointed))
+broadcaster = Broadcaster()
+incident_store.subscribe(broadcaster.on_incident_event, broadcaster.on_incident_batch)
+
+STREAM_KEEPALIVE_SECONDS = 15
+
+# Encoded GET bodies, reused until the data they were built from changes.
+# Incidents are versioned by the store; the other collections bump these.
+response_cache = ResponseCache(int(RESPONSE_CACHE_MB * (1 << 20)))
+data_versions = {"stations": 0}
+
+metrics_registry.counter_func(
+    "store_get_total",
+    "Incident lookups by id.",
+    lambda: {(("result", "hit"),): incident_store.get_hits, (("result", "miss"),): incident_store.get_misses},
+)
+metrics_registry.counter_func(
+    "store_index_lookups_total", "Secondary index lookups.", lambda: {(): incident_store.index_lookups}
+)
+metrics_registry.gauge(
+    "store_snapshot_undo_entries",
+    "Replaced incident records kept for open snapshots.",
+    lambda: {(): incident_store.undo_entries()},
+)
+metrics_registry.counter_func(
+    "response_cache_total",
+    "Encoded-response cache lookups.",
+    lambda: {(("result", "hit"),): response_cache.hits, (("result", "miss"),): response_cache.misses},
+)
+metrics_registry.counter_func(
+    "response_cache_compressions_total",
+    "Cached bodies compressed for a new coding.",
+    lambda: {(): response_cache.compressions},
+)
+metrics_registry.counter_func(
+    "response_cache_evictions_total",
+    "Cached bodies dropped to stay within the size bound.",
+    lambda: {(): response_cache.evictions},
+)
+metrics_registry.gauge("response_cache_bytes", "Bytes of cached bodies and variants.", lambda: {(): response_cache.size})
+metrics_registry.counter_func(
+    "geocode_lookups_total",
+    "Address lookups by where they were answered.",
+    lambda: {
+        (("result", "memory"),): geocoder.hits["memory"],
+        (("result", "disk"),): geocoder.hits["disk"],
+        (("result", "resolved"),): geocoder.resolved,
+        (("result", "failed"),): geocoder.failed,
+    },
+)
+metrics_registry.gauge("incidents_stored", "Incidents in the store.", lambda: {(): len(incident_store)})
+metrics_registry.gauge("incidents_archived", "Incidents in the cold archive.", lambda: {(): len(archive)})
+metrics_registry.gauge(
+    "firefighters_on_duty",
+    "On-duty firefighters by station.",
+    lambda: {(("station_id", str(s)),): n for s, n in roster.on_duty_by_station.items()},
+)
+metrics_registry.gauge("units_available", "Apparatus available for dispatch.", lambda: {(): apparatus.available_count()})
+metrics_registry.gauge("stream_subscribers", "Open live-feed connections.", lambda: {(): len(broadcaster)})
+metrics_registry.gauge("storage_pending_writes", "Writes waiting for group commit.", lambda: {(): len(storage)})
+
+# Lets Firebase Hosting's CDN absorb repeat reads; browsers always revalidate.
+CACHE_CONTROL = {
+    "stations": "public, max-age=0, s-maxage=30",
+    "firefighters": "public, max-age=0, s-maxage=30",
+    "roster": "public, max-age=0, s-maxage=30",
+    "incidents": "public, max-age=0, s-maxage=5",
+    "stats": "public, max-age=0, s-maxage=5",
+    "search": "public, max-age=0, s-maxage=5",
+    "units": "public, max-age=0, s-maxage=5",
+    "heatmap": "public, max-age=0, s-maxage=30",
+}
+
+def cached_json(request: Request, key: tuple, version: tuple, build) -> Response:
+    """Cached, ETag-stamped JSON for ``key``, or 304 when the client's copy is current.
+
+    The body goes out in the negotiated coding, taken from the cache's
+    precompressed variants; each coding has its own ETag.
+    """
+    collection = key[0]
+    etag = make_etag(collection, *version)
+    coding = negotiate(request.headers.get("accept-encoding"))
+    headers = {"Cache-Control": CACHE_CONTROL[collection], "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        headers["ETag"] = tag_etag(etag, response_cache.coding_for(key, version, coding))
+        return Response(status_code=304, headers=headers)
+    body, coding = response_cache.get(key, version, build, coding)
+    headers["ETag"] = tag_etag(etag, coding)
+    if coding is not None:
+        headers["Content-Encoding"] = coding
+    return CachedJSONResponse(body, headers=headers)
 
 def compute_stats():
     _now = datetime.now(tz=UTC)
-    calls_today = sum(
-        1 for i in INCIDENTS if datetime.fromisoformat(i["reported_at"]).date() == _now.date()
-    )
-    calls_this_month = sum(
-        1 for i in INCIDENTS if datetime.fromisoformat(i["reported_at"]) >= month_start(_now)
-    )
-    active_incidents = sum(1 for i in INCIDENTS if i["status"].lower() == "active")
-    avg_response_time_min = 5.7  # mock
-    firefighters_on_duty = sum(f["on_duty"] for f in FIRE_FIGHTERS)
+    counters = stats_aggregator.snapshot(_now)
+    mean = response_times.overall.mean
+    avg_response_time_min = round(mean, 1) if mean is not None else None
     stations_count = len(STATIONS)
     return {
-        "calls_today": calls_today,
-        "calls_this_month": calls_this_month,
+        "calls_today": counters["calls_today"],
+        "calls_this_month": counters["calls_this_month"],
         "avg_response_time_min": avg_response_time_min,
-        "active_incidents": active_incidents,
-        "firefighters_on_duty": firefighters_on_duty,
+        "active_incidents": counters["active_incidents"],
+        "firefighters_on_duty": roster.on_duty,
         "stations": stations_count,
         "last_updated": _now.isoformat(),
     }
 
-def next_incident_id() -> int:
-    return (max((i["id"] for i in INCIDENTS), default=100)) + 1
+def iso_utc(dt: Optional[datetime]) -> Optional[str]:
+    if dt is None:
+        return None
+    return (dt if dt.tzinfo else dt.replace(tzinfo=UTC)).isoformat()
+
+async def take_ids(allocator: IdAllocator, count: int = 1) -> int:
+    """The first of ``count`` fresh ids, reserved on a worker thread when that means waiting on the shared store."""
+    first = allocator.take_cached(count)
+    if first is None:
+        first = await asyncio.to_thread(allocator.take, count)
+    return first
+
+def series_key(station_id: Optional[int], type: Optional[str], severity: Optional[str]):
+    given = [(d, v) for d, v in (("station_id", station_id), ("type", type), ("severity", severity)) if v is not None]
+    if len(given) > 1:
+        raise HTTPException(status_code=400, detail="Filter by at most one of station_id, type, severity")
+    return given[0] if given else ("all", None)
 
 def ensure_station_exists(station_id: int):
-    if not any(s["id"] == station_id for s in STATIONS):
+    if station_id not in STATION_IDS:
         raise HTTPException(status_code=400, detail="Invalid station_id")
 
+def suggest_station_id(lat: Optional[float], lng: Optional[float]) -> Optional[int]:
+    """The nearest station to an incident location, when one was given."""
+    if lat is None or lng is None or not len(station_index):
+        return None
+    return station_index.nearest(lat, lng, 1)[0][1]["id"]
+
 class IncidentCreate(BaseModel):
     type: str
     severity: Literal["Low", "Moderate", "High", "Critical"]
     address: str
-    station_id: int
+    # Omit station_id to dispatch from the station nearest the incident. Without
+    # lat/lng the location comes from geocoding the address.
+    station_id: Optional[int] = None
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lng: Optional[float] = Field(None, ge=-180, le=180)
     units_responding: List[str] = Field(default_factory=list)
 
+class IncidentImport(IncidentCreate):
+    """A historical incident as sent by CAD/dispatch backfills."""
+    status: Literal["Active", "Cleared"] = "Active"
+    reported_at: Optional[datetime] = None
+    dispatched_at: Optional[datetime] = None
+    on_scene_at: Optional[datetime] = None
+    cleared_at: Optional[datetime] = None
+
+class IncidentUpdate(BaseModel):
+    type: Optional[str] = None
+    severity: Optional[Literal["Low", "Moderate", "High", "Critical"]] = None
+    status: Optional[Literal["Active", "Cleared"]] = None
+    address: Optional[str] = None
+    # A changed address without lat/lng is geocoded again.
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lng: Optional[float] = Field(None, ge=-180, le=180)
+    units_responding: Optional[List[str]] = None
+    dispatched_at: Optional[datetime] = None
+    on_scene_at: Optional[datetime] = None
+    cleared_at: Optional[datetime] = None
+
 class Firefighter(BaseModel):
     id: int
     name: str
@@ -171,44 +559,428 @@ class FirefighterCreate(BaseModel):
     station_id: int
     on_duty: bool = False
 
+class ShiftChange(BaseModel):
+    """Firefighter ids to put on and take off duty, hundreds at a time."""
+    on_duty: List[int] = Field(default_factory=list, max_length=10_000)
+    off_duty: List[int] = Field(default_factory=list, max_length=10_000)
+
+class StationShiftChange(BaseModel):
+    """The incoming crew; everyone else at the station goes off duty."""
+    on_duty: List[int] = Field(max_length=10_000)
+
+class UnitStatusUpdate(BaseModel):
+    status: Literal["Available", "OutOfService"]
+
+# With several workers on one SQLite store, each replays the others'
+# writes through the same store events as its own, so indexes, caches and
+# live feeds stay current everywhere.
+feed = ChangeFeed(storage) if storage.backend.shared else None
+
+def apply_changes(changes: Iterable[Tuple[str, int, Optional[dict]]]):
+    with storage.muted():
+        for table, record_id, data in changes:
+            if table == "firefighters" and data is not None:
+                roster.put(data)
+            elif table == "apparatus" and data is not None:
+                apparatus.put(data)
+            elif table != "incidents":
+                continue
+            elif data is None:
+                incident_store.delete(record_id)
+            elif record_id in incident_store:
+                if incident_store.get(record_id).to_dict() != data:
+                    incident_store.update(record_id, data)
+            elif record_id > archive.max_id or archive.get(record_id) is None:
+                incident_store.add(data)
+
+def read_feed():
+    """``(changes, None)`` from the change feed, or ``(None, stored state)`` when we fell behind it.
+
+    Only reads the shared store, so it can run on a worker thread.
+    """
+    changes = feed.poll()
+    return (changes, None) if changes is not None else (None, feed.reload())
+
+def replicate(read=None):
+    """Bring this worker up to date with the shared store, from ``read_feed()``'s result if it was read already."""
+    absorb_archived(archive.refresh())
+    changes, state = read or read_feed()
+    if state is not None:
+        # Fell behind the retained feed: diff against the full stored state.
+        stored = {r["id"]: r for r in state["incidents"]}
+        changes = [("incidents", r.id, None) for r in incident_store.all() if r.id not in stored]
+        changes += [("incidents", i, r) for i, r in stored.items()]
+        changes += [("firefighters", f["id"], f) for f in state["firefighters"]]
+        changes += [("apparatus", u["id"], u) for u in state["apparatus"]]
+        changes = [(table, record_id, data, feed.seq) for table, record_id, data in changes]
+    apply_changes(feed.current(changes))
+
+async def replicate_forever():
+    while True:
+        await asyncio.sleep(SYNC_MS / 1000)
+        replicate(await asyncio.to_thread(read_feed))
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/hello")
 async def hello():
     return {"message": "Welcome to the Fire Department API"}
 
 @app.get("/api/stats")
-async def stats():
-    return compute_stats()
+async def stats(request: Request):
+    version = (incident_store.version, roster.version, datetime.now(tz=UTC).date())
+    return cached_json(request, ("stats",), version, compute_stats)
+
+@app.get("/api/metrics/calls_by_day")
+async def calls_by_day(
+    days: int = Query(30, ge=1, le=call_series.max_days),
+    station_id: Optional[int] = None,
+    type: Optional[str] = None,
+    severity: Optional[str] = None,
+):
+    key = series_key(station_id, type, severity)
+    return {"series": call_series.calls_by_day(days, datetime.now(tz=UTC), key)}
+
+@app.get("/api/metrics/calls_by_hour")
+async def calls_by_hour(
+    hours: int = Query(24, ge=1, le=call_series.max_hours),
+    station_id: Optional[int] = None,
+    type: Optional[str] = None,
+    severity: Optional[str] = None,
+):
+    key = series_key(station_id, type, severity)
+    return {"series": call_series.calls_by_hour(hours, datetime.now(tz=UTC), key)}
+
+@app.get("/api/metrics/response_times")
+async def response_time_metrics():
+    return response_times.report()
+
+def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    try:
+        south, west, north, east = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be south,west,north,east")
+    if not (-90 <= south < north <= 90 and -180 <= west < east <= 180):
+        raise HTTPException(status_code=400, detail="bbox must be south,west,north,east")
+    return south, west, north, east
+
+@app.get("/api/metrics/heatmap")
+async def incident_heatmap(
+    request: Request,
+    bbox: str,
+    days: int = Query(30, ge=1, le=call_series.max_days),
+    cells: Literal["geohash", "grid"] = "geohash",
+    precision: int = Query(5, ge=1, le=BASE_PRECISION),
+    cell_deg: float = Query(0.01, ge=0.005, le=10),
+):
+    """Incident counts per map cell in ``bbox`` over the last ``days`` days, including today."""
+    box = parse_bbox(bbox)
+    today = day_number(datetime.now(tz=UTC))
+    size = precision if cells == "geohash" else cell_deg
+
+    def build():
+        if cells == "geohash":
+            rows = heatmap.by_geohash(box, today - days + 1, today, precision)
+        else:
+            rows = heatmap.by_grid(box, today - days + 1, today, cell_deg)
+        return {"bbox": list(box), "days": days, "cells": cells, "size": size, "counts": rows}
+
+    key = ("heatmap", box, days, cells, size)
+    return cached_json(request, key, (incident_store.version, today), build)
+
+@app.get("/api/stations/nearest")
+async def nearest_stations(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    k: int = Query(1, ge=1, le=50),
+):
+    return {
+        "stations": [
+            {**station, "distance_km": round(distance, 3)}
+            for distance, station in station_index.nearest(lat, lng, k)
+        ]
+    }
 
 @app.get("/api/stations")
-async def list_stations():
-    return {"stations": STATIONS}
+async def list_stations(request: Request):
+    # on_duty_count is the roster's live counter, not the seeded figure.
+    return cached_json(
+        request,
+        ("stations",),
+        (data_versions["stations"], roster.version),
+        lambda: {"stations": [{**s, "on_duty_count": roster.on_duty_by_station[s["id"]]} for s in STATIONS]},
+    )
 
-@app.get("/api/firefighters", response_model=List[Firefighter])
-async def list_firefighters():
-    return {"firefighters": FIRE_FIGHTERS}
+@app.get("/api/firefighters")
+async def list_firefighters(
+    request: Request,
+    station_id: Optional[int] = None,
+    rank: Optional[str] = None,
+    on_duty: Optional[bool] = None,
+):
+    return cached_json(
+        request,
+        ("firefighters", station_id, rank, on_duty),
+        (roster.version,),
+        lambda: {"firefighters": roster.select(station_id, rank, on_duty)},
+    )
 
 @app.post("/api/firefighters", status_code=201)
 async def create_firefighter(payload: FirefighterCreate):
-    new_id = max(f["id"] for f in FIRE_FIGHTERS) + 1
-    firefighter = Firefighter(id=new_id, **payload.dict())
-    FIRE_FIGHTERS.append(firefighter)
+    firefighter = Firefighter(id=await take_ids(firefighter_ids), **payload.dict())
+    record = firefighter.dict()
+    roster.put(record)
+    storage.put("firefighters", record)
     return {"firefighter": firefighter}
 
+def change_shifts(changes: Dict[int, bool]) -> dict:
+    unknown = sorted(i for i in changes if i not in roster)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown firefighters: {', '.join(map(str, unknown))}")
+    changed = roster.set_on_duty(changes)
+    for record in changed:
+        storage.put("firefighters", record, ["on_duty"])
+    return {"updated": len(changed), "firefighters_on_duty": roster.on_duty}
+
+@app.post("/api/firefighters:shift")
+async def shift_firefighters(payload: ShiftChange):
+    both = set(payload.on_duty) & set(payload.off_duty)
+    if both:
+        raise HTTPException(status_code=400, detail=f"Both on and off duty: {', '.join(map(str, sorted(both)))}")
+    changes = {i: True for i in payload.on_duty}
+    changes.update((i, False) for i in payload.off_duty)
+    return change_shifts(changes)
+
+@app.post("/api/stations/{station_id}/shift-change")
+async def station_shift_change(station_id: int, payload: StationShiftChange):
+    ensure_station_exists(station_id)
+    members = {f["id"] for f in roster.select(station_id)}
+    strangers = sorted(set(payload.on_duty) - members)
+    if strangers:
+        raise HTTPException(status_code=400, detail=f"Not at station {station_id}: {', '.join(map(str, strangers))}")
+    incoming = set(payload.on_duty)
+    return change_shifts({i: i in incoming for i in members})
+
+@app.get("/api/stations/{station_id}/roster")
+async def station_roster(request: Request, station_id: int, on_duty: Optional[bool] = None):
+    if station_id not in STATION_IDS:
+        raise HTTPException(status_code=404, detail="Station not found")
+    return cached_json(
+        request,
+        ("roster", station_id, on_duty),
+        (roster.version,),
+        lambda: {
+            "station_id": station_id,
+            **roster.staffing(station_id),
+            "firefighters": roster.select(station_id, on_duty=on_duty),
+        },
+    )
+
 @app.post("/api/incidents", status_code=201)
 async def create_incident(payload: IncidentCreate):
-    ensure_station_exists(payload.station_id)
+    lat, lng = payload.lat, payload.lng
+    if lat is None or lng is None:
+        lat, lng = await geocoder.geocode(payload.address) or (None, None)
+    station_id = payload.station_id
+    if station_id is None:
+        station_id = suggest_station_id(lat, lng)
+        if station_id is None:
+            raise HTTPException(status_code=400, detail="Give station_id, the incident's lat/lng or an address we can place")
+    ensure_station_exists(station_id)
     incident = {
-        "id": next_incident_id(),
+        "id": await take_ids(incident_ids),
         "type": payload.type,
         "severity": payload.severity,
         "status": "Active",
         "address": payload.address,
         "reported_at": datetime.now(tz=UTC).isoformat(),
         "units_responding": payload.units_responding or [],
-        "station_id": payload.station_id,
+        "station_id": station_id,
+        "dispatched_at": None,
+        "on_scene_at": None,
+        "cleared_at": None,
+        "lat": lat,
+        "lng": lng,
+    }
+    body = {"incident": incident_store.add(incident).to_dict()}
+    if not payload.units_responding:
+        # Nothing dispatched yet: suggest who to send.
+        body["recommended_units"] = apparatus.recommend(station_id, payload.severity)["units"]
+    return body
+
+@app.get("/api/units")
+async def list_units(
+    request: Request,
+    station_id: Optional[int] = None,
+    status: Optional[Literal[STATUSES]] = None,
+):
+    def build():
+        units = [
+            u.to_dict() for u in apparatus.units.values()
+            if (station_id is None or u.station_id == station_id) and (status is None or u.status == status)
+        ]
+        return {"units": units}
+    return cached_json(request, ("units", station_id, status), (apparatus.version,), build)
+
+@app.patch("/api/units/{unit}")
+async def update_unit(unit: str, payload: UnitStatusUpdate):
+    found = apparatus.get(unit)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Unit not found")
+    try:
+        apparatus.set_status(found, payload.status)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    storage.put("apparatus", found.record())
+    return {"unit": found.to_dict()}
+
+@app.get("/api/dispatch/recommendation")
+async def dispatch_recommendation(
+    severity: Literal["Low", "Moderate", "High", "Critical"],
+    station_id: Optional[int] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+):
+    if station_id is None:
+        station_id = suggest_station_id(lat, lng)
+        if station_id is None:
+            raise HTTPException(status_code=400, detail="Give station_id or the incident's lat/lng")
+    ensure_station_exists(station_id)
+    return apparatus.recommend(station_id, severity)
+
+BULK_MAX_ROWS = 100_000
+BULK_CHUNK_ROWS = 5_000
+
+def parse_bulk_rows(body: bytes, content_type: str) -> Tuple[List[Tuple[int, object]], List[dict]]:
+    """Decode a JSON array or NDJSON body into ``(row number, value)`` pairs, collecting per-line decode errors.
+
+    NDJSON rows are numbered by line: blank lines are skipped and
+    undecodable ones reported, so numbers still match lines.
+    """
+    if "ndjson" not in content_type and body.lstrip()[:1] == b"[":
+        try:
+            rows = orjson.loads(body)
+        except orjson.JSONDecodeError as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {exc}")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array")
+        return list(enumerate(rows)), []
+    rows, errors = [], []
+    for line_no, line in enumerate(body.splitlines()):
+        if not line.strip():
+            continue
+        try:
+            rows.append((line_no, orjson.loads(line)))
+        except orjson.JSONDecodeError as exc:
+            errors.append({"row": line_no, "errors": [f"Invalid JSON: {exc}"]})
+    return rows, errors
+
+@contextmanager
+def gc_paused():
+    """Hold off the cyclic GC while a bulk import allocates.
+
+    The rows, models and records it creates hold no cycles, yet a burst of
+    that many allocations would otherwise run collections that rescan the
+    whole incident table; one chunk's worth of garbage waits instead.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+@app.post("/api/incidents:bulk")
+async def bulk_create_incidents(request: Request):
+    body = await request.body()
+    now = datetime.now(tz=UTC)
+    items = []
+    with gc_paused():
+        rows, errors = parse_bulk_rows(body, request.headers.get("content-type", ""))
+        if len(rows) + len(errors) > BULK_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ROWS} rows per request")
+        for row_no, row in rows:
+            if not isinstance(row, dict):
+                errors.append({"row": row_no, "errors": ["Expected a JSON object"]})
+                continue
+            try:
+                items.append((row_no, IncidentImport.model_validate(row)))
+            except ValidationError as exc:
+                errors.append({"row": row_no, "errors": [e["msg"] for e in exc.errors()]})
+    # Place every row without coordinates in one batch.
+    places = await geocoder.resolve_many(item.address for _, item in items if item.lat is None or item.lng is None)
+    incidents, rows_ok = [], []
+    with gc_paused():
+        for row_no, item in items:
+            lat, lng = item.lat, item.lng
+            if lat is None or lng is None:
+                lat, lng = places[item.address] or (None, None)
+            station_id = item.station_id
+            if station_id is None:
+                station_id = suggest_station_id(lat, lng)
+            if station_id not in STATION_IDS:
+                errors.append({"row": row_no, "errors": ["Invalid station_id"]})
+                continue
+            # Built as records straight from the parsed datetimes, with no ISO strings in between.
+            incidents.append(IncidentRecord(
+                None,
+                item.type,
+                item.severity,
+                item.status,
+                item.address,
+                station_id,
+                intern_units(item.units_responding),
+                epoch_us(item.reported_at or now),
+                parse_us(item.dispatched_at),
+                parse_us(item.on_scene_at),
+                parse_us(item.cleared_at),
+                pack_location(lat, lng),
+            ))
+            rows_ok.append(row_no)
+    # Inserted in chunks, each reaching the derived views and the live feed
+    # as one batch, with other requests served in between.
+    records = []
+    for start in range(0, len(incidents), BULK_CHUNK_ROWS):
+        if start:
+            await asyncio.sleep(0)
+        chunk = incidents[start:start + BULK_CHUNK_ROWS]
+        first_id = await take_ids(incident_ids, len(chunk))
+        with gc_paused():
+            records += incident_store.add_many(chunk, first_id)
+    errors.sort(key=lambda e: e["row"])
+    return {
+        "inserted": len(records),
+        "ids": [{"row": row_no, "id": r.id} for row_no, r in zip(rows_ok, records)],
+        "errors": errors,
     }
-    INCIDENTS.insert(0, incident)
-    return {"incident": incident}
+
+GEOCODE_BATCH_MAX = 5_000
+
+@app.post("/api/incidents:geocode")
+async def geocode_incidents(limit: int = Query(1000, ge=1, le=GEOCODE_BATCH_MAX), after: int = 0):
+    """Backfill coordinates for up to ``limit`` hot incidents without them, in id order after ``after``.
+
+    Addresses are resolved in one batch. Incidents that cannot be placed
+    stay as they are; pass ``next`` back as ``after`` to move past them.
+    """
+    pending = heapq.nsmallest(limit, (i.id for i in incident_store.all() if i.location is None and i.id > after))
+    addresses = {incident_id: incident_store.get(incident_id).address for incident_id in pending}
+    places = await geocoder.resolve_many(set(addresses.values()))
+    resolved = unresolved = 0
+    for incident_id, address in addresses.items():
+        incident = incident_store.get(incident_id)
+        if incident is None or incident.location is not None or incident.address != address:
+            continue  # changed while the batch was being resolved
+        place = places[address]
+        if place is None:
+            unresolved += 1
+            continue
+        incident_store.update(incident_id, {"lat": place[0], "lng": place[1]})
+        resolved += 1
+    return {"resolved": resolved, "unresolved": unresolved, "next": pending[-1] if len(pending) == limit else None}
 
 class Incident(BaseModel):
     id: int
@@ -219,45 +991,312 @@ class Incident(BaseModel):
     reported_at: str
     units_responding: List[str]
     station_id: int
+    dispatched_at: Optional[str] = None
+    on_scene_at: Optional[str] = None
+    cleared_at: Optional[str] = None
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+
+INCIDENT_FIELDS = tuple(Incident.model_fields)
+
+def encode_cursor(key) -> str:
+    return base64.urlsafe_b64encode(f"{key[0]}:{key[1]}".encode()).decode()
 
-@app.get("/api/incidents", response_model=List[Incident])
-async def get_incidents(status: Optional[str] = None):
-    filtered_incidents = INCIDENTS
-    if status:
-        filtered_incidents = [i for i in INCIDENTS if i["status"].lower() == status.lower()]
-    return filtered_incidents
+def decode_cursor(cursor: str):
+    try:
+        reported_us, incident_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return int(reported_us), int(incident_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in INCIDENT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+class IncidentQuery(NamedTuple):
+    criteria: Tuple[Tuple[str, object], ...]
+    since_us: Optional[int]
+    until_us: Optional[int]
+
+    def page_args(self) -> dict:
+        """The filters as keyword arguments for ``IncidentStore.page``."""
+        return {
+            "ids": incident_store.match(dict(self.criteria)),
+            "since_us": self.since_us,
+            "until_us": self.until_us,
+        }
+
+    def archived(self, before=None, blocks=None, after=None) -> Iterator[IncidentRecord]:
+        """Matching archived incidents, newest first, to merge behind the hot ones."""
+        criteria = dict(self.criteria)
+        # Only Cleared incidents are archived, so other statuses skip it outright.
+        if index_keys(criteria.get("status", "Cleared")) != index_keys("Cleared"):
+            return iter(())
+        return archive.iter_desc(self.since_us, self.until_us, before, blocks, criteria, after)
+
+def incident_filters(
+    status: Optional[str] = None,
+    severity: Optional[str] = None,
+    station_id: Optional[int] = None,
+    type: Optional[str] = None,
+    unit: Optional[str] = None,
+    reported_after: Optional[datetime] = None,
+    reported_before: Optional[datetime] = None,
+) -> IncidentQuery:
+    criteria = tuple(
+        (field, value)
+        for field, value in (
+            ("status", status),
+            ("severity", severity),
+            ("station_id", station_id),
+            ("type", type),
+            ("units_responding", unit),
+        )
+        if value not in (None, "")
+    )
+    return IncidentQuery(
+        criteria,
+        epoch_us(reported_after) if reported_after else None,
+        epoch_us(reported_before) if reported_before else None,
+    )
+
+def incident_page(filters: IncidentQuery, limit: int, cursor: Optional[str], fields: Optional[str]) -> dict:
+    selected = parse_fields(fields)
+    before = decode_cursor(cursor) if cursor else None
+    page = incident_store.page(limit, before, **filters.page_args())
+    if len(archive):
+        # A full hot page only takes archived rows newer than its last one,
+        # which for the usual recent pages rules out every block unread.
+        after = incident_store.time_key(page[-1]) if len(page) == limit else None
+        merged = heapq.merge(page, filters.archived(before, after=after), key=incident_store.time_key, reverse=True)
+        page = list(islice(merged, limit))
+    next_cursor = encode_cursor(incident_store.time_key(page[-1])) if len(page) == limit else None
+    if selected:
+        rows = [{f: i[f] for f in selected} for i in page]
+    else:
+        rows = [i.to_dict() for i in page]
+    return {"incidents": rows, "next_cursor": next_cursor}
+
+@app.get("/api/incidents")
+async def get_incidents(
+    request: Request,
+    filters: IncidentQuery = Depends(incident_filters),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    return cached_json(
+        request,
+        ("incidents", filters, limit, cursor, fields),
+        (incident_store.version,),
+        lambda: incident_page(filters, limit, cursor, fields),
+    )
+
+def incident_batches(filters: IncidentQuery, batch_size: int = 1000) -> Iterator[List[IncidentRecord]]:
+    """Hot and archived incidents matching ``filters``, newest first, in batches.
+
+    The rows are those of one moment, however long the caller takes: the
+    store is read through a snapshot and the archive only up to the
+    blocks it had then. Incidents swept to the archive meanwhile are
+    still read from the snapshot, and not a second time from their block.
+    """
+    snapshot = incident_store.snapshot()
+    hot = snapshot.scan(batch_size, **filters.page_args())
+    if not len(archive):
+        yield from hot
+        return
+    rows = heapq.merge(
+        chain.from_iterable(hot),
+        filters.archived(blocks=len(archive.blocks)),
+        key=incident_store.time_key,
+        reverse=True,
+    )
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+async def paced(chunks):
+    # Yield to the event loop between chunks so a long export never stalls
+    # other requests; incident_batches reads a snapshot, so writes in between are not seen.
+    for chunk in chunks:
+        yield chunk
+        await asyncio.sleep(0)
+
+@app.get("/api/incidents/export")
+async def export_incidents(
+    filters: IncidentQuery = Depends(incident_filters),
+    format: Literal["csv", "ndjson", "parquet", "arrow"] = "csv",
+    fields: Optional[str] = None,
+    gzip: bool = False,
+):
+    reason = export.unavailable_reason(format)
+    if reason:
+        raise HTTPException(status_code=400, detail=reason)
+    selected = parse_fields(fields) or list(INCIDENT_FIELDS)
+    chunks = export.encode(format, incident_batches(filters), selected)
+    filename = f"incidents.{format}"
+    media_type = export.MEDIA_TYPES[format]
+    if gzip:
+        chunks = export.gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        paced(chunks),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+def search_page(q: str, limit: int, cursor: Optional[str]) -> dict:
+    before = decode_cursor(cursor) if cursor else None
+    keys = search_index.search(q, limit, before)
+    page = []
+    for _, incident_id in keys:
+        incident = incident_store.get(incident_id) or archive.get(incident_id)
+        # The index can briefly outlive a row, e.g. a replicated delete.
+        if incident is not None:
+            page.append(incident.to_dict())
+    next_cursor = encode_cursor(keys[-1]) if len(keys) == limit else None
+    return {"incidents": page, "next_cursor": next_cursor}
+
+@app.get("/api/incidents/search")
+async def search_incidents(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=200),
+    cursor: Optional[str] = None,
+):
+    return cached_json(
+        request,
+        ("search", q, limit, cursor),
+        (incident_store.version,),
+        lambda: search_page(q, limit, cursor),
+    )
+
+def sse_message(event) -> str:
+    event_id, event_type, data = event
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+def ws_message(event) -> str:
+    event_id, event_type, data = event
+    return f'{{"id":{event_id},"event":"{event_type}","data":{data}}}'
+
+@app.get("/api/incidents/stream")
+async def incident_stream(
+    last_event_id: Optional[int] = Query(None),
+    last_event_id_header: Optional[int] = Header(None, alias="Last-Event-ID"),
+):
+    sub = broadcaster.subscribe(last_event_id_header if last_event_id_header is not None else last_event_id)
+
+    async def events():
+        try:
+            if sub.reset:
+                yield "event: reset\ndata: {}\n\n"
+            for event in sub.backlog:
+                yield sse_message(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield sse_message(event)
+        finally:
+            broadcaster.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/api/incidents/stream")
+async def incident_stream_ws(websocket: WebSocket, last_event_id: Optional[int] = None):
+    await websocket.accept()
+    sub = broadcaster.subscribe(last_event_id)
+    try:
+        if sub.reset:
+            await websocket.send_text('{"event":"reset"}')
+        for event in sub.backlog:
+            await websocket.send_text(ws_message(event))
+        while True:
+            event = await sub.queue.get()
+            if event is None:
+                await websocket.close(code=1013, reason="Subscriber fell behind; reconnect with last_event_id")
+                break
+            await websocket.send_text(ws_message(event))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broadcaster.unsubscribe(sub)
+
+def ensure_hot_incident(incident_id: int):
+    if incident_id in incident_store:
+        return
+    if archive.get(incident_id) is not None:
+        raise HTTPException(status_code=409, detail="Incident is archived and read-only")
+    raise HTTPException(status_code=404, detail="Incident not found")
 
 @app.get("/api/incidents/{incident_id}", response_model=Incident)
-async def get_incident(incident_id: int):
-    incident = next((i for i in INCIDENTS if i["id"] == incident_id), None)
-    if not incident:
+async def get_incident(incident_id: int, request: Request, response: Response):
+    incident = incident_store.get(incident_id)
+    version = incident_store.incident_version(incident_id)
+    if incident is None:
+        incident, version = archive.get(incident_id), "archived"
+    if incident is None:
         raise HTTPException(status_code=404, detail="Incident not found")
-    return incident
+    etag = make_etag("incident", incident_id, version)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL["incidents"]}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return incident.to_dict()
 
 @app.patch("/api/incidents/{incident_id}")
-async def update_incident(incident_id: int, payload: IncidentCreate):
-    incident = next((i for i in INCIDENTS if i["id"] == incident_id), None)
-    if not incident:
-        raise HTTPException(status_code=404, detail="Incident not found")
-    
+async def update_incident(incident_id: int, payload: IncidentUpdate):
+    location = None
+    current = incident_store.get(incident_id)
+    if payload.lat is not None and payload.lng is not None:
+        location = payload.lat, payload.lng
+    elif payload.address and current is not None and payload.address != current.address:
+        # Before the existence check: a resolver may await, and nothing may change after the check.
+        # A failed lookup leaves the stored coordinates alone.
+        location = await geocoder.geocode(payload.address)
+    ensure_hot_incident(incident_id)
+
     # Update fields provided
+    changes = {}
     if payload.type:
-        incident["type"] = payload.type
+        changes["type"] = payload.type
     if payload.severity:
-        incident["severity"] = payload.severity
+        changes["severity"] = payload.severity
+    if payload.status:
+        changes["status"] = payload.status
     if payload.address:
-        incident["address"] = payload.address
+        changes["address"] = payload.address
+    if location is not None:
+        changes["lat"], changes["lng"] = location
     if payload.units_responding:
-        incident["units_responding"] = payload.units_responding
+        changes["units_responding"] = payload.units_responding
+    for field in ("dispatched_at", "on_scene_at", "cleared_at"):
+        if getattr(payload, field):
+            changes[field] = iso_utc(getattr(payload, field))
+    if payload.status == "Cleared" and incident_store.get(incident_id).cleared_us is None:
+        changes.setdefault("cleared_at", datetime.now(tz=UTC).isoformat())
 
-    return {"incident": incident}
+    incident = incident_store.update(incident_id, changes)
+    return {"incident": incident.to_dict()}
 
 @app.delete("/api/incidents/{incident_id}", status_code=204)
 async def delete_incident(incident_id: int):
-    global INCIDENTS
-    incident = next((i for i in INCIDENTS if i["id"] == incident_id), None)
-    if not incident:
-        raise HTTPException(status_code=404, detail="Incident not found")
-    
-    INCIDENTS = [i for i in INCIDENTS if i["id"] != incident_id]
+    ensure_hot_incident(incident_id)
+    incident_store.delete(incident_id)
     return
\ No newline at end of file
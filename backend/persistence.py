@@ -0,0 +1,499 @@
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import orjson
+
+TABLES = ("stations", "firefighters", "incidents", "apparatus")
+
+# A pending write: (table, record id, JSON-encoded record or None for a delete,
+# the fields an update changed or None when it replaces the whole record).
+Op = Tuple[str, int, Optional[str], Optional[Tuple[str, ...]]]
+# Change-feed entry: (sequence number, origin process, table, record id, record JSON or None).
+Change = Tuple[int, str, str, int, Optional[str]]
+
+logger = logging.getLogger(__name__)
+
+
+class StorageBackend(ABC):
+    """Durable home for stations, firefighters, incidents and apparatus.
+
+    ``load`` returns ``{table: [record, ...]}`` or None when nothing has been
+    stored yet. ``write_batch`` applies a list of ops atomically and must not
+    return before they are on disk.
+    """
+
+    # Whether several worker processes can share the backend; those that
+    # can are ``SharedBackend``s.
+    shared = False
+
+    @abstractmethod
+    def load(self) -> Optional[Dict[str, List[dict]]]:
+        ...
+
+    @abstractmethod
+    def write_batch(self, ops: List[Op]):
+        ...
+
+    def close(self):
+        pass
+
+
+class SharedBackend(StorageBackend):
+    """A backend several worker processes use at once, with shared ids and a change feed.
+
+    ``origin`` tags this process's entries in the feed, and ``loaded_seq``
+    is the feed position the last ``load`` reflects. ``versions`` maps
+    ``(table, id)`` to the feed position this process's copy of a record
+    reflects, for records written or replayed since; the rest are as of
+    ``loaded_seq``.
+    """
+
+    shared = True
+    loaded_seq = 0
+    versions: Dict[Tuple[str, int], int]
+
+    @abstractmethod
+    def allocate_ids(self, name: str, count: int, floor: int) -> int:
+        """Reserve ``count`` consecutive ids no lower than ``floor``; returns the first."""
+
+    @abstractmethod
+    def changes_since(self, seq: int) -> Optional[List[Change]]:
+        """Feed entries after ``seq``, or None if some were already pruned."""
+
+
+class MemoryBackend(StorageBackend):
+    def load(self):
+        return None
+
+    def write_batch(self, ops):
+        pass
+
+
+class SQLiteBackend(SharedBackend):
+    """SQLite in WAL mode, safe to share between worker processes.
+
+    Each committed batch is also appended to a ``changes`` table tagged
+    with this process's ``origin``, which other workers poll to replay
+    writes they did not make; the newest ``feed_retention`` entries are
+    kept. Ids come from a ``sequences`` table so workers never hand out
+    the same one.
+
+    Every row carries the feed position of its last write as its version.
+    An update is a compare-and-set against the version this process last
+    saw: if another worker wrote the record since, only the fields the
+    update changed are applied on top of the stored row. Deletes leave a
+    tombstone, and writes to a tombstoned record are dropped. Either way
+    the stored outcome goes into the feed with an empty origin, so the
+    writer replays it too.
+    """
+
+    def __init__(self, path: str, feed_retention: int = 100_000):
+        self.origin = uuid.uuid4().hex
+        self.feed_retention = feed_retention
+        self.loaded_seq = 0
+        self.versions = {}
+        # Writes come from the group-commit thread, id reservations from the
+        # event loop; one connection serves both, one transaction at a time.
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        for table in TABLES:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, data TEXT NOT NULL, seq INTEGER NOT NULL DEFAULT 0)"
+            )
+            # Stores from before rows were versioned.
+            if "seq" not in {column[1] for column in self.conn.execute(f"PRAGMA table_info({table})")}:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS changes "
+            "(seq INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, tbl TEXT NOT NULL, id INTEGER NOT NULL, data TEXT)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, next INTEGER NOT NULL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tombstones (tbl TEXT NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (tbl, id)) WITHOUT ROWID"
+        )
+
+    @contextmanager
+    def _transaction(self, mode: str = "IMMEDIATE"):
+        with self._lock:
+            self.conn.execute(f"BEGIN {mode}")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def load(self):
+        # One read transaction, so the feed position matches the rows loaded.
+        with self._transaction("DEFERRED") as conn:
+            state = {
+                table: [orjson.loads(data) for (data,) in conn.execute(f"SELECT data FROM {table} ORDER BY id")]
+                for table in TABLES
+            }
+            self.loaded_seq = self._last_seq(conn)
+            # Only writes committed after the load are newer than it.
+            self.versions = {key: seq for key, seq in self.versions.items() if seq > self.loaded_seq}
+        return state if any(state.values()) else None
+
+    @staticmethod
+    def _last_seq(conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+        return row[0] if row else 0
+
+    def write_batch(self, ops):
+        seen = {}
+        with self._transaction() as conn:
+            # The write lock is held, so the feed positions are ours to number.
+            seq = self._last_seq(conn)
+            changes = []
+            for table, record_id, data, fields in ops:
+                seq += 1
+                key = (table, record_id)
+                origin = self.origin
+                if data is None:
+                    conn.execute(f"DELETE FROM {table} WHERE id = ?", (record_id,))
+                    conn.execute("INSERT OR IGNORE INTO tombstones (tbl, id) VALUES (?, ?)", key)
+                elif conn.execute("SELECT 1 FROM tombstones WHERE tbl = ? AND id = ?", key).fetchone():
+                    data, origin = None, ""  # deleted meanwhile
+                elif fields is None:
+                    conn.execute(
+                        f"INSERT INTO {table} (id, data, seq) VALUES (?, ?, ?) "
+                        "ON CONFLICT (id) DO UPDATE SET data = excluded.data, seq = excluded.seq",
+                        (record_id, data, seq),
+                    )
+                elif not conn.execute(
+                    f"UPDATE {table} SET data = ?, seq = ? WHERE id = ? AND seq <= ?",
+                    (data, seq, record_id, self.versions.get(key, self.loaded_seq)),
+                ).rowcount:
+                    stored = conn.execute(f"SELECT data FROM {table} WHERE id = ?", (record_id,)).fetchone()
+                    if stored is not None:
+                        # Written by another worker since: apply just our fields on top of theirs.
+                        record, ours = orjson.loads(stored[0]), orjson.loads(data)
+                        record.update((field, ours[field]) for field in fields)
+                        data, origin = orjson.dumps(record).decode(), ""
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO {table} (id, data, seq) VALUES (?, ?, ?)", (record_id, data, seq)
+                    )
+                changes.append((seq, origin, table, record_id, data))
+                # A resolved write is still to be replayed here.
+                seen[key] = seq if origin else seq - 1
+            conn.executemany("INSERT INTO changes (seq, origin, tbl, id, data) VALUES (?, ?, ?, ?, ?)", changes)
+            if seq % 1000 < len(ops):
+                conn.execute("DELETE FROM changes WHERE seq <= ?", (seq - self.feed_retention,))
+        self.versions.update(seen)
+
+    def allocate_ids(self, name, count, floor):
+        with self._transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO sequences (name, next) VALUES (?, ?)", (name, floor))
+            first = max(floor, conn.execute("SELECT next FROM sequences WHERE name = ?", (name,)).fetchone()[0])
+            conn.execute("UPDATE sequences SET next = ? WHERE name = ?", (first + count, name))
+        return first
+
+    def changes_since(self, seq):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT seq, origin, tbl, id, data FROM changes WHERE seq > ? ORDER BY seq", (seq,)
+            ).fetchall()
+        if rows and rows[0][0] > seq + 1:
+            return None  # pruned past this reader
+        return rows
+
+    def close(self):
+        self.conn.close()
+
+
+class LogBackend(StorageBackend):
+    """Append-only NDJSON op log folded into a snapshot every ``snapshot_every`` ops.
+
+    Startup reads the snapshot and replays at most ``snapshot_every`` log
+    lines. Ops are idempotent puts/deletes, so a crash between writing a new
+    snapshot and truncating the log only replays ops already folded in.
+    """
+
+    def __init__(self, directory: str, snapshot_every: int = 10000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.log_path = os.path.join(directory, "log.ndjson")
+        self.snapshot_every = snapshot_every
+        self.log = open(self.log_path, "a", encoding="utf-8")
+        with open(self.log_path, encoding="utf-8") as f:
+            self.log_ops = sum(1 for _ in f)
+        if self.log_ops >= snapshot_every:
+            self.compact()
+
+    def _read(self) -> Dict[str, Dict[int, dict]]:
+        state: Dict[str, Dict[int, dict]] = {table: {} for table in TABLES}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as f:
+                for table, records in orjson.loads(f.read()).items():
+                    state[table] = {r["id"]: r for r in records}
+        with open(self.log_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # torn final write
+                entry = orjson.loads(line)
+                if entry["data"] is None:
+                    state[entry["table"]].pop(entry["id"], None)
+                else:
+                    state[entry["table"]][entry["id"]] = entry["data"]
+        return state
+
+    def load(self):
+        state = {table: [r[k] for k in sorted(r)] for table, r in self._read().items()}
+        return state if any(state.values()) else None
+
+    def write_batch(self, ops):
+        for table, record_id, data, _ in ops:
+            self.log.write(f'{{"table":"{table}","id":{record_id},"data":{data or "null"}}}\n')
+        self.log.flush()
+        os.fsync(self.log.fileno())
+        self.log_ops += len(ops)
+        if self.log_ops >= self.snapshot_every:
+            self.compact()
+
+    def compact(self):
+        state = self._read()
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps({table: list(records.values()) for table, records in state.items()}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        self.log.close()
+        self.log = open(self.log_path, "w", encoding="utf-8")
+        os.fsync(self.log.fileno())
+        self.log_ops = 0
+
+    def close(self):
+        self.log.close()
+
+
+class GroupCommitWriter:
+    """Queues ops from request handlers and commits them in batches.
+
+    A background thread flushes whatever accumulated every ``interval_ms``,
+    so one fsync covers a whole burst of writes. An interval of 0 commits
+    each op inline instead. ``pending_keys`` lists the records that still
+    have writes not on disk yet.
+    """
+
+    def __init__(self, backend: StorageBackend, interval_ms: int = 50):
+        self.backend = backend
+        self.interval = interval_ms / 1000
+        self._pending: List[Op] = []
+        self._inflight: Counter = Counter()
+        self._muted = False
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+            self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, table: str, record: dict, fields: Optional[Iterable[str]] = None):
+        """Store ``record``; ``fields`` names the ones an update changed, so a concurrent update to others survives."""
+        if not self._muted:
+            self._enqueue((table, record["id"], orjson.dumps(record).decode(), None if fields is None else tuple(fields)))
+
+    def delete(self, table: str, record_id: int):
+        if not self._muted:
+            self._enqueue((table, record_id, None, None))
+
+    def put_many(self, table: str, records: List[dict]):
+        if not self._muted:
+            self._enqueue_many([(table, r["id"], orjson.dumps(r).decode(), None) for r in records])
+
+    def delete_many(self, table: str, record_ids: List[int]):
+        if not self._muted:
+            self._enqueue_many([(table, record_id, None, None) for record_id in record_ids])
+
+    @contextmanager
+    def muted(self):
+        """Drop puts and deletes made inside the block, e.g. while replaying writes that are already stored."""
+        self._muted = True
+        try:
+            yield
+        finally:
+            self._muted = False
+
+    def _enqueue(self, op: Op):
+        self._enqueue_many([op])
+
+    def _enqueue_many(self, ops: List[Op]):
+        if self._thread is None:
+            with self._commit_lock:
+                self.backend.write_batch(ops)
+            return
+        with self._lock:
+            self._pending.extend(ops)
+            self._inflight.update(op[:2] for op in ops)
+
+    def pending_keys(self) -> set:
+        """``(table, id)`` of every record with a write not yet committed."""
+        with self._lock:
+            return set(self._inflight)
+
+    def flush(self):
+        """Commit everything queued so far; on failure the ops are queued again, ahead of newer ones, and the error raised."""
+        with self._commit_lock:
+            with self._lock:
+                ops, self._pending = self._pending, []
+            if ops:
+                try:
+                    self.backend.write_batch(ops)
+                except BaseException:
+                    with self._lock:
+                        self._pending[:0] = ops
+                    raise
+                with self._lock:
+                    self._inflight.subtract(op[:2] for op in ops)
+                    for key in [k for k, n in self._inflight.items() if n <= 0]:
+                        del self._inflight[key]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                # Busy database, full disk...: keep the batch and retry next interval.
+                logger.exception("Committing %d queued writes failed; retrying", len(self))
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        self.backend.close()
+
+
+class IdAllocator:
+    """Hands out fresh ids for one table.
+
+    On a shared backend ids are reserved ``block`` at a time, so worker
+    processes never collide and most allocations touch no disk; ids from
+    different workers then interleave rather than strictly increase.
+    Otherwise it is a plain counter.
+
+    ``take`` may wait on the shared store, so the event loop calls
+    ``take_cached`` first and only runs ``take`` on a worker thread when
+    that comes back empty.
+    """
+
+    def __init__(self, backend: StorageBackend, name: str, floor: int, block: int = 100):
+        self.backend = backend
+        self.name = name
+        self.floor = floor
+        self.block = block
+        self._next = floor
+        self._end = floor if backend.shared else None
+        self._lock = threading.Lock()
+
+    def take(self, count: int = 1) -> int:
+        """The first of ``count`` consecutive unused ids."""
+        with self._lock:
+            first = self._take_reserved(count)
+            if first is not None:
+                return first
+            if count > self.block:
+                return self.backend.allocate_ids(self.name, count, self.floor)
+            self._next = self.backend.allocate_ids(self.name, self.block, self.floor)
+            self._end = self._next + self.block
+            return self._take_reserved(count)
+
+    def take_cached(self, count: int = 1) -> Optional[int]:
+        """``take(count)`` if it needs nothing from the shared store, else None; never waits."""
+        if not self._lock.acquire(blocking=False):
+            return None  # a thread is reserving the next block
+        try:
+            return self._take_reserved(count)
+        finally:
+            self._lock.release()
+
+    def _take_reserved(self, count: int) -> Optional[int]:
+        if self._end is not None and self._next + count > self._end:
+            return None
+        first = self._next
+        self._next += count
+        return first
+
+
+class ChangeFeed:
+    """Replays writes that other worker processes committed to a shared backend.
+
+    ``poll`` keeps only the newest entry per record and drops records this
+    process wrote last. It returns None when the feed was pruned past our
+    position; ``reload`` then gives the full stored state to resync from.
+    Both block on the backend and may run on a worker thread.
+
+    ``current`` then picks, on the event loop, the entries still newer than
+    the local copy: records with uncommitted writes are skipped, as the
+    pending write will reach the feed later, and so are records this
+    process wrote again since. Every worker so converges on the stored
+    state of each record.
+    """
+
+    def __init__(self, writer: GroupCommitWriter):
+        self.writer = writer
+        self.backend = writer.backend
+        self.seq = self.backend.loaded_seq
+
+    def poll(self) -> Optional[List[Tuple[str, int, Optional[dict], int]]]:
+        """``(table, id, record or None, seq)`` per record changed by others since the last poll."""
+        rows = self.backend.changes_since(self.seq)
+        if rows is None:
+            return None
+        latest: Dict[Tuple[str, int], Tuple[int, str, Optional[str]]] = {}
+        for seq, origin, table, record_id, data in rows:
+            latest[(table, record_id)] = (seq, origin, data)
+            self.seq = seq
+        return [
+            (table, record_id, None if data is None else orjson.loads(data), seq)
+            for (table, record_id), (seq, origin, data) in latest.items()
+            if origin != self.backend.origin
+        ]
+
+    def reload(self) -> Dict[str, List[dict]]:
+        state = self.backend.load() or {table: [] for table in TABLES}
+        self.seq = self.backend.loaded_seq
+        return state
+
+    def current(self, changes: Iterable[Tuple[str, int, Optional[dict], int]]) -> List[Tuple[str, int, Optional[dict]]]:
+        """The ``(table, id, record or None)`` of ``changes`` to apply locally, noting their versions as applied."""
+        pending = self.writer.pending_keys()
+        versions = self.backend.versions
+        fresh = []
+        for table, record_id, data, seq in changes:
+            key = (table, record_id)
+            known = versions.get(key, self.backend.loaded_seq)
+            if key in pending:
+                # Not applied, so the pending write must not pass for newer than it.
+                versions[key] = min(known, seq - 1)
+            elif known <= seq:
+                versions[key] = seq
+                fresh.append((table, record_id, data))
+        return fresh
+
+
+def open_backend(kind: str, data_dir: str, snapshot_every: int = 10000) -> StorageBackend:
+    if kind == "memory":
+        return MemoryBackend()
+    os.makedirs(data_dir, exist_ok=True)
+    if kind == "sqlite":
+        return SQLiteBackend(os.path.join(data_dir, "fire.db"))
+    if kind == "log":
+        return LogBackend(os.path.join(data_dir, "log"), snapshot_every)
+    raise ValueError(f"Unknown storage backend: {kind}")
@@ -0,0 +1,219 @@
+import sys
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+UTC = timezone.utc
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+MICROSECOND = timedelta(microseconds=1)
+
+# Public field names, in the order the ``Incident`` model declares them.
+FIELDS = (
+    "id",
+    "type",
+    "severity",
+    "status",
+    "address",
+    "reported_at",
+    "units_responding",
+    "station_id",
+    "dispatched_at",
+    "on_scene_at",
+    "cleared_at",
+    "lat",
+    "lng",
+)
+# Timestamp field -> slot holding it as epoch microseconds.
+TIMESTAMP_SLOTS = {
+    "reported_at": "reported_us",
+    "dispatched_at": "dispatched_us",
+    "on_scene_at": "on_scene_us",
+    "cleared_at": "cleared_us",
+}
+
+
+def epoch_us(dt: datetime) -> int:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return (dt - EPOCH) // MICROSECOND
+
+
+def parse_us(value) -> Optional[int]:
+    """Epoch microseconds for an ISO 8601 string or datetime (naive means UTC)."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return epoch_us(value)
+
+
+def format_us(us: Optional[int]) -> Optional[str]:
+    return None if us is None else (EPOCH + us * MICROSECOND).isoformat()
+
+
+# Coordinates are packed into one int of offset microdegrees (about 0.1 m),
+# latitude in the high bits: one small int instead of two floats per record.
+LNG_BITS = 29
+LNG_MASK = (1 << LNG_BITS) - 1
+
+
+def pack_location(lat: Optional[float], lng: Optional[float]) -> Optional[int]:
+    if lat is None or lng is None:
+        return None
+    return round((lat + 90) * 1_000_000) << LNG_BITS | round((lng + 180) * 1_000_000)
+
+
+def unpack_location(location: Optional[int]) -> Tuple[Optional[float], Optional[float]]:
+    if location is None:
+        return None, None
+    return ((location >> LNG_BITS) - 90_000_000) / 1_000_000, ((location & LNG_MASK) - 180_000_000) / 1_000_000
+
+
+# Unit lists repeat constantly (the same engine and medic go out together), so
+# each distinct tuple is kept once and shared by every record that uses it.
+_unit_tuples: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def intern_units(units) -> Tuple[str, ...]:
+    key = tuple(sys.intern(u) for u in units)
+    return _unit_tuples.setdefault(key, key)
+
+
+class IncidentRecord(Mapping):
+    """One incident held in about a quarter of the memory of the equivalent dict.
+
+    Timestamps are epoch-microsecond ints, ``type``/``severity``/``status``
+    and unit codes are interned strings, identical unit lists share one
+    tuple, and ``lat``/``lng`` live packed in ``location``. Records are never modified in place: ``replace`` returns a new
+    one, so a record handed out earlier stays a consistent snapshot.
+
+    It reads like the ``Incident`` dict it replaces (``record["reported_at"]``
+    is an ISO string, ``units_responding`` a list) and ``to_dict`` gives the
+    exact JSON shape. Hot paths use the raw slots instead.
+    """
+
+    __slots__ = (
+        "id",
+        "type",
+        "severity",
+        "status",
+        "address",
+        "station_id",
+        "units",
+        "reported_us",
+        "dispatched_us",
+        "on_scene_us",
+        "cleared_us",
+        "location",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        type: str,
+        severity: str,
+        status: str,
+        address: str,
+        station_id: int,
+        units: Tuple[str, ...],
+        reported_us: int,
+        dispatched_us: Optional[int] = None,
+        on_scene_us: Optional[int] = None,
+        cleared_us: Optional[int] = None,
+        location: Optional[int] = None,
+    ):
+        self.id = id
+        self.type = sys.intern(type)
+        self.severity = sys.intern(severity)
+        self.status = sys.intern(status)
+        self.address = address
+        self.station_id = station_id
+        self.units = units
+        self.reported_us = reported_us
+        self.dispatched_us = dispatched_us
+        self.on_scene_us = on_scene_us
+        self.cleared_us = cleared_us
+        self.location = location
+
+    @classmethod
+    def from_dict(cls, incident: dict) -> "IncidentRecord":
+        return cls(
+            incident.get("id"),
+            incident["type"],
+            incident["severity"],
+            incident["status"],
+            incident["address"],
+            incident["station_id"],
+            intern_units(incident.get("units_responding") or ()),
+            parse_us(incident["reported_at"]),
+            parse_us(incident.get("dispatched_at")),
+            parse_us(incident.get("on_scene_at")),
+            parse_us(incident.get("cleared_at")),
+            pack_location(incident.get("lat"), incident.get("lng")),
+        )
+
+    @property
+    def lat(self) -> Optional[float]:
+        return unpack_location(self.location)[0]
+
+    @property
+    def lng(self) -> Optional[float]:
+        return unpack_location(self.location)[1]
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "type": self.type,
+            "severity": self.severity,
+            "status": self.status,
+            "address": self.address,
+            "reported_at": format_us(self.reported_us),
+            "units_responding": list(self.units),
+            "station_id": self.station_id,
+            "dispatched_at": format_us(self.dispatched_us),
+            "on_scene_at": format_us(self.on_scene_us),
+            "cleared_at": format_us(self.cleared_us),
+            "lat": self.lat,
+            "lng": self.lng,
+        }
+
+    def replace(self, changes: dict) -> "IncidentRecord":
+        """A copy with ``changes`` (public field names and JSON-shaped values) applied."""
+        record = IncidentRecord.__new__(IncidentRecord)
+        for slot in self.__slots__:
+            setattr(record, slot, getattr(self, slot))
+        for field, value in changes.items():
+            if field in TIMESTAMP_SLOTS:
+                setattr(record, TIMESTAMP_SLOTS[field], parse_us(value))
+            elif field == "units_responding":
+                record.units = intern_units(value)
+            elif field in ("type", "severity", "status"):
+                setattr(record, field, sys.intern(value))
+            elif field in ("id", "address", "station_id"):
+                setattr(record, field, value)
+            elif field not in ("lat", "lng"):
+                raise KeyError(field)
+        if "lat" in changes or "lng" in changes:
+            record.location = pack_location(changes.get("lat", self.lat), changes.get("lng", self.lng))
+        return record
+
+    def __getitem__(self, field: str):
+        if field in TIMESTAMP_SLOTS:
+            return format_us(getattr(self, TIMESTAMP_SLOTS[field]))
+        if field == "units_responding":
+            return list(self.units)
+        if field in FIELDS:
+            return getattr(self, field)
+        raise KeyError(field)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def __contains__(self, field) -> bool:
+        return field in FIELDS
+
+    def __repr__(self) -> str:
+        return f"IncidentRecord({self.to_dict()!r})"
@@ -0,0 +1,102 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+
+class Roster:
+    """Firefighters by id, indexed by station and rank, with live on-duty counts.
+
+    Records are the ``Firefighter`` dicts the API returns and are replaced,
+    never edited, so a list handed to a response stays consistent. Each
+    index maps a key to an insertion-ordered ``{id: record}`` dict; a
+    filtered listing starts from the smaller of the two. ``on_duty`` and
+    ``on_duty_by_station`` are kept up to date on every change, so the
+    dashboard and staffing board never re-count, and ``version``
+    increases with every change.
+    """
+
+    def __init__(self, firefighters: Iterable[dict] = ()):
+        self._by_id: Dict[int, dict] = {}
+        self._by_station: Dict[int, Dict[int, dict]] = {}
+        self._by_rank: Dict[str, Dict[int, dict]] = {}
+        self.on_duty = 0
+        self.on_duty_by_station: Counter = Counter()
+        self.version = 0
+        for firefighter in firefighters:
+            self.put(firefighter)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, firefighter_id: int) -> bool:
+        return firefighter_id in self._by_id
+
+    def get(self, firefighter_id: int) -> Optional[dict]:
+        return self._by_id.get(firefighter_id)
+
+    def put(self, firefighter: dict) -> Optional[dict]:
+        """Add or replace a firefighter; returns the record it replaced."""
+        previous = self._by_id.get(firefighter["id"])
+        if previous is not None:
+            self._unindex(previous)
+        self._by_id[firefighter["id"]] = firefighter
+        self._by_station.setdefault(firefighter["station_id"], {})[firefighter["id"]] = firefighter
+        self._by_rank.setdefault(firefighter["rank"], {})[firefighter["id"]] = firefighter
+        if firefighter["on_duty"]:
+            self.on_duty += 1
+            self.on_duty_by_station[firefighter["station_id"]] += 1
+        self.version += 1
+        return previous
+
+    def _unindex(self, firefighter: dict):
+        for index, key in ((self._by_station, firefighter["station_id"]), (self._by_rank, firefighter["rank"])):
+            members = index[key]
+            del members[firefighter["id"]]
+            if not members:
+                del index[key]
+        if firefighter["on_duty"]:
+            self.on_duty -= 1
+            self.on_duty_by_station[firefighter["station_id"]] -= 1
+
+    def select(
+        self,
+        station_id: Optional[int] = None,
+        rank: Optional[str] = None,
+        on_duty: Optional[bool] = None,
+    ) -> List[dict]:
+        candidates = [self._by_id]
+        if station_id is not None:
+            candidates.append(self._by_station.get(station_id, {}))
+        if rank is not None:
+            candidates.append(self._by_rank.get(rank, {}))
+        rows = min(candidates, key=len).values()
+        return [
+            f for f in rows
+            if (station_id is None or f["station_id"] == station_id)
+            and (rank is None or f["rank"] == rank)
+            and (on_duty is None or f["on_duty"] == on_duty)
+        ]
+
+    def set_on_duty(self, changes: Dict[int, bool]) -> List[dict]:
+        """Apply ``{id: on_duty}`` for known ids; returns the records that actually changed."""
+        changed = []
+        for firefighter_id, on_duty in changes.items():
+            current = self._by_id[firefighter_id]
+            if current["on_duty"] != on_duty:
+                record = {**current, "on_duty": on_duty}
+                self.put(record)
+                changed.append(record)
+        return changed
+
+    def staffing(self, station_id: int) -> dict:
+        """On-duty and total headcount for a station, overall and per rank."""
+        members = self._by_station.get(station_id, {})
+        by_rank: Dict[str, Dict[str, int]] = {}
+        for firefighter in members.values():
+            counts = by_rank.setdefault(firefighter["rank"], {"on_duty": 0, "total": 0})
+            counts["total"] += 1
+            counts["on_duty"] += firefighter["on_duty"]
+        return {
+            "on_duty": self.on_duty_by_station[station_id],
+            "total": len(members),
+            "by_rank": by_rank,
+        }
@@ -0,0 +1,138 @@
+import heapq
+import re
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from records import IncidentRecord
+
+TOKEN = re.compile(r"[0-9a-z]+")
+
+# (reported_at in epoch microseconds, id), the same order as the store's time index.
+TimeKey = Tuple[int, int]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased runs of letters and digits: "742 Evergreen Terr." -> ["742", "evergreen", "terr"]."""
+    return TOKEN.findall(text.casefold())
+
+
+def incident_tokens(incident: IncidentRecord) -> Set[str]:
+    tokens = set(tokenize(incident.address or ""))
+    tokens.update(tokenize(incident.type or ""))
+    for unit in incident.units:
+        tokens.update(tokenize(unit))
+    return tokens
+
+
+class SearchIndex:
+    """Inverted index over incident ``address``, ``type`` and ``units_responding``.
+
+    Each token maps to the set of incident ids containing it, and the
+    distinct tokens are also kept sorted so the last query term can match
+    as a prefix by bisecting to the first candidate token. Results are
+    ranked newest first by ``(reported_at, id)``.
+
+    It listens to store events like the other derived views. Archived
+    incidents keep their postings, so old calls at an address stay
+    findable after they leave the hot store. ``to_state``/``state`` save
+    and resume the postings, as for the stats.
+    """
+
+    def __init__(self, incidents: Iterable[IncidentRecord] = (), state: Optional[dict] = None):
+        self._postings: Dict[str, Set[int]] = {}
+        self._tokens: List[str] = []
+        self._keys: Dict[int, TimeKey] = {}
+        if state is not None:
+            self._postings = {token: set(ids) for token, ids in state["postings"].items()}
+            self._tokens = sorted(self._postings)
+            self._keys = {incident_id: (reported_us, incident_id) for incident_id, reported_us in state["keys"]}
+        self.add_many(incidents)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, incident: IncidentRecord):
+        self._keys[incident.id] = (incident.reported_us, incident.id)
+        for token in incident_tokens(incident):
+            ids = self._postings.get(token)
+            if ids is None:
+                ids = self._postings[token] = set()
+                insort(self._tokens, token)
+            ids.add(incident.id)
+
+    def add_many(self, incidents: Iterable[IncidentRecord]):
+        """Index a batch; tokens new to the index are merged into the sorted list once."""
+        new_tokens = []
+        for incident in incidents:
+            self._keys[incident.id] = (incident.reported_us, incident.id)
+            for token in incident_tokens(incident):
+                ids = self._postings.get(token)
+                if ids is None:
+                    ids = self._postings[token] = set()
+                    new_tokens.append(token)
+                ids.add(incident.id)
+        if new_tokens:
+            self._tokens.extend(new_tokens)
+            self._tokens.sort()
+
+    def remove(self, incident: IncidentRecord):
+        self._keys.pop(incident.id, None)
+        for token in incident_tokens(incident):
+            ids = self._postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(incident.id)
+            if not ids:
+                del self._postings[token]
+                del self._tokens[bisect_left(self._tokens, token)]
+
+    def on_incident_event(self, event: str, incident: IncidentRecord, previous: Optional[IncidentRecord]):
+        if event == "created":
+            self.add(incident)
+        elif event == "deleted":
+            self.remove(incident)
+        elif event == "updated":
+            self.remove(previous)
+            self.add(incident)
+
+    def on_incident_batch(self, event: str, incidents: List[IncidentRecord]):
+        if event == "created":
+            self.add_many(incidents)
+
+    def to_state(self) -> dict:
+        return {
+            "postings": {token: list(ids) for token, ids in self._postings.items()},
+            "keys": [[incident_id, key[0]] for incident_id, key in self._keys.items()],
+        }
+
+    def _prefixed(self, prefix: str) -> List[Set[int]]:
+        postings = []
+        for i in range(bisect_left(self._tokens, prefix), len(self._tokens)):
+            token = self._tokens[i]
+            if not token.startswith(prefix):
+                break
+            postings.append(self._postings[token])
+        return postings
+
+    def match(self, query: str) -> Set[int]:
+        """Ids containing every term of ``query``, the last term as a prefix."""
+        terms = tokenize(query)
+        if not terms:
+            return set()
+        exact = sorted((self._postings.get(t, set()) for t in terms[:-1]), key=len)
+        prefixed = self._prefixed(terms[-1])
+        if not prefixed or (exact and not exact[0]):
+            return set()
+        if exact:
+            # Filter the exact-term intersection rather than building a
+            # possibly large union for a short prefix.
+            ids = exact[0].intersection(*exact[1:])
+            return {i for i in ids if any(i in p for p in prefixed)}
+        return set().union(*prefixed)
+
+    def search(self, query: str, limit: int, before: Optional[TimeKey] = None) -> List[TimeKey]:
+        """Time keys of up to ``limit`` matches older than ``before``, newest first."""
+        keys = (self._keys[i] for i in self.match(query))
+        if before is not None:
+            keys = (k for k in keys if k < before)
+        return heapq.nlargest(limit, keys)
@@ -0,0 +1,86 @@
+import heapq
+import math
+from typing import Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+Point = Tuple[float, float, float]
+
+
+def to_xyz(lat: float, lng: float) -> Point:
+    """Unit vector for a lat/lng; straight-line distance between these is monotone in great-circle distance."""
+    phi, lam = math.radians(lat), math.radians(lng)
+    return (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+
+
+def chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    a, b = to_xyz(lat1, lng1), to_xyz(lat2, lng2)
+    return chord_to_km(math.dist(a, b))
+
+
+class _Node:
+    __slots__ = ("point", "item", "axis", "left", "right")
+
+    def __init__(self, point: Point, item: dict, axis: int):
+        self.point = point
+        self.item = item
+        self.axis = axis
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+
+
+class StationIndex:
+    """k-d tree over station locations for nearest-station lookups.
+
+    Stations are placed on the unit sphere so plain Euclidean splits give
+    exact great-circle ordering, with no special cases at the antimeridian.
+    A k-nearest query visits O(log n + k) nodes for well-spread stations.
+    """
+
+    def __init__(self, stations: Iterable[dict] = ()):
+        self.rebuild(stations)
+
+    def rebuild(self, stations: Iterable[dict]):
+        points = [(to_xyz(s["lat"], s["lng"]), s) for s in stations if s.get("lat") is not None]
+        self._size = len(points)
+        self._root = self._build(points, 0)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _build(self, points: List[Tuple[Point, dict]], depth: int) -> Optional[_Node]:
+        if not points:
+            return None
+        axis = depth % 3
+        points.sort(key=lambda p: p[0][axis])
+        mid = len(points) // 2
+        node = _Node(points[mid][0], points[mid][1], axis)
+        node.left = self._build(points[:mid], depth + 1)
+        node.right = self._build(points[mid + 1:], depth + 1)
+        return node
+
+    def nearest(self, lat: float, lng: float, k: int = 1) -> List[Tuple[float, dict]]:
+        """The ``k`` closest stations as ``(distance_km, station)``, closest first."""
+        target = to_xyz(lat, lng)
+        best: List[Tuple[float, int, dict]] = []  # max-heap on negated distance
+
+        def visit(node: Optional[_Node]):
+            if node is None:
+                return
+            dist = math.dist(target, node.point)
+            if len(best) < k:
+                heapq.heappush(best, (-dist, id(node), node.item))
+            elif dist < -best[0][0]:
+                heapq.heapreplace(best, (-dist, id(node), node.item))
+            diff = target[node.axis] - node.point[node.axis]
+            near, far = (node.left, node.right) if diff < 0 else (node.right, node.left)
+            visit(near)
+            if len(best) < k or abs(diff) < -best[0][0]:
+                visit(far)
+
+        visit(self._root)
+        return [(chord_to_km(-d), item) for d, _, item in sorted(best, reverse=True)]
@@ -0,0 +1,100 @@
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from records import IncidentRecord
+
+UTC = timezone.utc
+EPOCH_DAY = date(1970, 1, 1)
+DAY_US = 86_400_000_000
+
+
+def reported_day(incident: IncidentRecord) -> date:
+    return EPOCH_DAY + timedelta(days=incident.reported_us // DAY_US)
+
+
+class StatsAggregator:
+    """Running dashboard counters kept up to date by store events.
+
+    ``calls_today`` and ``calls_this_month`` only count incidents reported in
+    the current UTC day/month; the buckets reset when the clock crosses a
+    boundary, so reading them never touches the incident table. Staffing
+    counts live with the roster.
+
+    ``to_state`` gives the counters as JSON-ready data, and passing that
+    back as ``state`` resumes from them before ``incidents`` are counted.
+    """
+
+    def __init__(self, incidents: Iterable[IncidentRecord] = (), state: Optional[dict] = None):
+        self._day: Optional[date] = None
+        self._month: Optional[Tuple[int, int]] = None
+        self.calls_today = 0
+        self.calls_this_month = 0
+        self.active_incidents = 0
+        if state is not None:
+            self._day = date.fromisoformat(state["day"])
+            self._month = tuple(state["month"])
+            self.calls_today = state["calls_today"]
+            self.calls_this_month = state["calls_this_month"]
+            self.active_incidents = state["active_incidents"]
+        self.roll(datetime.now(tz=UTC))
+        for incident in incidents:
+            self.on_incident_event("created", incident, None)
+
+    def roll(self, now: datetime):
+        today = now.astimezone(UTC).date()
+        if today != self._day:
+            self._day = today
+            self.calls_today = 0
+        if (today.year, today.month) != self._month:
+            self._month = (today.year, today.month)
+            self.calls_this_month = 0
+
+    def _count_call(self, incident: IncidentRecord, delta: int):
+        self._count_day(reported_day(incident), delta)
+
+    def _count_day(self, day: date, delta: int):
+        if day == self._day:
+            self.calls_today += delta
+        if (day.year, day.month) == self._month:
+            self.calls_this_month += delta
+
+    def on_incident_event(self, event: str, incident: IncidentRecord, previous: Optional[IncidentRecord]):
+        self.roll(datetime.now(tz=UTC))
+        if event == "created":
+            self._count_call(incident, 1)
+            self.active_incidents += incident.status == "Active"
+        elif event == "deleted":
+            self._count_call(incident, -1)
+            self.active_incidents -= incident.status == "Active"
+        elif event == "updated":
+            self.active_incidents += (incident.status == "Active") - (previous.status == "Active")
+            if incident.reported_us != previous.reported_us:
+                self._count_call(previous, -1)
+                self._count_call(incident, 1)
+
+    def on_incident_batch(self, event: str, incidents: List[IncidentRecord]):
+        """A bulk insert, counted once per reported day rather than per incident."""
+        if event != "created":
+            return
+        self.roll(datetime.now(tz=UTC))
+        for day, count in Counter(i.reported_us // DAY_US for i in incidents).items():
+            self._count_day(EPOCH_DAY + timedelta(days=day), count)
+        self.active_incidents += sum(i.status == "Active" for i in incidents)
+
+    def to_state(self) -> dict:
+        return {
+            "day": self._day.isoformat(),
+            "month": list(self._month),
+            "calls_today": self.calls_today,
+            "calls_this_month": self.calls_this_month,
+            "active_incidents": self.active_incidents,
+        }
+
+    def snapshot(self, now: datetime) -> dict:
+        self.roll(now)
+        return {
+            "calls_today": self.calls_today,
+            "calls_this_month": self.calls_this_month,
+            "active_incidents": self.active_incidents,
+        }
@@ -0,0 +1,504 @@
+import heapq
+import weakref
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from records import IncidentRecord
+
+# units_responding is multi-valued: an incident is indexed under each unit.
+INDEXED_FIELDS = ("status", "severity", "station_id", "type", "units_responding")
+# Record slot holding each indexed field.
+INDEX_SLOTS = {
+    "status": "status",
+    "severity": "severity",
+    "station_id": "station_id",
+    "type": "type",
+    "units_responding": "units",
+}
+
+
+def index_keys(value) -> list:
+    """The index keys for a field value: one per unit for lists, strings casefolded."""
+    values = value if isinstance(value, (list, tuple)) else [value]
+    return [v.casefold() if isinstance(v, str) else v for v in values]
+
+
+# Sort key for the time index: (reported_at in epoch microseconds, id).
+TimeKey = Tuple[int, int]
+
+# Called as listener(event, incident, previous) after every mutation, where
+# event is "created", "updated", "deleted" or "archived" (moved to the cold
+# tier: gone from the store but still part of history) and previous is the
+# record as it was before an update (None otherwise).
+Listener = Callable[[str, IncidentRecord, Optional[IncidentRecord]], None]
+# Called as batch_listener(event, incidents) once for a whole ``add_many``
+# ("created") or ``evict`` ("archived"), in place of the per-record calls.
+BatchListener = Callable[[str, List[IncidentRecord]], None]
+
+
+class IncidentStore:
+    """In-memory incident table keyed by id with secondary indexes.
+
+    Records are ``IncidentRecord``s; dicts shaped like the ``Incident`` model
+    are converted on the way in. Every lookup,
+    update and delete is O(1); the indexes map a field value to the set of
+    incident ids carrying it (strings compare case-insensitively);
+    ``version`` increases with every mutation. A sorted list of ``TimeKey`` backs
+    newest-first paging with O(log n) seeks. Listeners registered with ``subscribe`` are
+    told about every mutation so derived views can stay incremental; views
+    that also pass a batch listener take a bulk insert or eviction in one call.
+
+    New ids come from a local counter, or from ``allocate_ids(count)``
+    (returning the first of ``count`` fresh ids) when several processes
+    share the id space.
+
+    The store is not locked: all mutations must come from one thread (the
+    event loop). Records are immutable, so readers can hold on to them, and
+    a reader that spans several awaits can pin a consistent ``snapshot``.
+    """
+
+    def __init__(
+        self,
+        incidents: Iterable[Union[dict, IncidentRecord]] = (),
+        first_id: int = 101,
+        allocate_ids: Optional[Callable[[int], int]] = None,
+    ):
+        self._by_id: Dict[int, IncidentRecord] = {}
+        self._indexes: Dict[str, Dict[object, Set[int]]] = {f: {} for f in INDEXED_FIELDS}
+        self._next_id = first_id
+        self._allocate_ids = allocate_ids or self._count_ids
+        self._listeners: List[Tuple[Listener, Optional[BatchListener]]] = []
+        self.version = 0
+        # Plain counters for instrumentation, read at scrape time.
+        self.get_hits = 0
+        self.get_misses = 0
+        self.index_lookups = 0
+        self._versions: Dict[int, int] = {}
+        self._time_keys: List[TimeKey] = []
+        self._key_of: Dict[int, TimeKey] = {}
+        # (id, record before the write or None) per write while any snapshot
+        # is alive; _undo_base counts the entries already dropped.
+        self._undo: List[Tuple[int, Optional[IncidentRecord]]] = []
+        self._undo_base = 0
+        self._snapshots: "weakref.WeakSet[Snapshot]" = weakref.WeakSet()
+        for incident in incidents:
+            self.add(incident)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, incident_id: int) -> bool:
+        return incident_id in self._by_id
+
+    def subscribe(self, listener: Listener, batch_listener: Optional[BatchListener] = None):
+        self._listeners.append((listener, batch_listener))
+
+    def _record_write(self, event: str, incident: IncidentRecord, previous: Optional[IncidentRecord]):
+        self.version += 1
+        if self._snapshots:
+            self._undo.append((incident.id, previous if event == "updated" else None if event == "created" else incident))
+        elif self._undo:
+            self._undo_base += len(self._undo)
+            self._undo = []
+        if event in ("deleted", "archived"):
+            self._versions.pop(incident.id, None)
+        else:
+            self._versions[incident.id] = self.version
+
+    def _emit(self, event: str, incident: IncidentRecord, previous: Optional[IncidentRecord] = None):
+        self._record_write(event, incident, previous)
+        for listener, _ in self._listeners:
+            listener(event, incident, previous)
+
+    def _emit_many(self, event: str, incidents: List[IncidentRecord]):
+        for incident in incidents:
+            self._record_write(event, incident, None)
+        if not incidents:
+            return
+        for listener, batch_listener in self._listeners:
+            if batch_listener is not None:
+                batch_listener(event, incidents)
+            else:
+                for incident in incidents:
+                    listener(event, incident, None)
+
+    def _count_ids(self, count: int) -> int:
+        first = self._next_id
+        self._next_id += count
+        return first
+
+    def next_id(self) -> int:
+        return self._allocate_ids(1)
+
+    def get(self, incident_id: int) -> Optional[IncidentRecord]:
+        incident = self._by_id.get(incident_id)
+        if incident is None:
+            self.get_misses += 1
+        else:
+            self.get_hits += 1
+        return incident
+
+    def incident_version(self, incident_id: int) -> Optional[int]:
+        """The store version at which this incident last changed."""
+        return self._versions.get(incident_id)
+
+    def all(self) -> List[IncidentRecord]:
+        """All incidents, most recently created first."""
+        return list(reversed(self._by_id.values()))
+
+    def snapshot(self) -> "Snapshot":
+        """A read-only view of the incidents as they are now, for reads that span awaits.
+
+        Nothing is copied: while snapshots are alive every write also logs
+        the record it replaced, and a snapshot reads the live tables with
+        the rows changed since it was taken swapped back. A write costs one
+        list append, and only while some reader holds a snapshot.
+        """
+        if self._undo:
+            # Drop what every live snapshot has already taken in.
+            keep = min((s._position for s in self._snapshots), default=self._undo_base + len(self._undo))
+            del self._undo[:keep - self._undo_base]
+            self._undo_base = keep
+        snapshot = Snapshot(self)
+        self._snapshots.add(snapshot)
+        return snapshot
+
+    def undo_entries(self) -> int:
+        """Replaced records kept for live snapshots."""
+        return len(self._undo)
+
+    _keys = staticmethod(index_keys)
+
+    def ids_where(self, field: str, value) -> Set[int]:
+        self.index_lookups += 1
+        return self._indexes[field].get(self._keys(value)[0], set())
+
+    def match(self, criteria: Dict[str, object]) -> Optional[Set[int]]:
+        """Ids matching every ``field: value`` pair, or None if there are no criteria.
+
+        Intersection starts from the smallest index set, so the cost follows
+        the most selective filter rather than the table size.
+        """
+        sets = sorted((self.ids_where(f, v) for f, v in criteria.items()), key=len)
+        if not sets:
+            return None
+        return sets[0].intersection(*sets[1:])
+
+    @classmethod
+    def matches(cls, incident: IncidentRecord, criteria: Dict[str, object]) -> bool:
+        """Whether ``incident`` satisfies ``criteria`` the way ``match`` would, for records outside the store."""
+        return all(
+            cls._keys(value)[0] in cls._keys(getattr(incident, INDEX_SLOTS[field]))
+            for field, value in criteria.items()
+        )
+
+    @staticmethod
+    def time_key(incident: IncidentRecord) -> TimeKey:
+        return incident.reported_us, incident.id
+
+    def page(
+        self,
+        limit: int,
+        before: Optional[TimeKey] = None,
+        ids: Optional[Set[int]] = None,
+        since_us: Optional[int] = None,
+        until_us: Optional[int] = None,
+    ) -> List[IncidentRecord]:
+        """Up to ``limit`` incidents older than ``before``, newest first.
+
+        ``since_us``/``until_us`` bound reported_at (inclusive/exclusive, in
+        epoch microseconds) by bisecting the time index. With ``ids`` only
+        those incidents are considered: a small id set is sorted on its own
+        (O(k log k)), a large one is matched while walking the time index.
+        """
+        keys = self._time_keys
+        if ids is not None and len(ids) * 8 < len(keys):
+            keys, ids = sorted(self._key_of[i] for i in ids), None
+        lo = 0 if since_us is None else bisect_left(keys, (since_us,))
+        hi = len(keys) if until_us is None else bisect_left(keys, (until_us,))
+        if before is not None:
+            hi = min(hi, bisect_left(keys, before))
+        if ids is None:
+            return [self._by_id[key[1]] for key in reversed(keys[max(lo, hi - limit):hi])]
+        page = []
+        for i in range(hi - 1, lo - 1, -1):
+            if keys[i][1] in ids:
+                page.append(self._by_id[keys[i][1]])
+                if len(page) == limit:
+                    break
+        return page
+
+    def scan(
+        self,
+        batch_size: int = 1000,
+        ids: Optional[Set[int]] = None,
+        since_us: Optional[int] = None,
+        until_us: Optional[int] = None,
+    ) -> Iterator[List[IncidentRecord]]:
+        """Every matching incident, newest first, in batches of ``batch_size``.
+
+        Each batch is sought afresh from the last key of the previous one, so
+        mutations between batches never make the walk skip or repeat rows.
+        """
+        if ids is not None and len(ids) * 8 < len(self._time_keys):
+            keys = sorted(self._key_of[i] for i in ids)
+            lo = 0 if since_us is None else bisect_left(keys, (since_us,))
+            hi = len(keys) if until_us is None else bisect_left(keys, (until_us,))
+            for end in range(hi, lo, -batch_size):
+                batch = [self._by_id.get(k[1]) for k in reversed(keys[max(lo, end - batch_size):end])]
+                yield [i for i in batch if i is not None]
+            return
+        before = None
+        while True:
+            batch = self.page(batch_size, before, ids, since_us, until_us)
+            if not batch:
+                return
+            before = self._key_of[batch[-1].id]
+            yield batch
+
+    def add(self, incident: Union[dict, IncidentRecord]) -> IncidentRecord:
+        if not isinstance(incident, IncidentRecord):
+            incident = IncidentRecord.from_dict(incident)
+        incident_id = incident.id
+        if incident_id is None:
+            incident_id = incident.id = self.next_id()
+        elif incident_id in self._by_id:
+            raise KeyError(f"Incident {incident_id} already exists")
+        self._next_id = max(self._next_id, incident_id + 1)
+        self._by_id[incident_id] = incident
+        self._index(incident)
+        key = self._key_of[incident_id] = self.time_key(incident)
+        insort(self._time_keys, key)
+        self._emit("created", incident)
+        return incident
+
+    def add_many(self, incidents: List[Union[dict, IncidentRecord]], first_id: Optional[int] = None) -> List[IncidentRecord]:
+        """Insert new incidents (without ids) as one batch; returns their records.
+
+        Ids are one block, starting at ``first_id`` when the caller reserved
+        them or allocated here otherwise, and the time index is extended
+        and re-sorted once, which is linear for the mostly-ordered keys a
+        backfill produces, instead of one ``insort`` per row. The indexes
+        take each distinct field value once, and listeners hear about the
+        batch in one call.
+        """
+        if first_id is None:
+            first_id = self._allocate_ids(len(incidents))
+        incidents = [i if isinstance(i, IncidentRecord) else IncidentRecord.from_dict(i) for i in incidents]
+        keys = []
+        for offset, incident in enumerate(incidents):
+            incident_id = incident.id = first_id + offset
+            self._by_id[incident_id] = incident
+            key = self._key_of[incident_id] = self.time_key(incident)
+            keys.append(key)
+        self._index_many(incidents)
+        self._time_keys.extend(keys)
+        self._time_keys.sort()
+        self._emit_many("created", incidents)
+        return incidents
+
+    def update(self, incident_id: int, changes: dict) -> Optional[IncidentRecord]:
+        """Apply ``changes`` (``Incident`` field names and values) and return the new record.
+
+        A new ``reported_at`` (only replicated writes carry one) moves the
+        incident in the time index, so paging order and cursors follow it.
+        """
+        previous = self._by_id.get(incident_id)
+        if previous is None:
+            return None
+        incident = self._by_id[incident_id] = previous.replace(changes)
+        self._unindex(previous)
+        self._index(incident)
+        if incident.reported_us != previous.reported_us:
+            keys = self._time_keys
+            del keys[bisect_left(keys, self._key_of[incident_id])]
+            key = self._key_of[incident_id] = self.time_key(incident)
+            insort(keys, key)
+        self._emit("updated", incident, previous)
+        return incident
+
+    def delete(self, incident_id: int) -> Optional[IncidentRecord]:
+        incident = self._by_id.pop(incident_id, None)
+        if incident is not None:
+            self._unindex(incident)
+            keys = self._time_keys
+            del keys[bisect_left(keys, self._key_of.pop(incident_id))]
+            self._emit("deleted", incident)
+        return incident
+
+    def evict(self, incident_ids: Iterable[int]) -> List[IncidentRecord]:
+        """Drop incidents that now live in the cold tier, announcing them as "archived".
+
+        The time index is filtered once for the whole batch rather than
+        shifted per incident, so archiving thousands of rows stays O(n).
+        """
+        evicted = []
+        gone = set()
+        for incident_id in incident_ids:
+            incident = self._by_id.pop(incident_id, None)
+            if incident is not None:
+                self._unindex(incident)
+                gone.add(self._key_of.pop(incident_id))
+                evicted.append(incident)
+        if gone:
+            self._time_keys[:] = [k for k in self._time_keys if k not in gone]
+        self._emit_many("archived", evicted)
+        return evicted
+
+    def _index(self, incident: IncidentRecord):
+        for field, index in self._indexes.items():
+            for key in self._keys(getattr(incident, INDEX_SLOTS[field])):
+                index.setdefault(key, set()).add(incident.id)
+
+    def _index_many(self, incidents: List[IncidentRecord]):
+        """``_index`` for a batch: ids are grouped by field value first, so each distinct value is keyed once."""
+        for field, index in self._indexes.items():
+            slot = INDEX_SLOTS[field]
+            groups: Dict[object, List[int]] = {}
+            for incident in incidents:
+                value = getattr(incident, slot)
+                ids = groups.get(value)
+                if ids is None:
+                    groups[value] = [incident.id]
+                else:
+                    ids.append(incident.id)
+            for value, ids in groups.items():
+                for key in self._keys(value):
+                    index.setdefault(key, set()).update(ids)
+
+    def _unindex(self, incident: IncidentRecord):
+        for field, index in self._indexes.items():
+            for key in self._keys(getattr(incident, INDEX_SLOTS[field])):
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(incident.id)
+                    if not ids:
+                        del index[key]
+
+
+class Snapshot:
+    """The store's incidents as of ``version``, unaffected by later writes.
+
+    Rows written since then are looked up in the store's undo log, which
+    a snapshot takes in as it goes: the first entry for an id after the
+    snapshot was taken holds the row as the snapshot saw it (None if it
+    did not exist yet). Reads then walk the live time index, skipping
+    changed ids, merged with the changed rows' old versions, so they cost
+    what a store read does plus the rows written in between. Index
+    lookups are not part of it: resolve ``match`` ids when taking the
+    snapshot and pass them to ``page`` or ``scan``.
+    """
+
+    def __init__(self, store: IncidentStore):
+        self.version = store.version
+        self._store = store
+        self._len = len(store)
+        # Undo log position (counting dropped entries) taken in so far.
+        self._position = store._undo_base + len(store._undo)
+        self._changed: Dict[int, Optional[IncidentRecord]] = {}
+        # Time keys of the rows in _changed that existed, sorted.
+        self._restored: List[TimeKey] = []
+
+    def _catch_up(self):
+        store = self._store
+        undo = store._undo
+        for i in range(self._position - store._undo_base, len(undo)):
+            incident_id, before = undo[i]
+            if incident_id not in self._changed:
+                self._changed[incident_id] = before
+                if before is not None:
+                    insort(self._restored, IncidentStore.time_key(before))
+        self._position = store._undo_base + len(undo)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, incident_id: int) -> bool:
+        return self.get(incident_id) is not None
+
+    def get(self, incident_id: int) -> Optional[IncidentRecord]:
+        self._catch_up()
+        return self._get(incident_id)
+
+    def _get(self, incident_id: int) -> Optional[IncidentRecord]:
+        if incident_id in self._changed:
+            return self._changed[incident_id]
+        return self._store._by_id.get(incident_id)
+
+    def _rows(self, ids: Set[int], since_us: Optional[int], until_us: Optional[int]) -> List[IncidentRecord]:
+        """The rows among ``ids`` in the time bounds, newest first, for id sets too small to walk the index for."""
+        rows = [
+            r for r in map(self._get, ids)
+            if r is not None
+            and (since_us is None or r.reported_us >= since_us)
+            and (until_us is None or r.reported_us < until_us)
+        ]
+        rows.sort(key=IncidentStore.time_key, reverse=True)
+        return rows
+
+    def page(
+        self,
+        limit: int,
+        before: Optional[TimeKey] = None,
+        ids: Optional[Set[int]] = None,
+        since_us: Optional[int] = None,
+        until_us: Optional[int] = None,
+    ) -> List[IncidentRecord]:
+        """``IncidentStore.page`` as of ``version``."""
+        self._catch_up()
+        store = self._store
+        if not self._changed:
+            return store.page(limit, before, ids, since_us, until_us)
+        if ids is not None and len(ids) * 8 < self._len:
+            rows = self._rows(ids, since_us, until_us)
+            if before is not None:
+                rows = [r for r in rows if IncidentStore.time_key(r) < before]
+            return rows[:limit]
+        return list(islice(
+            heapq.merge(
+                self._walk(store._time_keys, store._by_id, limit, before, ids, since_us, until_us, self._changed),
+                self._walk(self._restored, self._changed, limit, before, ids, since_us, until_us),
+                key=IncidentStore.time_key,
+                reverse=True,
+            ),
+            limit,
+        ))
+
+    @staticmethod
+    def _walk(keys, rows, limit, before, ids, since_us, until_us, skip=()) -> List[IncidentRecord]:
+        lo = 0 if since_us is None else bisect_left(keys, (since_us,))
+        hi = len(keys) if until_us is None else bisect_left(keys, (until_us,))
+        if before is not None:
+            hi = min(hi, bisect_left(keys, before))
+        page = []
+        for i in range(hi - 1, lo - 1, -1):
+            incident_id = keys[i][1]
+            if incident_id not in skip and (ids is None or incident_id in ids):
+                page.append(rows[incident_id])
+                if len(page) == limit:
+                    break
+        return page
+
+    def scan(
+        self,
+        batch_size: int = 1000,
+        ids: Optional[Set[int]] = None,
+        since_us: Optional[int] = None,
+        until_us: Optional[int] = None,
+    ) -> Iterator[List[IncidentRecord]]:
+        """``IncidentStore.scan`` as of ``version``, however long the caller takes between batches."""
+        self._catch_up()
+        if ids is not None and len(ids) * 8 < self._len and self._changed:
+            # These rows are already as of ``version``, so sorting them once is enough.
+            rows = self._rows(ids, since_us, until_us)
+            for start in range(0, len(rows), batch_size):
+                yield rows[start:start + batch_size]
+            return
+        before = None
+        while True:
+            batch = self.page(batch_size, before, ids, since_us, until_us)
+            if not batch:
+                return
+            before = IncidentStore.time_key(batch[-1])
+            yield batch
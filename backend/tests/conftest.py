@@ -0,0 +1,67 @@
+import importlib
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The backend is a flat set of modules run from its own directory.
+sys.path.insert(0, BACKEND)
+
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(scope="session")
+def data_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("data"))
+
+
+@pytest.fixture(scope="session")
+def main(data_dir):
+    """The app module, on a SQLite store of its own.
+
+    Settings are read at import, so the environment is set first. The
+    lifespan is not run: background sync and sweeps are driven by the
+    tests themselves.
+    """
+    os.environ.update(FIRE_STORAGE="sqlite", FIRE_DATA_DIR=data_dir, FIRE_GEOCODER="gazetteer")
+    return importlib.import_module("main")
+
+
+@pytest.fixture(scope="session")
+def client(main):
+    from fastapi.testclient import TestClient
+
+    return TestClient(main.app)
+
+
+@pytest.fixture(scope="session")
+def make_incident():
+    """Build an incident dict: an Active High Fire at station 1, reported ``hours`` after 2024-01-01 UTC.
+
+    Keyword arguments override any field. Without an ``id`` the dict is
+    what a client would send, and stores allocate one.
+    """
+    def make(hours: float = 0, **fields) -> dict:
+        return {
+            "id": None,
+            "type": "Fire",
+            "severity": "High",
+            "status": "Active",
+            "address": "1 Main St",
+            "reported_at": (BASE + timedelta(hours=hours)).isoformat(),
+            "units_responding": ["E1"],
+            "station_id": 1,
+            **fields,
+        }
+
+    return make
+
+
+@pytest.fixture(scope="session")
+def make_record(make_incident):
+    """``make_incident`` as an ``IncidentRecord``."""
+    from records import IncidentRecord
+
+    return lambda hours=0, **fields: IncidentRecord.from_dict(make_incident(hours, **fields))
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+from admission import AdmissionControl, request_class
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_request_classes():
+    def scope(method, path="/api/incidents"):
+        return {"type": "http", "method": method, "path": path}
+
+    assert request_class(scope("GET")) == "read"
+    assert request_class(scope("POST")) == "write"
+    assert request_class(scope("OPTIONS")) is None
+    assert request_class(scope("GET", "/metrics")) is None
+
+
+def test_queued_writes_go_before_queued_reads():
+    async def scenario():
+        control = AdmissionControl(read_limit=1, write_reserve=0)
+        assert await control.acquire("read")
+        read = asyncio.ensure_future(control.acquire("read"))
+        write = asyncio.ensure_future(control.acquire("write"))
+        await asyncio.sleep(0.01)
+        control.release("read")
+        admitted = dict(control.in_flight)
+        assert await write
+        control.release("write")
+        assert await read
+        return admitted
+
+    assert asyncio.run(scenario()) == {"read": 0, "write": 1}
+
+
+def test_stop_cancels_lag_monitor():
+    async def scenario():
+        control = AdmissionControl()
+        control.watch()
+        monitor = control._monitor
+        await asyncio.sleep(0.01)
+        await control.stop()
+        return monitor, control._monitor
+
+    monitor, after = asyncio.run(scenario())
+    assert monitor.cancelled() and after is None
+
+
+def test_lifespan_shutdown_stops_lag_monitor(tmp_path):
+    script = (
+        "import main\n"
+        "from fastapi.testclient import TestClient\n"
+        "with TestClient(main.app) as client:\n"
+        "    client.get('/api/hello')\n"
+        "    monitor = main.admission._monitor\n"
+        "    assert monitor is not None and not monitor.done()\n"
+        "assert monitor.cancelled() and main.admission._monitor is None\n"
+        "print('stopped')\n"
+    )
+    env = {**os.environ, "FIRE_STORAGE": "memory", "FIRE_DATA_DIR": str(tmp_path), "PYTHONWARNINGS": "ignore"}
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=BACKEND, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    assert "stopped" in result.stdout
+    assert "Task was destroyed" not in result.stderr
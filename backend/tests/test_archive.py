@@ -0,0 +1,220 @@
+import pytest
+
+from archive import Archive
+
+
+@pytest.fixture
+def cleared(make_record):
+    """Cleared incident ``incident_id``, reported ``hour`` hours into 2024 at station 1 + id % 3."""
+    return lambda incident_id, hour, **fields: make_record(hour, **{
+        "id": incident_id,
+        "status": "Cleared",
+        "address": f"{incident_id} Main St",
+        "station_id": 1 + incident_id % 3,
+        **fields,
+    })
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = Archive(str(tmp_path), block_size=4)
+    yield archive
+    archive.close()
+
+
+def test_archived_incidents_read_back_after_reopen(archive, tmp_path, cleared):
+    archive.append([cleared(i, i) for i in range(1, 11)])
+    assert len(archive) == 10
+    assert archive.get(7).to_dict() == cleared(7, 7).to_dict()
+    assert archive.get(11) is None
+    since, until = cleared(4, 4).reported_us, cleared(8, 8).reported_us
+    assert [r.id for r in archive.iter_desc(since, until)] == [7, 6, 5, 4]
+
+    reopened = Archive(str(tmp_path), block_size=4)
+    try:
+        assert [r.id for r in reopened.records()] == list(range(1, 11))
+    finally:
+        reopened.close()
+
+
+def test_get_reads_only_the_block_holding_the_id(archive, tmp_path, cleared):
+    # Two sweeps whose id ranges overlap, as sweeps of old and late clears do.
+    archive.append([cleared(i, i) for i in range(1, 40, 2)])
+    archive.append([cleared(i, i) for i in range(2, 41, 2)])
+    reads = []
+    read = archive._read
+    archive._read = lambda number: reads.append(number) or read(number)
+    assert [archive.get(i).id for i in range(1, 41)] == list(range(1, 41))
+    assert len(reads) == 40
+    reads.clear()
+    assert archive.get(0) is None and archive.get(41) is None
+    assert reads == []
+
+    reopened = Archive(str(tmp_path), block_size=4)
+    try:
+        assert [reopened.get(i).id for i in range(1, 41)] == list(range(1, 41))
+        assert reopened.get(41) is None
+    finally:
+        reopened.close()
+
+
+def count_reads(archive) -> list:
+    reads = []
+    read = archive._read
+    archive._read = lambda number: reads.append(number) or read(number)
+    return reads
+
+
+def test_filtered_reads_skip_blocks_that_cannot_match(archive, tmp_path, cleared):
+    archive.append([cleared(i, i, station_id=1 + i // 8, severity="Low" if i % 8 else "High") for i in range(1, 33)])
+    reads = count_reads(archive)
+    rows = list(archive.iter_desc(criteria={"station_id": 2}))
+    assert [r.id for r in rows] == list(range(15, 7, -1))
+    assert len(reads) == 3
+    reads.clear()
+    # Fields are summarised separately: blocks with station 3 and with a High row.
+    assert [r.id for r in archive.iter_desc(criteria={"station_id": 3, "severity": "high"})] == [16]
+    assert len(reads) == 2
+    reads.clear()
+    assert list(archive.iter_desc(criteria={"status": "Active"})) == []
+    assert list(archive.iter_desc(criteria={"units_responding": "L9"})) == []
+    assert reads == []
+    # Newer than ``after`` only: blocks entirely at or before it stay closed.
+    assert [r.id for r in archive.iter_desc(after=(cleared(29, 29).reported_us, 29))] == [32, 31, 30]
+    assert len(reads) == 1
+
+    reopened = Archive(str(tmp_path), block_size=4)
+    try:
+        reads = count_reads(reopened)
+        assert [r.id for r in reopened.iter_desc(criteria={"station_id": 2})] == list(range(15, 7, -1))
+        assert len(reads) == 3
+    finally:
+        reopened.close()
+
+
+@pytest.fixture
+def tiers(main, monkeypatch, cleared):
+    """``main`` with a hot store and archive of its own, hourly rows interleaved between them."""
+    from store import IncidentStore
+
+    hot = IncidentStore([{**cleared(i, i).to_dict(), "status": "Active"} for i in range(2, 41, 2)])
+    cold = Archive(None, block_size=4)
+    cold.append([cleared(i, i) for i in range(1, 40, 2)])
+    monkeypatch.setattr(main, "incident_store", hot)
+    monkeypatch.setattr(main, "archive", cold)
+    return main, cold
+
+
+def pages(main, limit, **filters):
+    ids, cursor = [], None
+    while True:
+        page = main.incident_page(main.incident_filters(**filters), limit, cursor, "id")
+        ids.append([row["id"] for row in page["incidents"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_incident_pages_merge_hot_and_archived_rows(tiers):
+    main, cold = tiers
+    reads = count_reads(cold)
+    assert pages(main, 7) == [list(range(40, 33, -1)), list(range(33, 26, -1)), list(range(26, 19, -1)),
+                              list(range(19, 12, -1)), list(range(12, 5, -1)), list(range(5, 0, -1))]
+    assert pages(main, 6, status="cleared") == [list(range(39, 28, -2)), list(range(27, 16, -2)),
+                                               list(range(15, 4, -2)), [3, 1]]
+    assert pages(main, 50, station_id=2) == [[i for i in range(40, 0, -1) if 1 + i % 3 == 2]]
+    reads.clear()
+    assert pages(main, 5, status="Active") == [list(range(40, 31, -2)), list(range(30, 21, -2)),
+                                              list(range(20, 11, -2)), list(range(10, 1, -2)), []]
+    assert reads == []
+
+
+def test_full_hot_page_leaves_older_archive_blocks_unread(tiers, cleared):
+    main, cold = tiers
+    main.incident_store.add_many([{**cleared(0, 100 + h).to_dict(), "id": None, "status": "Active"} for h in range(10)])
+    reads = count_reads(cold)
+    page = main.incident_page(main.incident_filters(), 10, None, "id")
+    assert len(page["incidents"]) == 10 and page["next_cursor"]
+    assert reads == []
+
+
+def count_decompressions(monkeypatch) -> list:
+    import archive as archive_module
+
+    calls = []
+    decompress = archive_module.zlib.decompress
+    monkeypatch.setattr(archive_module.zlib, "decompress", lambda data: calls.append(1) or decompress(data))
+    return calls
+
+
+def test_reopen_reads_only_blocks_after_the_checkpoint(archive, tmp_path, cleared, monkeypatch):
+    archive.append([cleared(i, i) for i in range(1, 13)])
+    archive.save_checkpoint({"seen": 12})
+    archive.append([cleared(i, i) for i in range(13, 17)])
+
+    decompressions = count_decompressions(monkeypatch)
+    reopened = Archive(str(tmp_path), block_size=4)
+    try:
+        assert (reopened.checkpoint, reopened.checkpointed, len(reopened.blocks)) == ({"seen": 12}, 3, 4)
+        assert len(decompressions) == 1
+        assert [r.id for r in reopened.records(reopened.checkpointed)] == [13, 14, 15, 16]
+        assert [reopened.get(i).id for i in range(1, 17)] == list(range(1, 17))
+        assert [r.id for r in reopened.iter_desc(criteria={"station_id": 2})] == [16, 13, 10, 7, 4, 1]
+        assert 16 in reopened and 17 not in reopened and len(reopened) == 16
+    finally:
+        reopened.close()
+
+    # A damaged checkpoint is ignored: every block is read again.
+    path = tmp_path / "checkpoint"
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 1
+    path.write_bytes(bytes(data))
+    decompressions.clear()
+    reopened = Archive(str(tmp_path), block_size=4)
+    try:
+        assert (reopened.checkpoint, reopened.checkpointed, len(decompressions)) == (None, 0, 4)
+        assert [reopened.get(i).id for i in range(1, 17)] == list(range(1, 17))
+    finally:
+        reopened.close()
+
+
+def test_checkpointed_views_match_a_full_replay(main, tmp_path, cleared, monkeypatch):
+    from datetime import datetime, timezone
+
+    directory = str(tmp_path / "cold")
+    cold = Archive(directory, block_size=4)
+    rows = [
+        cleared(i, 24 * i, address=f"{i} Larkspur Way", lat=47.6 + i / 100, lng=-122.3,
+                dispatched_at="2024-01-01T00:00:00+00:00", on_scene_at=f"2024-01-01T00:{i:02d}:00+00:00")
+        for i in range(1, 11)
+    ]
+    cold.append(rows[:6])
+    assert main.checkpoint_archive(directory) == 2
+    cold.append(rows[6:])
+    cold.close()
+    decompressions = count_decompressions(monkeypatch)
+    # Only the block archived after the first checkpoint is read: once to index it, once to replay it.
+    assert main.checkpoint_archive(directory) == 3
+    assert len(decompressions) == 2
+
+    reopened = Archive(directory, block_size=4)
+    try:
+        state = reopened.checkpoint
+    finally:
+        reopened.close()
+    now = datetime.now(tz=timezone.utc)
+    for name, view in main.ARCHIVE_VIEWS.items():
+        resumed, replayed = view(state=state[name]), view(rows)
+        if name == "stats":
+            assert resumed.snapshot(now) == replayed.snapshot(now)
+        elif name == "calls":
+            assert resumed.calls_by_day(730, now) == replayed.calls_by_day(730, now)
+        elif name == "response_times":
+            assert resumed.report() == replayed.report() and resumed.report()["overall"]["count"] == 10
+        elif name == "search":
+            assert resumed.search("larkspur", 50) == replayed.search("larkspur", 50)
+            assert len(resumed.search("larkspur", 50)) == 10
+        else:
+            box = (47.0, -123.0, 48.0, -122.0)
+            assert resumed.by_geohash(box, 19_700, 19_800, 5) == replayed.by_geohash(box, 19_700, 19_800, 5)
+            assert resumed.located == 10
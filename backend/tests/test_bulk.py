@@ -0,0 +1,89 @@
+import orjson
+import pytest
+
+
+@pytest.fixture
+def row(make_incident):
+    """A backfill row: ``make_incident`` without the id the server assigns."""
+    def make(**fields):
+        incident = make_incident(**fields)
+        del incident["id"]
+        return incident
+
+    return make
+
+
+def test_json_array_reports_every_non_object_row(client, row):
+    body = [row(), None, 5, "x", [], row(type="Medical"), row(station_id=999)]
+    response = client.post("/api/incidents:bulk", json=body)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 2
+    assert [i["row"] for i in result["ids"]] == [0, 5]
+    assert [e["row"] for e in result["errors"]] == [1, 2, 3, 4, 6]
+    assert result["errors"][0]["errors"] == ["Expected a JSON object"]
+    assert result["inserted"] + len(result["errors"]) == len(body)
+
+
+def test_ndjson_skips_only_blank_lines(client, row):
+    lines = [orjson.dumps(row()), b"", b"null", b"{not json", b"   ", orjson.dumps(row(address="Pine St"))]
+    response = client.post(
+        "/api/incidents:bulk", content=b"\n".join(lines), headers={"content-type": "application/x-ndjson"}
+    )
+    result = response.json()
+    assert [i["row"] for i in result["ids"]] == [0, 5]
+    assert [e["row"] for e in result["errors"]] == [2, 3]
+    assert result["errors"][0]["errors"] == ["Expected a JSON object"]
+
+
+def test_created_rows_are_readable(client, row):
+    result = client.post("/api/incidents:bulk", json=[row(address="742 Evergreen Terrace")]).json()
+    incident = client.get(f"/api/incidents/{result['ids'][0]['id']}").json()
+    assert incident["address"] == "742 Evergreen Terrace"
+    assert incident["lat"] is not None
+
+
+def test_each_chunk_reaches_the_live_feed_as_one_event(main, client, row, monkeypatch):
+    monkeypatch.setattr(main, "BULK_CHUNK_ROWS", 2)
+    sub = main.broadcaster.subscribe()
+    try:
+        result = client.post("/api/incidents:bulk", json=[row(address=f"{n} Pine St") for n in range(5)]).json()
+        events = [sub.queue.get_nowait() for _ in range(sub.queue.qsize())]
+    finally:
+        main.broadcaster.unsubscribe(sub)
+    ids = [i["id"] for i in result["ids"]]
+    assert [(kind, orjson.loads(payload)) for _, kind, payload in events] == [
+        ("imported", {"count": 2, "first_id": ids[0], "last_id": ids[1]}),
+        ("imported", {"count": 2, "first_id": ids[2], "last_id": ids[3]}),
+        ("imported", {"count": 1, "first_id": ids[4], "last_id": ids[4]}),
+    ]
+
+
+def test_views_take_a_batch_as_they_take_single_rows(make_record):
+    from datetime import datetime, timezone
+
+    from heatmap import HeatmapIndex
+    from search import SearchIndex
+    from stats import StatsAggregator
+    from timeseries import CallTimeSeries
+
+    now = datetime.now(tz=timezone.utc).isoformat()
+    rows = [
+        make_record(
+            h, id=h + 1, type=("Fire", "Medical")[h % 2], station_id=1 + h % 3, address=f"{h % 7} Birch Rd",
+            lat=47.6 + h % 5 / 100, lng=-122.3, status=("Active", "Cleared")[h % 2],
+        )
+        for h in range(60)
+    ] + [make_record(id=100, reported_at=now), make_record(id=101, reported_at=now, address="8 Birch Rd")]
+
+    def state(view) -> dict:
+        # Rollups compare by their counts and buckets.
+        return {k: {s: vars(r) for s, r in v.items()} if k in ("_daily", "_hourly") else v for k, v in vars(view).items()}
+
+    for view in (StatsAggregator, CallTimeSeries, SearchIndex, HeatmapIndex):
+        single, batched = view(rows[:10]), view(rows[:10])
+        for record in rows[10:]:
+            single.on_incident_event("created", record, None)
+        batched.on_incident_batch("created", rows[10:])
+        batched.on_incident_batch("archived", rows[10:])
+        assert state(batched) == state(single), view.__name__
@@ -0,0 +1,38 @@
+from cache import ResponseCache
+from compression import MIN_SIZE
+
+
+def body(n: int) -> dict:
+    return {"pad": "x" * n}
+
+
+def test_cache_stays_within_its_byte_bound():
+    cache = ResponseCache(max_bytes=10_000)
+    for i in range(20):
+        cache.get(("incidents", i), (1,), lambda: body(1_000))
+        assert cache.size <= 10_000
+    assert len(cache) == 9 and cache.evictions == 11
+    # Least recently used go first; compressed variants count towards the bound.
+    cache.get(("incidents", 11), (1,), lambda: body(1_000), "gzip")
+    assert cache.size <= 10_000
+    built = []
+    cache.get(("incidents", 11), (1,), lambda: built.append(1) or body(1_000))
+    assert built == []
+    # Larger than the whole bound: served, but not kept.
+    big, _ = cache.get(("incidents", "big"), (1,), lambda: body(20_000))
+    assert len(big) > 20_000 and cache.size <= 10_000
+    assert sum(1 for _ in cache._entries) == len(cache)
+
+
+def test_new_version_drops_the_collections_old_bodies():
+    cache = ResponseCache()
+    for i in range(5):
+        cache.get(("incidents", i), (1,), lambda: body(MIN_SIZE), "gzip")
+        cache.get(("stats", i), (7,), lambda: body(10))
+    cache.get(("incidents", 0), (2,), lambda: body(10))
+    assert len(cache) == 6
+    assert cache.size == sum(len(b) + sum(map(len, v.values())) for _, b, v in cache._entries.values())
+    # Other collections keep theirs.
+    built = []
+    cache.get(("stats", 3), (7,), lambda: built.append(1) or body(10))
+    assert built == []
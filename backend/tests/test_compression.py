@@ -0,0 +1,102 @@
+import asyncio
+import gzip
+
+from compression import CompressionMiddleware
+
+
+def run(app, accept_encoding="gzip"):
+    """Messages the middleware sends for one GET, and the release event of apps that wait on one."""
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(CompressionMiddleware(app)(scope, receive, send))
+    return sent
+
+
+def headers_of(message):
+    return {k.decode(): v.decode() for k, v in message["headers"]}
+
+
+def test_event_stream_headers_are_sent_before_first_event():
+    async def scenario():
+        released = asyncio.Event()
+        sent = []
+
+        async def app(scope, receive, send):
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/event-stream; charset=utf-8")],
+            })
+            await released.wait()
+            await send({"type": "http.response.body", "body": b": keep-alive\n\n", "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", b"gzip")]}
+        task = asyncio.create_task(CompressionMiddleware(app)(scope, None, send))
+        await asyncio.sleep(0.01)
+        early = list(sent)
+        released.set()
+        await task
+        return early, sent
+
+    early, sent = asyncio.run(scenario())
+    assert [m["type"] for m in early] == ["http.response.start"]
+    assert "content-encoding" not in headers_of(early[0])
+    assert [m["type"] for m in sent] == ["http.response.start", "http.response.body", "http.response.body"]
+
+
+def test_whole_json_body_is_compressed():
+    body = b'{"incidents": [' + b",".join(b'{"id": %d}' % i for i in range(200)) + b"]}"
+
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"etag", b'"v1"')],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    start, message = run(app)
+    headers = headers_of(start)
+    assert headers["content-encoding"] == "gzip"
+    assert headers["etag"] == 'W/"v1"'
+    assert headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(message["body"]) == body
+
+
+def test_streamed_json_is_not_compressed():
+    chunk = b'{"id": 1}\n' * 200
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": chunk})
+
+    start, first, last = run(app)
+    assert "content-encoding" not in headers_of(start)
+    assert first["body"] == chunk and last["body"] == chunk
+
+
+def test_small_and_binary_bodies_pass_through():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/octet-stream")]})
+        await send({"type": "http.response.body", "body": b"\0" * 4096})
+
+    start, message = run(app)
+    assert "content-encoding" not in headers_of(start)
+    assert message["body"] == b"\0" * 4096
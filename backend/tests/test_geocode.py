@@ -0,0 +1,20 @@
+def test_patch_geocodes_only_changed_addresses_and_keeps_coordinates_on_failure(main, client, make_incident, monkeypatch):
+    created = client.post(
+        "/api/incidents", json=make_incident(address="8 Larkspur Yard", lat=47.6, lng=-122.3)
+    ).json()["incident"]
+    lookups = []
+
+    async def unplaceable(address):
+        lookups.append(address)
+        return None
+
+    monkeypatch.setattr(main.geocoder, "geocode", unplaceable)
+    saved = client.patch(
+        f"/api/incidents/{created['id']}", json={"address": created["address"], "status": "Cleared"}
+    ).json()["incident"]
+    assert lookups == []
+    assert (saved["status"], saved["lat"], saved["lng"]) == ("Cleared", 47.6, -122.3)
+
+    moved = client.patch(f"/api/incidents/{created['id']}", json={"address": "1 Nowhere Spur"}).json()["incident"]
+    assert lookups == ["1 Nowhere Spur"]
+    assert (moved["address"], moved["lat"], moved["lng"]) == ("1 Nowhere Spur", 47.6, -122.3)
@@ -0,0 +1,28 @@
+import random
+
+import heatmap
+from heatmap import HeatmapIndex
+
+
+def test_queries_visit_only_cells_in_the_box(make_record, monkeypatch):
+    rng = random.Random(7)
+    points = [(rng.uniform(47.0, 48.0), rng.uniform(-123.0, -121.5)) for _ in range(2000)]
+    index = HeatmapIndex([make_record(i % 48, id=i, lat=lat, lng=lng) for i, (lat, lng) in enumerate(points)])
+    # Deleting half leaves empty cells to drop from the grid as well.
+    for i, (lat, lng) in enumerate(points[::2]):
+        index.on_incident_event("deleted", make_record((2 * i) % 48, id=2 * i, lat=lat, lng=lng), None)
+    visited = []
+    center = heatmap.geohash_center
+    monkeypatch.setattr(heatmap, "geohash_center", lambda cell: visited.append(cell) or center(cell))
+
+    box = (47.55, -122.45, 47.65, -122.25)
+    first = HeatmapIndex._key(make_record(0, lat=0, lng=0))[1]
+    rows = index.by_geohash(box, first, first + 1, 6)
+    expected = sum(
+        1 for lat, lng in points[1::2]
+        if box[0] <= center(heatmap.geohash(lat, lng))[0] <= box[2]
+        and box[1] <= center(heatmap.geohash(lat, lng))[1] <= box[3]
+    )
+    assert sum(r["count"] for r in rows) == expected > 0
+    assert len(visited) < len(index._cells) / 10
+    assert {c for c in index._cells} == {cell for _, _, cell in index._grid}
@@ -0,0 +1,90 @@
+import logging
+import time
+
+import pytest
+
+from persistence import GroupCommitWriter, MemoryBackend, SQLiteBackend, StorageBackend
+
+
+class FlakyBackend(MemoryBackend):
+    """Fails the first ``failures`` batches, then records every batch it is given."""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.batches = []
+
+    def write_batch(self, ops):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.batches.append(list(ops))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+
+def test_failed_flush_keeps_ops_in_order():
+    backend = FlakyBackend(failures=1)
+    # Long enough that only the explicit flushes below commit anything.
+    writer = GroupCommitWriter(backend, interval_ms=60_000)
+    writer.put("incidents", {"id": 1})
+    with pytest.raises(OSError):
+        writer.flush()
+    writer.put("incidents", {"id": 2})
+    assert writer.pending_keys() == {("incidents", 1), ("incidents", 2)}
+    writer.flush()
+    assert [[op[1] for op in batch] for batch in backend.batches] == [[1, 2]]
+    assert writer.pending_keys() == set()
+    writer.close()
+
+
+def test_flush_thread_survives_failures(caplog):
+    backend = FlakyBackend(failures=2)
+    writer = GroupCommitWriter(backend, interval_ms=10)
+    with caplog.at_level(logging.ERROR, logger="persistence"):
+        writer.put("incidents", {"id": 1})
+        wait_for(lambda: backend.batches)
+        writer.put("incidents", {"id": 2})
+        wait_for(lambda: len(backend.batches) == 2)
+    assert writer._thread.is_alive()
+    assert [op[1] for batch in backend.batches for op in batch] == [1, 2]
+    assert sum("retrying" in r.getMessage() for r in caplog.records) == 2
+    writer.close()
+
+
+def test_sqlite_batches_survive_reopen(tmp_path):
+    path = str(tmp_path / "fire.db")
+    writer = GroupCommitWriter(SQLiteBackend(path), interval_ms=10)
+    writer.put("stations", {"id": 1, "name": "Station 1"})
+    writer.put("stations", {"id": 2, "name": "Station 2"})
+    writer.delete("stations", 1)
+    writer.close()
+    backend = SQLiteBackend(path)
+    assert backend.load()["stations"] == [{"id": 2, "name": "Station 2"}]
+    backend.close()
+
+
+def test_sqlite_store_from_before_row_versions_opens(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "fire.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE incidents (id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+    conn.execute("""INSERT INTO incidents VALUES (1, '{"id": 1, "status": "Active"}')""")
+    conn.commit()
+    conn.close()
+    writer = GroupCommitWriter(SQLiteBackend(path), interval_ms=0)
+    writer.put("incidents", {"id": 1, "status": "Cleared"}, ["status"])
+    writer.close()
+    backend = SQLiteBackend(path)
+    assert backend.load()["incidents"] == [{"id": 1, "status": "Cleared"}]
+    backend.close()
@@ -0,0 +1,240 @@
+import asyncio
+import importlib.util
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+
+import orjson
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UTC = timezone.utc
+
+
+def load_worker(name: str):
+    """A fresh copy of the app module, as a separate worker process would have."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(BACKEND, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def worker_env(data_dir) -> dict:
+    # Writes commit as they are made, so the other worker can read them straight away.
+    return {"FIRE_STORAGE": "sqlite", "FIRE_DATA_DIR": str(data_dir), "FIRE_GROUP_COMMIT_MS": "0", "FIRE_GEOCODER": "none"}
+
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    for key, value in worker_env(tmp_path).items():
+        monkeypatch.setenv(key, value)
+    loaded = [load_worker("worker_a"), load_worker("worker_b")]
+    yield loaded
+    for worker in loaded:
+        worker.storage.close()
+        worker.archive.close()
+        worker.geocoder.close()
+
+
+def days_ago(days: float = 0) -> str:
+    return (datetime.now(tz=UTC) - timedelta(days=days)).isoformat()
+
+
+def calls(worker) -> int:
+    return sum(day["count"] for day in worker.call_series.calls_by_day(60, datetime.now(tz=UTC), ("all", None)))
+
+
+def searched(worker, q: str) -> list:
+    return [incident_id for _, incident_id in worker.search_index.search(q, 50, None)]
+
+
+def test_writes_reach_the_other_workers_store_and_views(workers, make_incident):
+    a, b = workers
+    before = (b.compute_stats()["active_incidents"], calls(b))
+    created = a.incident_store.add(make_incident(address="12 Quillfeather Lane", reported_at=days_ago()))
+    b.replicate()
+    assert b.incident_store.get(created.id).to_dict() == created.to_dict()
+    assert searched(b, "quillfeather") == [created.id]
+    assert (b.compute_stats()["active_incidents"], calls(b)) == (before[0] + 1, before[1] + 1)
+
+    a.incident_store.update(created.id, {"address": "9 Brindlewood Row", "status": "Cleared"})
+    b.replicate()
+    assert b.incident_store.get(created.id).status == "Cleared"
+    assert searched(b, "quillfeather") == [] and searched(b, "brindlewood") == [created.id]
+    assert (b.compute_stats()["active_incidents"], calls(b)) == before[:1] + (before[1] + 1,)
+
+    a.incident_store.delete(created.id)
+    b.replicate()
+    assert created.id not in b.incident_store
+    assert searched(b, "brindlewood") == [] and calls(b) == before[1]
+
+
+def stored_incidents(worker) -> dict:
+    from persistence import SQLiteBackend
+
+    backend = SQLiteBackend(os.path.join(worker.DATA_DIR, "fire.db"))
+    try:
+        return {r["id"]: r for r in backend.load()["incidents"]}
+    finally:
+        backend.close()
+
+
+def test_concurrent_updates_to_different_fields_both_survive(workers, make_incident):
+    a, b = workers
+    created = a.incident_store.add(make_incident(reported_at=days_ago()))
+    b.replicate()
+    # Neither worker has seen the other's update when making its own.
+    a.incident_store.update(created.id, {"status": "Cleared"})
+    b.incident_store.update(created.id, {"address": "5 Hollowmere Close"})
+    a.replicate()
+    b.replicate()
+    for worker in workers:
+        incident = worker.incident_store.get(created.id)
+        assert (incident.status, incident.address) == ("Cleared", "5 Hollowmere Close")
+        assert searched(worker, "hollowmere") == [created.id]
+    stored = stored_incidents(a)[created.id]
+    assert (stored["status"], stored["address"]) == ("Cleared", "5 Hollowmere Close")
+
+
+def test_a_stale_update_does_not_undo_a_delete(workers, make_incident):
+    a, b = workers
+    created = a.incident_store.add(make_incident(address="7 Ashcombe Rise", reported_at=days_ago()))
+    b.replicate()
+    a.incident_store.delete(created.id)
+    b.incident_store.update(created.id, {"status": "Cleared"})
+    b.replicate()
+    a.replicate()
+    for worker in workers:
+        assert created.id not in worker.incident_store
+        assert searched(worker, "ashcombe") == []
+    assert created.id not in stored_incidents(a)
+
+
+def test_the_shared_store_is_not_waited_on_from_the_event_loop(workers, make_incident, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    a, b = workers
+    calls = []
+
+    def watch(method):
+        def watched(*args):
+            try:
+                asyncio.get_running_loop()
+                calls.append((method.__name__, "event loop"))
+            except RuntimeError:
+                calls.append((method.__name__, "thread"))
+            return method(*args)
+        return watched
+
+    for name in ("allocate_ids", "changes_since"):
+        monkeypatch.setattr(a.storage.backend, name, watch(getattr(a.storage.backend, name)))
+    # The reserved block is used up, so the next id has to come from the shared sequence.
+    monkeypatch.setattr(a.incident_ids, "_end", a.incident_ids._next)
+    client = TestClient(a.app)
+    body = {"type": "Fire", "severity": "High", "address": "1 Main St", "station_id": 1}
+    assert client.post("/api/incidents", json=body).status_code == 201
+    # More rows than a block, reserved in one go.
+    result = client.post("/api/incidents:bulk", json=[body] * 150).json()
+    assert result["inserted"] == 150 and not result["errors"]
+
+    created = b.incident_store.add(make_incident(reported_at=days_ago()))
+    monkeypatch.setattr(a, "SYNC_MS", 1)
+
+    async def until_replicated():
+        task = asyncio.create_task(a.replicate_forever())
+        try:
+            while created.id not in a.incident_store:
+                await asyncio.sleep(0.01)
+        finally:
+            task.cancel()
+
+    asyncio.run(asyncio.wait_for(until_replicated(), 10))
+    assert {name for name, _ in calls} == {"allocate_ids", "changes_since"}
+    assert {where for _, where in calls} == {"thread"}
+
+
+@pytest.mark.parametrize("seen_hot", [True, False])
+def test_archive_sweeps_reach_the_other_worker_once(workers, make_incident, seen_hot):
+    a, b = workers
+    old = a.incident_store.add(make_incident(status="Cleared", address="4 Marrowgate Court", reported_at=days_ago(10)))
+    if seen_hot:
+        b.replicate()
+    before = calls(b)
+    assert a.archive_cleared(datetime.now(tz=UTC)) >= 1
+    b.replicate()
+    assert old.id not in b.incident_store
+    assert b.archive.get(old.id).to_dict() == old.to_dict()
+    assert searched(b, "marrowgate") == [old.id]
+    assert calls(b) == before + (not seen_hot)
+    # Nothing is left for the other worker to sweep again.
+    assert b.archive_cleared(datetime.now(tz=UTC)) == 0
+
+
+def test_concurrent_creates_get_unique_ids(workers, make_incident):
+    a, _ = workers
+    script = (
+        "import sys\n"
+        "import orjson\n"
+        "import main\n"
+        f"row = orjson.loads({orjson.dumps(make_incident(reported_at=days_ago()))!r})\n"
+        "print('ready', flush=True)\n"
+        "sys.stdin.readline()\n"
+        "ids = [main.incident_store.add(dict(row)).id for _ in range(150)]\n"
+        "ids += [r.id for r in main.incident_store.add_many([dict(row) for _ in range(150)])]\n"
+        "main.storage.close()\n"
+        "print(orjson.dumps(ids).decode())\n"
+    )
+    env = {**os.environ, **worker_env(a.DATA_DIR), "PYTHONWARNINGS": "ignore"}
+    procs = [
+        subprocess.Popen(
+            [sys.executable, "-c", script], cwd=BACKEND, env=env, text=True,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        for _ in range(2)
+    ]
+    for proc in procs:
+        assert proc.stdout.readline().strip() == "ready", proc.stderr.read()
+    # Both are loaded before either starts creating, so their allocations overlap.
+    for proc in procs:
+        proc.stdin.write("\n")
+        proc.stdin.flush()
+    ids = []
+    for proc in procs:
+        out, err = proc.communicate(timeout=120)
+        assert proc.returncode == 0, err
+        ids += orjson.loads(out.splitlines()[-1])
+    assert len(ids) == len(set(ids)) == 600
+    a.replicate()
+    assert set(ids) <= {i.id for i in a.incident_store.all()}
+
+
+def test_restart_resumes_archived_history_from_the_checkpoint(workers, make_incident, monkeypatch):
+    import archive as archive_module
+
+    a, _ = workers
+    old = a.incident_store.add(make_incident(status="Cleared", address="6 Thistledown Row", reported_at=days_ago(10)))
+    assert a.archive_cleared(datetime.now(tz=UTC)) >= 1
+    # An interrupted sweep: archived, but the hot copy is still stored.
+    dup = a.incident_store.add(make_incident(status="Cleared", address="8 Thistledown Row", reported_at=days_ago(9)))
+    a.archive.append([dup])
+    a.checkpoint_archive(a.archive.directory)
+    late = a.incident_store.add(make_incident(status="Cleared", address="3 Thistledown Row", reported_at=days_ago(8)))
+    a.archive.append([late])
+    a.incident_store.evict([late.id])
+    expected = (calls(a), searched(a, "thistledown"))
+
+    decompressions = []
+    decompress = archive_module.zlib.decompress
+    monkeypatch.setattr(archive_module.zlib, "decompress", lambda data: decompressions.append(1) or decompress(data))
+    c = load_worker("worker_c")
+    try:
+        # Indexing and replaying the one block after the checkpoint.
+        assert len(decompressions) == 2
+        assert dup.id not in c.incident_store and late.id not in c.incident_store
+        assert len(expected[1]) == 3
+        assert (calls(c), searched(c, "thistledown")) == expected
+    finally:
+        c.storage.close()
+        c.archive.close()
+        c.geocoder.close()
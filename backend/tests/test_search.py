@@ -0,0 +1,27 @@
+from records import IncidentRecord
+
+
+def test_search_matches_every_word_and_prefixes_the_last(client, make_incident):
+    ids = [
+        client.post("/api/incidents", json=make_incident(address=address)).json()["incident"]["id"]
+        for address in ("5 Wrenfield Orchard", "9 Wrenfield Road")
+    ]
+
+    def search(q, **params):
+        response = client.get("/api/incidents/search", params={"q": q, **params}).json()
+        return [i["id"] for i in response["incidents"]], response["next_cursor"]
+
+    assert search("wrenfield")[0] == ids[::-1]
+    assert search("Wrenfield orch")[0] == [ids[0]]
+    first, cursor = search("wrenfield", limit=1)
+    assert first == [ids[1]]
+    assert search("wrenfield", limit=1, cursor=cursor)[0] == [ids[0]]
+
+
+def test_search_skips_ids_gone_from_store_and_archive(main, client, make_incident):
+    created = client.post("/api/incidents", json=make_incident(address="17 Quillfeather Lane")).json()["incident"]
+    ghost = IncidentRecord.from_dict({**created, "id": 9_999_999})
+    main.search_index.add(ghost)
+    response = client.get("/api/incidents/search", params={"q": "Quillfeather"})
+    assert response.status_code == 200
+    assert [i["id"] for i in response.json()["incidents"]] == [created["id"]]
@@ -0,0 +1,6 @@
+def test_station_on_duty_counts_follow_shift_changes(main, client):
+    members = [f["id"] for f in main.roster.select(2, None, None)]
+    client.post("/api/stations/2/shift-change", json={"on_duty": members[:1]}).raise_for_status()
+    stations = {s["id"]: s for s in client.get("/api/stations").json()["stations"]}
+    assert stations[2]["on_duty_count"] == 1
+    assert all(s["on_duty_count"] == main.roster.on_duty_by_station[i] for i, s in stations.items())
@@ -0,0 +1,141 @@
+import gc
+
+import pytest
+
+from records import parse_us
+from store import IncidentStore
+
+
+@pytest.fixture
+def incident(make_incident):
+    """Incident dicts ``hour`` hours into 2024, spread over stations 1-3."""
+    return lambda hour, **fields: make_incident(
+        hour, **{"address": f"{hour} Main St", "station_id": 1 + hour % 3, **fields}
+    )
+
+
+@pytest.fixture
+def store(incident):
+    return IncidentStore([incident(h, id=101 + h) for h in range(40)])
+
+
+def state(view, **filters):
+    """Everything ``view`` returns through ``scan``, ``page`` and ``get``, to compare before and after writes."""
+    rows = [r for batch in view.scan(7, **filters) for r in batch]
+    pages, before = [], None
+    while True:
+        page = view.page(5, before, **filters)
+        if not page:
+            break
+        pages.append(page)
+        before = IncidentStore.time_key(page[-1])
+    return rows, pages, [view.get(r.id) for r in rows], len(view)
+
+
+def mutate(store, incident):
+    first = store.page(1)[0]
+    oldest = store.page(len(store))[-1]
+    store.add(incident(100))
+    store.add_many([incident(-5), incident(20, status="Cleared")])
+    store.update(first.id, {"status": "Cleared", "severity": "Low"})
+    store.update(oldest.id, {"units_responding": ["E2", "L1"]})
+    store.delete(110)
+    store.evict([111, 112, 999])
+    store.update(120, {"status": "Cleared"})
+    store.delete(120)
+    store.update(115, {"reported_at": incident(33 + 1 / 6)["reported_at"]})
+
+
+def test_snapshot_keeps_state_through_every_kind_of_write(store, incident):
+    snapshot = store.snapshot()
+    filters = [
+        {},
+        {"ids": store.match({"station_id": 2})},
+        {
+            "since_us": parse_us(incident(10)["reported_at"]),
+            "until_us": parse_us(incident(30)["reported_at"]),
+        },
+    ]
+    before = [state(snapshot, **f) for f in filters]
+    mutate(store, incident)
+    assert [state(store, **f) for f in filters] != before
+    assert [state(snapshot, **f) for f in filters] == before
+    assert snapshot.get(110).id == 110 and 110 in snapshot
+    assert store.get(110) is None
+    assert len(store) == 40 + 3 - 1 - 2 - 1
+
+
+def test_snapshot_matches_a_fresh_store_at_its_version(store, incident):
+    mutate(store, incident)
+    snapshot = store.snapshot()
+    expected = IncidentStore(snapshot.page(len(snapshot)))
+    mutate_again = store.page(len(store))
+    for row in mutate_again[::3]:
+        store.update(row.id, {"status": "Active" if row.status == "Cleared" else "Cleared"})
+    for row in mutate_again[1::5]:
+        store.delete(row.id)
+    store.add_many([incident(h) for h in range(50, 60)])
+    assert state(snapshot) == state(expected)
+
+
+def test_small_id_sets_use_state_at_snapshot(store, incident):
+    store.add_many([incident(h, station_id=9) for h in range(200, 400)])
+    ids = store.match({"station_id": 1})
+    snapshot = store.snapshot()
+    assert len(ids) * 8 < len(snapshot)  # sorted on their own rather than walked
+    before = state(snapshot, ids=ids)
+    for incident_id in sorted(ids)[:4]:
+        store.delete(incident_id)
+    store.update(sorted(ids)[5], {"status": "Cleared"})
+    store.add_many([incident(h, station_id=1) for h in range(400, 420)])
+    assert state(snapshot, ids=ids) == before
+
+
+def test_second_snapshot_trims_undo_log_while_first_is_open(store):
+    first = store.snapshot()
+    first_state = state(first)
+    store.update(105, {"status": "Cleared"})
+    store.delete(106)
+    # The first snapshot has not read since, so nothing it needs can go.
+    second = store.snapshot()
+    assert store.undo_entries() == 2
+    second_state = state(second)
+    store.update(107, {"status": "Cleared"})
+    store.evict([108])
+    assert state(first) == first_state
+    # Both snapshots have now taken in the whole log; the next one drops it.
+    state(second)
+    third = store.snapshot()
+    assert store.undo_entries() == 0
+    store.update(109, {"status": "Cleared"})
+    assert state(first) == first_state
+    assert state(second) == second_state
+    assert third.get(109).status == "Active" and store.get(109).status == "Cleared"
+
+
+def test_undo_log_is_dropped_once_snapshots_are_gone(store):
+    snapshot = store.snapshot()
+    store.update(105, {"status": "Cleared"})
+    assert store.undo_entries() == 1
+    del snapshot
+    gc.collect()
+    store.update(106, {"status": "Cleared"})
+    assert store.undo_entries() == 0
+
+
+def test_writes_without_snapshots_log_nothing(store, incident):
+    mutate(store, incident)
+    assert store.undo_entries() == 0
+
+
+def test_update_of_reported_at_moves_incident_in_time_index(store, incident):
+    cursor = IncidentStore.time_key(store.get(130))
+    store.update(105, {"reported_at": incident(35.5)["reported_at"]})
+    rows = [r.id for batch in store.scan(4) for r in batch]
+    assert rows == sorted(rows, key=lambda i: IncidentStore.time_key(store.get(i)), reverse=True)
+    assert rows.index(105) == rows.index(136) - 1
+    assert 105 not in [r.id for r in store.page(100, cursor)]
+    store.update(105, {"reported_at": incident(-1)["reported_at"]})
+    assert store.page(1, IncidentStore.time_key(store.get(101)))[0].id == 105
+    store.delete(105)
+    assert len(store._time_keys) == len(store) == 39
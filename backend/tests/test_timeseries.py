@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from timeseries import CallTimeSeries
+
+NOW = datetime(2024, 3, 10, 12, 30, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def incident(make_record):
+    """Incident ``incident_id`` reported ``hours_ago`` hours before NOW."""
+    return lambda incident_id, hours_ago, **fields: make_record(
+        id=incident_id, reported_at=(NOW - timedelta(hours=hours_ago)).isoformat(), **fields
+    )
+
+
+def counts(series):
+    return [point["count"] for point in series]
+
+
+def test_calls_are_bucketed_by_day_and_hour(incident):
+    series = CallTimeSeries([incident(1, 1), incident(2, 2, type="Medical"), incident(3, 30, severity="Low")])
+    assert counts(series.calls_by_day(2, NOW)) == [1, 2]
+    assert counts(series.calls_by_day(2, NOW, ("type", "Fire"))) == [1, 1]
+    assert counts(series.calls_by_day(2, NOW, ("severity", "Low"))) == [1, 0]
+    assert counts(series.calls_by_hour(3, NOW)) == [1, 1, 0]
+
+
+def test_type_and_severity_match_case_insensitively(incident):
+    series = CallTimeSeries([incident(1, 1), incident(2, 2, type="FIRE"), incident(3, 30, severity="Low")])
+    for key in [("type", "fire"), ("type", "Fire"), ("type", "FIRE")]:
+        assert counts(series.calls_by_day(2, NOW, key)) == [1, 2]
+    assert counts(series.calls_by_day(2, NOW, ("severity", "low"))) == [1, 0]
+    assert counts(series.calls_by_hour(3, NOW, ("type", "fIrE"))) == [1, 1, 0]
+
+
+def test_update_changing_only_case_keeps_counts(incident):
+    before = incident(1, 1)
+    series = CallTimeSeries([before])
+    series.on_incident_event("updated", before.replace({"type": "fire"}), before)
+    assert counts(series.calls_by_day(1, NOW, ("type", "Fire"))) == [1]
+    assert counts(series.calls_by_day(1, NOW)) == [1]
+
+
+def test_endpoint_filters_like_incident_list(client, make_incident):
+    created = client.post("/api/incidents", json=make_incident(type="Hazmat Spill", severity="Critical"))
+    assert created.status_code == 201
+    listed = client.get("/api/incidents", params={"type": "hazmat spill"}).json()["incidents"]
+    series = client.get("/api/metrics/calls_by_day", params={"type": "hazmat spill", "days": 1}).json()["series"]
+    assert len(listed) == 1 and counts(series) == [1]
+
+
+def test_update_moving_reported_at_moves_counts(incident):
+    before = incident(1, 1)
+    series = CallTimeSeries([before])
+    series.on_incident_event("updated", before.replace({"reported_at": (NOW - timedelta(days=1)).isoformat()}), before)
+    assert counts(series.calls_by_day(2, NOW)) == [1, 0]
+    assert counts(series.calls_by_day(2, NOW, ("type", "fire"))) == [1, 0]
@@ -0,0 +1,155 @@
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from records import IncidentRecord
+
+UTC = timezone.utc
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+DAY_SECONDS = 86400
+HOUR_SECONDS = 3600
+DIMENSIONS = ("station_id", "type", "severity")
+
+
+class Rollup:
+    """Fixed-size ring of call counts, one slot per time bucket.
+
+    Each slot remembers which absolute bucket it currently holds, so a slot
+    is lazily reset the first time a newer bucket wraps onto it and stale
+    slots read back as zero.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.counts = array("i", [0] * size)
+        self.buckets = array("i", [-1] * size)
+
+    def add(self, bucket: int, delta: int):
+        slot = bucket % self.size
+        held = self.buckets[slot]
+        if held != bucket:
+            if held > bucket:
+                return  # older than the retained window
+            self.buckets[slot] = bucket
+            self.counts[slot] = 0
+        self.counts[slot] += delta
+
+    def range(self, first: int, last: int) -> List[int]:
+        counts, buckets, size = self.counts, self.buckets, self.size
+        return [counts[b % size] if buckets[b % size] == b else 0 for b in range(first, last + 1)]
+
+    def to_state(self) -> list:
+        return [self.counts.tolist(), self.buckets.tolist()]
+
+    @classmethod
+    def from_state(cls, state: list) -> "Rollup":
+        rollup = cls(len(state[0]))
+        rollup.counts, rollup.buckets = array("i", state[0]), array("i", state[1])
+        return rollup
+
+
+class CallTimeSeries:
+    """Per-day and per-hour call counts, overall and by station, type and severity.
+
+    String values are matched case-insensitively, as in the incident store's
+    filters: ``("type", "fire")`` selects the same series as ``("type", "Fire")``.
+
+    ``to_state``/``state`` save and resume the rollups, as for the stats.
+    """
+
+    def __init__(
+        self,
+        incidents: Iterable[IncidentRecord] = (),
+        days: int = 730,
+        hours: int = 24 * 31,
+        state: Optional[dict] = None,
+    ):
+        self.max_days = days
+        self.max_hours = hours
+        self._daily: Dict[Tuple[str, object], Rollup] = {}
+        self._hourly: Dict[Tuple[str, object], Rollup] = {}
+        for dimension, value, daily, hourly in state["series"] if state is not None else ():
+            self._daily[dimension, value] = Rollup.from_state(daily)
+            self._hourly[dimension, value] = Rollup.from_state(hourly)
+        for incident in incidents:
+            self._count(incident, 1)
+
+    @staticmethod
+    def _fold(key: Tuple[str, object]) -> Tuple[str, object]:
+        dimension, value = key
+        return dimension, value.casefold() if isinstance(value, str) else value
+
+    @classmethod
+    def _keys(cls, incident: IncidentRecord) -> List[Tuple[str, object]]:
+        return [("all", None)] + [cls._fold((d, getattr(incident, d))) for d in DIMENSIONS]
+
+    def _count(self, incident: IncidentRecord, delta: int, keys: Optional[List[Tuple[str, object]]] = None):
+        hour = incident.reported_us // 1_000_000 // HOUR_SECONDS
+        self._add(keys or self._keys(incident), hour, delta)
+
+    def _add(self, keys: List[Tuple[str, object]], hour: int, delta: int):
+        day = hour * HOUR_SECONDS // DAY_SECONDS
+        for key in keys:
+            daily = self._daily.get(key)
+            if daily is None:
+                daily = self._daily[key] = Rollup(self.max_days)
+                self._hourly[key] = Rollup(self.max_hours)
+            daily.add(day, delta)
+            self._hourly[key].add(hour, delta)
+
+    def on_incident_event(self, event: str, incident: IncidentRecord, previous: Optional[IncidentRecord]):
+        if event == "created":
+            self._count(incident, 1)
+        elif event == "deleted":
+            self._count(incident, -1)
+        elif event == "updated":
+            if incident.reported_us != previous.reported_us:
+                self._count(previous, -1)
+                self._count(incident, 1)
+                return
+            old, new = self._keys(previous), self._keys(incident)
+            moved = [k for k in old if k not in new]
+            if moved:
+                self._count(previous, -1, moved)
+                self._count(incident, 1, [k for k in new if k not in old])
+
+    def on_incident_batch(self, event: str, incidents: List[IncidentRecord]):
+        """A bulk insert, added once per hour and series rather than per incident."""
+        if event != "created":
+            return
+        counts = Counter(
+            (i.reported_us // 1_000_000 // HOUR_SECONDS, i.station_id, i.type, i.severity) for i in incidents
+        )
+        for (hour, *values), count in counts.items():
+            self._add([("all", None)] + [self._fold(key) for key in zip(DIMENSIONS, values)], hour, count)
+
+    def to_state(self) -> dict:
+        return {
+            "series": [[*key, daily.to_state(), self._hourly[key].to_state()] for key, daily in self._daily.items()],
+        }
+
+    def _series(self, rollups: Dict[Tuple[str, object], Rollup], key, last: int, n: int) -> List[int]:
+        rollup = rollups.get(self._fold(key))
+        if rollup is None:
+            return [0] * n
+        return rollup.range(last - n + 1, last)
+
+    def calls_by_day(self, days: int, now: datetime, key=("all", None)) -> List[dict]:
+        today = int((now - EPOCH).total_seconds()) // DAY_SECONDS
+        counts = self._series(self._daily, key, today, days)
+        first = EPOCH + timedelta(days=today - days + 1)
+        return [
+            {"date": (first + timedelta(days=i)).date().isoformat(), "count": count}
+            for i, count in enumerate(counts)
+        ]
+
+    def calls_by_hour(self, hours: int, now: datetime, key=("all", None)) -> List[dict]:
+        this_hour = int((now - EPOCH).total_seconds()) // HOUR_SECONDS
+        counts = self._series(self._hourly, key, this_hour, hours)
+        first = EPOCH + timedelta(hours=this_hour - hours + 1)
+        return [
+            {"hour": (first + timedelta(hours=i)).isoformat(), "count": count}
+            for i, count in enumerate(counts)
+        ]